@@ -37,6 +37,26 @@ SITE_ID = 1
 # large.
 API_CACHE_TIMEOUT = 3600  # an hour
 
+# Views that allow stale responses will serve a cached value that is older
+# than this many seconds (or that has been invalidated) to anonymous users,
+# and rebuild it in the background. None disables stale responses.
+API_CACHE_SOFT_TIMEOUT = None
+
+# List views that support streaming stream JSON responses for pages of at
+# least this many results, instead of rendering the whole page in memory.
+# Streamed responses are not cached. None disables streaming.
+API_STREAM_MIN_PAGE_SIZE = 1000
+
+# Datasets with at least this many places and submissions are reindexed in a
+# background task when a data index is added or changed. Smaller ones are
+# reindexed right away.
+API_BACKGROUND_REINDEX_MIN_THINGS = 1000
+
+# Place list requests with the snap parameter have their near point rounded
+# to this many decimal places (3 is about 100m), and their bounds rounded out
+# to map tile edges, so that map clients share cached responses.
+API_SNAP_NEAR_PRECISION = 3
+
 ###############################################################################
 #
 # Time Zones
@@ -120,6 +140,7 @@ MIDDLEWARE_CLASSES = (
     # 'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
     'sa_api_v2.middleware.RequestTimeLogger',
+    'sa_api_v2.middleware.CacheBufferMiddleware',
     'sa_api_v2.middleware.UniversalP3PHeader',
 )
 
@@ -406,6 +427,18 @@ if 'SHAREABOUTS_ADMIN_EMAIL' in environ:
         ('Shareabouts API Admin', environ.get('SHAREABOUTS_ADMIN_EMAIL')),
     )
 
+if 'API_CACHE_SOFT_TIMEOUT' in environ:
+    API_CACHE_SOFT_TIMEOUT = int(environ['API_CACHE_SOFT_TIMEOUT'])
+
+if 'API_STREAM_MIN_PAGE_SIZE' in environ:
+    API_STREAM_MIN_PAGE_SIZE = int(environ['API_STREAM_MIN_PAGE_SIZE'])
+
+if 'API_BACKGROUND_REINDEX_MIN_THINGS' in environ:
+    API_BACKGROUND_REINDEX_MIN_THINGS = int(environ['API_BACKGROUND_REINDEX_MIN_THINGS'])
+
+if 'API_SNAP_NEAR_PRECISION' in environ:
+    API_SNAP_NEAR_PRECISION = int(environ['API_SNAP_NEAR_PRECISION'])
+
 if 'CONSOLE_LOG_LEVEL' in environ:
     LOGGING['handlers']['console']['level'] = environ.get('CONSOLE_LOG_LEVEL')
 
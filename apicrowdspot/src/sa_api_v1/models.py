@@ -3,7 +3,10 @@ from django.contrib.gis.db import models
 from django.conf import settings
 from django.core.files.storage import get_storage_class
 from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.db.models.signals import pre_delete
 from django.utils.importlib import import_module
+from sa_api_v2.models.data_stats import DataSetStatsMixin, PlaceStatsMixin, SubmissionStatsMixin, forget_deleted_thing
 from . import cache
 from . import utils
 import ujson as json
@@ -80,7 +83,7 @@ class ModelWithDataBlob (models.Model):
 #        return Sumbission.objects.filter(submittedthing_ptr__submitter=self)
 
 
-class SubmittedThing (CacheClearingModel, ModelWithDataBlob, TimeStampedModel):
+class SubmittedThing (DataSetStatsMixin, CacheClearingModel, ModelWithDataBlob, TimeStampedModel):
     """
     A SubmittedThing generally comes from the end-user.  It may be a place, a
     comment, a vote, etc.
@@ -111,7 +114,9 @@ class SubmittedThing (CacheClearingModel, ModelWithDataBlob, TimeStampedModel):
     def save(self, silent=False, *args, **kwargs):
         is_new = (self.id == None)
 
-        ret = super(SubmittedThing, self).save(*args, **kwargs)
+        with transaction.atomic():
+            ret = super(SubmittedThing, self).save(*args, **kwargs)
+            self.sync_dataset_stats()
 
         # All submitted things generate an action if not silent.
         if not silent:
@@ -165,7 +170,7 @@ class GeoPointManager (models.GeoManager):
     get_query_set = get_queryset
 
 
-class Place (SubmittedThing):
+class Place (PlaceStatsMixin, SubmittedThing):
     """
     A Place is a submitted thing with some geographic information, to which
     other submissions such as comments or surveys can be attached.
@@ -176,6 +181,7 @@ class Place (SubmittedThing):
     objects = GeoPointManager()
     cache = cache.PlaceCache()
     next_version = 'sa_api_v2.models.Place'
+    submission_model = 'sa_api_v1.models.Submission'
 
     class Meta:
         db_table = 'sa_api_place'
@@ -202,7 +208,7 @@ class SubmissionSet (CacheClearingModel, models.Model):
                            )
 
 
-class Submission (SubmittedThing):
+class Submission (SubmissionStatsMixin, SubmittedThing):
     """
     A Submission is the simplest flavor of SubmittedThing.
     It belongs to a SubmissionSet, and thus indirectly to a Place.
@@ -217,6 +223,13 @@ class Submission (SubmittedThing):
         db_table = 'sa_api_submission'
         managed = False
 
+    def get_set_name(self, submission_set):
+        return submission_set.submission_type
+
+
+pre_delete.connect(forget_deleted_thing, sender=Place, dispatch_uid="v1-place-forget-deleted-thing")
+pre_delete.connect(forget_deleted_thing, sender=Submission, dispatch_uid="v1-submission-forget-deleted-thing")
+
 
 class Activity (CacheClearingModel, TimeStampedModel):
     """
@@ -1,9 +1,11 @@
 from collections import defaultdict
+from contextlib import contextmanager
 from django.conf import settings
 from django.core import cache as django_cache
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.urlresolvers import reverse
 from . import utils
+import threading
+import time
 
 import logging
 logger = logging.getLogger('sa_api_v2.cache')
@@ -25,6 +27,11 @@ class CacheBuffer (object):
         self.queue = {}
         self.delete_queue = set()
 
+        # Set-membership changes are queued separately and applied to the
+        # current value of each set when we flush.
+        self.sadd_queue = {}
+        self.srem_queue = {}
+
     def get_many(self, keys):
         results = {}
         unseen_keys = []
@@ -64,6 +71,8 @@ class CacheBuffer (object):
     def set(self, key, value, timeout=Undefined):
         self.buffer[key] = self.queue[key] = value
         self.timeouts[key] = timeout
+        self.sadd_queue.pop(key, None)
+        self.srem_queue.pop(key, None)
 
         try: self.delete_queue.remove(key)
         except KeyError: pass
@@ -74,6 +83,8 @@ class CacheBuffer (object):
 
         for key in mapping:
             self.timeouts[key] = timeout
+            self.sadd_queue.pop(key, None)
+            self.srem_queue.pop(key, None)
 
             try: self.delete_queue.remove(key)
             except KeyError: pass
@@ -82,6 +93,9 @@ class CacheBuffer (object):
         try: del self.queue[key]
         except KeyError: pass
 
+        self.sadd_queue.pop(key, None)
+        self.srem_queue.pop(key, None)
+
         try: del self.buffer[key]
         except KeyError: pass
 
@@ -95,6 +109,9 @@ class CacheBuffer (object):
             try: del self.queue[key]
             except KeyError: pass
 
+            self.sadd_queue.pop(key, None)
+            self.srem_queue.pop(key, None)
+
             try: del self.buffer[key]
             except KeyError: pass
 
@@ -108,6 +125,10 @@ class CacheBuffer (object):
     def add(self, skey, members):
         members = set(members)
 
+        # A deleted set starts over from empty.
+        if skey in self.delete_queue:
+            self.set(skey, set())
+
         if skey in self.srem_queue:
             self.srem_queue[skey] -= members
             if not self.srem_queue[skey]:
@@ -116,12 +137,16 @@ class CacheBuffer (object):
         new_members = (self.sadd_queue.get(skey) or set()) | members
         self.sadd_queue[skey] = new_members
 
-        svalue = (self.buffer.get(skey) or set()) | members
+        svalue = (self.get(skey) or set()) | members
         self.buffer[skey] = svalue
 
     def remove(self, skey, members):
         members = set(members)
 
+        # A deleted set starts over from empty.
+        if skey in self.delete_queue:
+            self.set(skey, set())
+
         if skey in self.sadd_queue:
             self.sadd_queue[skey] -= members
             if not self.sadd_queue[skey]:
@@ -130,39 +155,188 @@ class CacheBuffer (object):
         old_members = (self.srem_queue.get(skey) or set()) | members
         self.srem_queue[skey] = old_members
 
-        svalue = (self.buffer.get(skey) or set()) - members
+        svalue = (self.get(skey) or set()) - members
         self.buffer[skey] = svalue
 
     # === Flush, reset
 
+    def get_set_changes(self):
+        """
+        Apply the queued set-membership changes to the current values of the
+        sets in the remote cache, so that changes made by other requests since
+        the sets were read are not lost.
+        """
+        skeys = set(self.sadd_queue) | set(self.srem_queue)
+        if not skeys:
+            return {}
+
+        # Sets that were explicitly set in this buffer start from that value.
+        current = django_cache.cache.get_many(list(skeys - set(self.queue)))
+        current.update((skey, self.queue[skey]) for skey in skeys if skey in self.queue)
+
+        changes = {}
+        for skey in skeys:
+            svalue = set(current.get(skey) or set())
+            svalue |= self.sadd_queue.get(skey, set())
+            svalue -= self.srem_queue.get(skey, set())
+            changes[skey] = svalue
+        return changes
+
     def flush(self):
         timed_queues = defaultdict(dict)
 
-        if self.queue:
-            for key, value in self.queue.iteritems():
-                timeout = self.timeouts[key]
-                timed_queues[timeout][key] = value
-
-            for timeout, queue in timed_queues.iteritems():
-                if timeout is not Undefined:
-                    django_cache.cache.set_many(queue, timeout)
-                else:
-                    django_cache.cache.set_many(queue, None)
-
-        # if self.sadd_queue:
-        #     for key, value in self.sadd_queue.iteritems():
-
-        if self.delete_queue:
-            django_cache.cache.delete_many(self.delete_queue)
+        queue = dict(self.queue)
+        queue.update(self.get_set_changes())
+
+        for key, value in queue.iteritems():
+            timeout = self.timeouts.get(key, Undefined)
+            timed_queues[None if timeout is Undefined else timeout][key] = value
+
+        # django-redis can write everything to a single pipeline, so that the
+        # whole flush takes one round-trip.
+        client = getattr(django_cache.cache, 'client', None)
+        if queue or self.delete_queue:
+            if hasattr(client, 'get_client'):
+                pipeline = client.get_client(write=True).pipeline()
+                for timeout, timed_queue in timed_queues.iteritems():
+                    for key, value in timed_queue.iteritems():
+                        client.set(key, value, timeout, client=pipeline)
+                if self.delete_queue:
+                    client.delete_many(list(self.delete_queue), client=pipeline)
+                pipeline.execute()
+
+            else:
+                for timeout, timed_queue in timed_queues.iteritems():
+                    django_cache.cache.set_many(timed_queue, timeout)
+                if self.delete_queue:
+                    django_cache.cache.delete_many(self.delete_queue)
 
         self.reset()
 
     def reset(self):
         self.queue = {}
         self.delete_queue = set()
+        self.sadd_queue = {}
+        self.srem_queue = {}
         self.timeouts = {}
         self.buffer = {}
-cache_buffer = CacheBuffer()
+
+
+class LocalCacheBuffer (object):
+    """
+    A stand-in for a CacheBuffer that keeps a separate buffer for each thread
+    (or, under gevent's monkey patching, for each greenlet), so that
+    concurrent requests do not share buffered values or queued writes. The
+    CacheBufferMiddleware binds a fresh buffer at the start of each request.
+    """
+    def __init__(self):
+        self._local = threading.local()
+
+    def bind(self):
+        self._local.buffer = CacheBuffer()
+        return self._local.buffer
+
+    def unbind(self):
+        self._local.__dict__.pop('buffer', None)
+
+    @contextmanager
+    def bound(self):
+        """
+        Bind a fresh buffer for the duration of a block, flush it at the end
+        of the block, and then restore whichever buffer was bound before. This
+        is for work done outside of the middleware, such as streaming a
+        response.
+        """
+        previous = self._local.__dict__.get('buffer')
+        buffer = self.bind()
+        try:
+            yield buffer
+            buffer.flush()
+        finally:
+            if previous is None:
+                self.unbind()
+            else:
+                self._local.buffer = previous
+
+    @property
+    def current(self):
+        try:
+            return self._local.buffer
+        except AttributeError:
+            return self.bind()
+
+    def __getattr__(self, name):
+        return getattr(self.current, name)
+
+cache_buffer = LocalCacheBuffer()
+
+
+###############################################################################
+#
+# Generations
+# -----------
+# Rather than keeping track of every key that has been cached for an object
+# so that they can all be deleted when the object changes, every cache key
+# that depends on an object includes the current generation of a namespace
+# for that object. Invalidating the namespace is a single atomic increment;
+# keys from older generations are never read again and simply expire.
+#
+
+def get_owner_namespace(owner_username):
+    return 'owner:%s' % (owner_username,)
+
+def get_dataset_namespace(owner_username, dataset_slug):
+    return 'dataset:%s:%s' % (owner_username, dataset_slug)
+
+def get_place_namespace(place_id):
+    return 'place:%s' % (place_id,)
+
+def get_submission_set_namespace(place_id, submission_set_name):
+    return 'submissionset:%s:%s' % (place_id, submission_set_name)
+
+def get_generation_key(namespace):
+    return 'generation:%s' % (namespace,)
+
+def get_initial_generation():
+    # Counters start from the current time instead of from zero so that a
+    # counter that gets evicted from the cache will not come back around to a
+    # generation that has already been used.
+    return int(time.time() * 1000)
+
+def get_generations(*namespaces):
+    """
+    Get the current generation number for each of the given namespaces,
+    starting a new counter for any namespace that does not yet have one.
+    """
+    keys = [get_generation_key(namespace) for namespace in namespaces]
+    generations = cache_buffer.get_many(keys) if keys else {}
+
+    missing_keys = [key for key in keys if key not in generations]
+    if missing_keys:
+        for key in missing_keys:
+            django_cache.cache.add(key, get_initial_generation(), None)
+        new_generations = django_cache.cache.get_many(missing_keys)
+        cache_buffer.buffer.update(new_generations)
+        generations.update(new_generations)
+
+    return [generations.get(key) for key in keys]
+
+def bump_generations(*namespaces):
+    """
+    Invalidate everything cached under the given namespaces.
+    """
+    for namespace in namespaces:
+        key = get_generation_key(namespace)
+        logger.debug('Bumping generation: "%s"' % key)
+        try:
+            generation = django_cache.cache.incr(key)
+        except ValueError:
+            django_cache.cache.add(key, get_initial_generation(), None)
+            generation = django_cache.cache.get(key)
+
+        # Keep the buffer in step, so that anything cached later on in this
+        # request uses the new generation.
+        cache_buffer.buffer[key] = generation
 
 
 class Cache (object):
@@ -172,36 +346,26 @@ class Cache (object):
 
     """
 
-    def get_meta_key(self, prefix):
-        """
-        Data identified by a number of keys may be cached for any given object.
-        A meta-key keeps track of a set of related keys, for the purposes of
-        invalidating all of those keys at once when the associated object is
-        updated.
-
-        For example, data associated with a particular dataset with a primary
-        key of 23 might have cache keys that all begin with the prefix
-        "datasets:23". The cache keys themselves would be stored in a list
-        identified by the meta-key "dataset:23_keys".
-        """
-        return prefix + '_keys'
+    # Maps the name of each instance parameter to the field lookup that it can
+    # be queried from, so that the parameters for many instances can be
+    # calculated with a single values() query. Parameters that are the same
+    # for every instance go in instance_params_constants.
+    instance_params_fields = {}
+    instance_params_constants = {}
 
-    def get_request_prefixes(self, **params):
-        # Override in derived classes
-        return set()
+    # The names of the instance parameters that come from the instance's
+    # dataset. These are not cached with the instance, but are read from the
+    # dataset's own cached parameters, so that they stay current when the
+    # dataset is renamed.
+    dataset_params = ()
 
-    def get_keys_with_prefixes(self, *prefixes):
+    def get_namespaces(self, **params):
         """
-        Return a set of keys that begin with the given prefixes, including
-        meta-keys.
+        Return the set of generation namespaces that should be invalidated
+        when an object with the given instance parameters changes. Override
+        in derived classes.
         """
-        keys = set()
-        for prefix in prefixes:
-            meta_key = self.get_meta_key(prefix)
-            keys |= cache_buffer.get(meta_key) or set()
-            keys.add(meta_key)
-        logger.debug('Keys with prefixes "%s": "%s"' % ('", "'.join(prefixes), '", "'.join(keys)))
-        return keys
+        return set()
 
     def clear_keys(self, *keys):
         """
@@ -256,14 +420,97 @@ class Cache (object):
         params = self.get_instance_params(obj)
         return params
 
-    def get_serialized_data_meta_key(self, inst_key):
-        inst_params_key = self.get_instance_params_key(inst_key)
-        return inst_params_key + ':_keys'
+    def get_instance_params_queryset(self):
+        # Override in derived classes
+        raise NotImplementedError()
+
+    def get_instance_params_many(self, inst_keys):
+        """
+        Calculate the instance parameters for many instances with a single
+        query. Returns a dictionary mapping instance keys to parameters.
+        """
+        fields = self.instance_params_fields
+        lookups = set(fields.values()) | set(['id'])
+        rows = self.get_instance_params_queryset()\
+            .filter(pk__in=inst_keys)\
+            .order_by()\
+            .values(*lookups)
+
+        params_map = {}
+        for row in rows:
+            params = dict((name, row[lookup]) for name, lookup in fields.iteritems())
+            params.update(self.instance_params_constants)
+            params_map[row['id']] = params
+        return params_map
+
+    def get_cached_instance_params_many(self, inst_keys):
+        """
+        Get the instance parameters for many instances at once, such as for a
+        page of results. The cached parameters are all fetched together, and
+        any that are missing are calculated with a single query. Returns a
+        dictionary mapping instance keys to parameters.
+        """
+        inst_keys = set(inst_keys)
+        if not inst_keys:
+            return {}
+
+        keys = dict((self.get_instance_params_key(inst_key), inst_key) for inst_key in inst_keys)
+        cached = cache_buffer.get_many(keys.keys())
+        params_map = dict((keys[key], params) for key, params in cached.iteritems())
+
+        missing_keys = inst_keys - set(params_map)
+        if missing_keys:
+            new_params = self.get_instance_params_many(missing_keys)
+            cache_buffer.set_many(dict(
+                (self.get_instance_params_key(inst_key), self.get_cacheable_params(params))
+                for inst_key, params in new_params.iteritems()),
+                settings.API_CACHE_TIMEOUT)
+            params_map.update(new_params)
+
+        return self.add_dataset_params(params_map)
+
+    def get_cacheable_params(self, params):
+        """
+        Get the instance parameters to cache, leaving out those that come
+        from the instance's dataset.
+        """
+        return dict((name, value) for name, value in params.iteritems()
+                    if name not in self.dataset_params)
+
+    def add_dataset_params(self, params_map):
+        """
+        Fill in the dataset parameters of each set of instance parameters in
+        the given map from the datasets' own cached parameters.
+        """
+        if not self.dataset_params:
+            return params_map
+
+        dataset_ids = [params['dataset_id'] for params in params_map.itervalues()]
+        dataset_params_map = DataSetCache().get_cached_instance_params_many(dataset_ids)
+
+        full_params_map = {}
+        for inst_key, params in params_map.iteritems():
+            params = params.copy()
+            dataset_params = dataset_params_map.get(params['dataset_id'], {})
+            params.update((name, dataset_params[name]) for name in self.dataset_params
+                          if name in dataset_params)
+            full_params_map[inst_key] = params
+        return full_params_map
+
+    def cache_instance_params(self, obj, params):
+        instance_params_key = self.get_instance_params_key(obj.pk)
+        logger.debug('Setting instance parameters for "%s": %r' % (instance_params_key, params))
+        cache_buffer.set(instance_params_key, self.get_cacheable_params(params),
+                         settings.API_CACHE_TIMEOUT)
+
+    def get_serialized_data_namespace(self, inst_key):
+        return self.get_instance_params_key(inst_key)
 
     def get_serialized_data_key(self, inst_key, **params):
-        inst_params_key = self.get_instance_params_key(inst_key)
+        namespace = self.get_serialized_data_namespace(inst_key)
+        generation, = get_generations(namespace)
         keyvals = ['='.join(map(str, item)) for item in sorted(params.items())]
-        return '%s:%s' % (inst_params_key, ':'.join(keyvals))
+        return '%s:%s:%s' % (namespace, generation, ':'.join(keyvals))
 
     def get_serialized_data(self, inst_key, data_getter, **params):
         key = self.get_serialized_data_key(inst_key, **params)
@@ -271,42 +518,39 @@ class Cache (object):
 
         if data is None:
             data = data_getter()
-            cache_buffer.set(key, data)
-
-            # Cache the key itself
-            meta_key = self.get_serialized_data_meta_key(inst_key)
-            keys = cache_buffer.get(meta_key) or set()
-            keys.add(key)
-            cache_buffer.set(meta_key, keys)
+            cache_buffer.set(key, data, settings.API_CACHE_TIMEOUT)
 
         return data
 
-    def get_serialized_data_keys(self, inst_key):
-        meta_key = self.get_serialized_data_meta_key(inst_key)
-        if meta_key is not None:
-            keys = cache_buffer.get(meta_key)
-            return (keys or set()) | set([meta_key])
-        else:
-            return set()
-
     def get_other_keys(self, **params):
         return set()
 
     def clear_instance(self, obj):
         # Collect information for cache keys
         params = self.get_cached_instance_params(obj.pk, lambda: obj)
-        # Collect the prefixes for cached requests
-        prefixes = self.get_request_prefixes(**params)
-        prefixed_keys = self.get_keys_with_prefixes(*prefixes)
-        #Serialized data keys
-        data_keys = self.get_serialized_data_keys(obj)
-        # Collect other related keys
+        # Invalidate the cached requests and serialized data
+        namespaces = self.get_namespaces(**params) | set([self.get_serialized_data_namespace(obj.pk)])
+        bump_generations(*namespaces)
+        # Clear any other related keys
         other_keys = self.get_other_keys(**params) | set([self.get_instance_params_key(obj.pk)])
-        # Clear all the keys
-        self.clear_keys(*(prefixed_keys | data_keys | other_keys))
+        self.clear_keys(*other_keys)
+        # Store the fresh instance parameters, so that they are ready for
+        # the next page of results that includes the instance.
+        self.cache_instance_params(obj, params)
 
 
 class DataSetCache (Cache):
+    instance_params_fields = {
+        'owner_username': 'owner__username',
+        'owner_id': 'owner',
+        'dataset_slug': 'slug',
+        'dataset_id': 'id',
+    }
+
+    def get_instance_params_queryset(self):
+        from .models import DataSet
+        return DataSet.objects.all()
+
     def get_bulk_data_cache_key(self, dataset_id, submission_set_name, format, **flags):
         return 'bulk_data:%s:%s:%s:%s' % (
             dataset_id, submission_set_name, format,
@@ -321,20 +565,34 @@ class DataSetCache (Cache):
         }
         return params
 
-    def get_request_prefixes(self, **params):
+    def get_namespaces(self, **params):
         owner, dataset = map(params.get, ('owner_username', 'dataset_slug'))
-        prefixes = super(DataSetCache, self).get_request_prefixes(**params)
+        namespaces = super(DataSetCache, self).get_namespaces(**params)
 
-        instance_path = reverse('dataset-detail', args=[owner, dataset])
-        collection_path = reverse('dataset-list', args=[owner])
-        prefixes.update([instance_path, collection_path])
+        namespaces.update([get_dataset_namespace(owner, dataset),
+                           get_owner_namespace(owner)])
 
-        return prefixes
+        return namespaces
 
 
 class PlaceCache (Cache):
     dataset_cache = DataSetCache()
 
+    instance_params_fields = {
+        'owner_username': 'dataset__owner__username',
+        'owner_id': 'dataset__owner',
+        'dataset_slug': 'dataset__slug',
+        'dataset_id': 'dataset',
+        'place_id': 'id',
+        'thing_id': 'id',
+    }
+    instance_params_constants = {'thing_type': 'place'}
+    dataset_params = ('owner_username', 'owner_id', 'dataset_slug')
+
+    def get_instance_params_queryset(self):
+        from .models import Place
+        return Place.objects.all()
+
     def get_instance_params(self, place_obj):
         params = self.dataset_cache.get_cached_instance_params(
             place_obj.dataset_id, lambda: place_obj.dataset).copy()
@@ -345,24 +603,40 @@ class PlaceCache (Cache):
         })
         return params
 
-    def get_request_prefixes(self, **params):
+    def get_namespaces(self, **params):
         owner, dataset, place = map(params.get, ('owner_username', 'dataset_slug', 'place_id'))
-        prefixes = super(PlaceCache, self).get_request_prefixes(**params)
+        namespaces = super(PlaceCache, self).get_namespaces(**params)
 
-        instance_path = reverse('place-detail', args=[owner, dataset, place])
-        collection_path = reverse('place-list', args=[owner, dataset])
-        dataset_instance_path = reverse('dataset-detail', args=[owner, dataset])
-        dataset_collection_path = reverse('dataset-list', args=[owner])
-        action_collection_path = reverse('action-list', args=[owner, dataset])
-        prefixes.update([instance_path, collection_path, dataset_instance_path,
-                         dataset_collection_path, action_collection_path])
+        # The dataset namespace covers the place list, the dataset instance
+        # and the dataset's actions; the owner namespace covers the dataset
+        # list.
+        namespaces.update([get_place_namespace(place),
+                           get_dataset_namespace(owner, dataset),
+                           get_owner_namespace(owner)])
 
-        return prefixes
+        return namespaces
 
 
 class SubmissionSetCache (Cache):
     place_cache = PlaceCache()
 
+    instance_params_fields = {
+        'owner_username': 'place__dataset__owner__username',
+        'owner_id': 'place__dataset__owner',
+        'dataset_slug': 'place__dataset__slug',
+        'dataset_id': 'place__dataset',
+        'place_id': 'place',
+        'thing_id': 'place',
+        'submission_set_name': 'name',
+        'submission_set_id': 'id',
+    }
+    instance_params_constants = {'thing_type': 'place'}
+    dataset_params = ('owner_username', 'owner_id', 'dataset_slug')
+
+    def get_instance_params_queryset(self):
+        from .models import SubmissionSet
+        return SubmissionSet.objects.all()
+
     # NOTE: A SubmissionSet doesn't live on its own, only on a place. So,
     # invalidating a SubmissionSet should invalidate its place.
     def get_instance_params(self, submissionset_obj):
@@ -374,18 +648,15 @@ class SubmissionSetCache (Cache):
         })
         return params
 
-    def get_request_prefixes(self, **params):
-        owner, dataset, place = map(params.get, ['owner_username', 'dataset_slug', 'place_id'])
-        prefixes = super(SubmissionSetCache, self).get_request_prefixes(**params)
-
-        instance_path = reverse('place-detail', args=[owner, dataset, place])
-        collection_path = reverse('place-list', args=[owner, dataset])
-        dataset_path = reverse('dataset-detail', args=[owner, dataset])
-        action_collection_path = reverse('action-list', args=[owner, dataset])
+    def get_namespaces(self, **params):
+        owner, dataset, place, submission_set_name = map(params.get, ['owner_username', 'dataset_slug', 'place_id', 'submission_set_name'])
+        namespaces = super(SubmissionSetCache, self).get_namespaces(**params)
 
-        prefixes.update([instance_path, collection_path, dataset_path, action_collection_path])
+        namespaces.update([get_submission_set_namespace(place, submission_set_name),
+                           get_place_namespace(place),
+                           get_dataset_namespace(owner, dataset)])
 
-        return prefixes
+        return namespaces
 
 
 class SubmissionCache (Cache):
@@ -393,6 +664,24 @@ class SubmissionCache (Cache):
     place_cache = PlaceCache()
     submissionset_cache = SubmissionSetCache()
 
+    instance_params_fields = {
+        'owner_username': 'parent__place__dataset__owner__username',
+        'owner_id': 'parent__place__dataset__owner',
+        'dataset_slug': 'parent__place__dataset__slug',
+        'dataset_id': 'parent__place__dataset',
+        'place_id': 'parent__place',
+        'submission_set_name': 'parent__name',
+        'submission_set_id': 'parent',
+        'submission_id': 'id',
+        'thing_id': 'id',
+    }
+    instance_params_constants = {'thing_type': 'submission'}
+    dataset_params = ('owner_username', 'owner_id', 'dataset_slug')
+
+    def get_instance_params_queryset(self):
+        from .models import Submission
+        return Submission.objects.all()
+
     def get_instance_params(self, submission_obj):
         params = self.submissionset_cache.get_cached_instance_params(
             submission_obj.parent_id, lambda: submission_obj.parent).copy()
@@ -403,47 +692,36 @@ class SubmissionCache (Cache):
         })
         return params
 
-    def get_other_keys(self, **params):
+    def get_namespaces(self, **params):
+        owner, dataset, place, submission_set_name = map(params.get, ['owner_username', 'dataset_slug', 'place_id', 'submission_set_name'])
         dataset_id, place_id, submissionset_id = map(params.get, ['dataset_id', 'place_id', 'submission_set_id'])
-        dataset_serialized_data_keys = self.dataset_cache.get_serialized_data_keys(dataset_id)
-        place_serialized_data_keys = self.place_cache.get_serialized_data_keys(place_id)
-        submissionset_serialized_data_keys = self.submissionset_cache.get_serialized_data_keys(submissionset_id)
-        return dataset_serialized_data_keys | place_serialized_data_keys | submissionset_serialized_data_keys
+        namespaces = super(SubmissionCache, self).get_namespaces(**params)
 
-    def get_request_prefixes(self, **params):
-        owner, dataset, place, submission_set_name, submission = map(params.get, ['owner_username', 'dataset_slug', 'place_id', 'submission_set_name', 'submission_id'])
-        prefixes = super(SubmissionCache, self).get_request_prefixes(**params)
-
-        # TODO: it's pretty clear that a developer should be able to register
-        # a URL with or cache key or prefix or something to be cleared. How
-        # would that work?
-        specific_instance_path = reverse('submission-detail', args=[owner, dataset, place, submission_set_name, submission])
-        general_instance_path = reverse('submission-detail', args=[owner, dataset, place, 'submissions', submission])
-        specific_collection_path = reverse('submission-list', args=[owner, dataset, place, submission_set_name])
-        general_collection_path = reverse('submission-list', args=[owner, dataset, place, 'submissions'])
-        specific_all_path = reverse('dataset-submission-list', args=[owner, dataset, submission_set_name])
-        general_all_path = reverse('dataset-submission-list', args=[owner, dataset, 'submissions'])
-        place_instance_path = reverse('place-detail', args=[owner, dataset, place])
-        place_collection_path = reverse('place-list', args=[owner, dataset])
-        dataset_instance_path = reverse('dataset-detail', args=[owner, dataset])
-        dataset_collection_path = reverse('dataset-list', args=[owner])
-        action_collection_path = reverse('action-list', args=[owner, dataset])
-
-        prefixes.update([specific_instance_path, general_instance_path,
-                         specific_collection_path, general_collection_path,
-                         specific_all_path, general_all_path,
-                         place_instance_path, place_collection_path,
-                         dataset_instance_path, dataset_collection_path,
-                         action_collection_path])
-
-        return prefixes
+        # Submissions are available both under the name of their own set and
+        # under the general 'submissions' name.
+        namespaces.update([get_submission_set_namespace(place, submission_set_name),
+                           get_submission_set_namespace(place, 'submissions'),
+                           get_place_namespace(place),
+                           get_dataset_namespace(owner, dataset),
+                           get_owner_namespace(owner)])
+
+        # Serialized data for the containing objects
+        namespaces.update([self.dataset_cache.get_serialized_data_namespace(dataset_id),
+                           self.place_cache.get_serialized_data_namespace(place_id),
+                           self.submissionset_cache.get_serialized_data_namespace(submissionset_id)])
+
+        return namespaces
 
 
 class ActionCache (Cache):
+    dataset_cache = DataSetCache()
+
     def clear_instance(self, obj):
-        keys = cache_buffer.get('action_keys') or set()
-        keys.add('action_keys')
-        cache_buffer.delete_many(keys)
+        # Actions are only listed per dataset.
+        params = self.dataset_cache.get_cached_instance_params(
+            obj.thing.dataset_id, lambda: obj.thing.dataset)
+        owner, dataset = map(params.get, ('owner_username', 'dataset_slug'))
+        bump_generations(get_dataset_namespace(owner, dataset))
 
 
 class ThingWithAttachmentCache (Cache):
@@ -456,12 +734,6 @@ class ThingWithAttachmentCache (Cache):
         except ObjectDoesNotExist:
             return self.submission_cache.get_instance_params(thing_obj.submission)
 
-    def get_serialized_data_keys(self, thing_obj):
-        try:
-            return self.place_cache.get_instance_params(thing_obj.place)
-        except ObjectDoesNotExist:
-            return self.submission_cache.get_instance_params(thing_obj.submission)
-
     def get_attachments_key(self, dataset_id):
         return 'dataset:%s:%s' % (dataset_id, 'attachments-by-thing_id')
 
@@ -480,52 +752,30 @@ class AttachmentCache (Cache):
         })
         return params
 
-    def get_request_prefixes(self, **params):
-        prefixes = super(AttachmentCache, self).get_request_prefixes(**params)
+    def get_namespaces(self, **params):
+        namespaces = super(AttachmentCache, self).get_namespaces(**params)
         if params['thing_type'] == 'submission':
-            return prefixes | self.get_submission_attachment_request_prefixes(**params)
+            return namespaces | self.get_submission_attachment_namespaces(**params)
         else:
-            return prefixes | self.get_place_attachment_request_prefixes(**params)
+            return namespaces | self.get_place_attachment_namespaces(**params)
 
-    def get_submission_attachment_request_prefixes(self, **params):
+    def get_submission_attachment_namespaces(self, **params):
         owner, dataset, place, submission_set_name, submission = map(params.get, ['owner_username', 'dataset_slug', 'place_id', 'submission_set_name', 'submission_id'])
-        prefixes = set()
-
-        specific_instance_path = reverse('submission-detail', args=[owner, dataset, place, submission_set_name, submission])
-        general_instance_path = reverse('submission-detail', args=[owner, dataset, place, 'submissions', submission])
-        specific_collection_path = reverse('submission-list', args=[owner, dataset, place, submission_set_name])
-        general_collection_path = reverse('submission-list', args=[owner, dataset, place, 'submissions'])
-        specific_all_path = reverse('dataset-submission-list', args=[owner, dataset, submission_set_name])
-        general_all_path = reverse('dataset-submission-list', args=[owner, dataset, 'submissions'])
-        action_collection_path = reverse('action-list', args=[owner, dataset])
-
-        prefixes.update([specific_instance_path, general_instance_path,
-                         specific_collection_path, general_collection_path,
-                         specific_all_path, general_all_path,
-                         action_collection_path])
 
-        return prefixes
+        return set([get_submission_set_namespace(place, submission_set_name),
+                    get_submission_set_namespace(place, 'submissions'),
+                    get_place_namespace(place),
+                    get_dataset_namespace(owner, dataset),
+                    self.submission_cache.get_serialized_data_namespace(submission)])
 
-    def get_place_attachment_request_prefixes(self, **params):
+    def get_place_attachment_namespaces(self, **params):
         owner, dataset, place = map(params.get, ('owner_username', 'dataset_slug', 'place_id'))
-        prefixes = set()
 
-        instance_path = reverse('place-detail', args=[owner, dataset, place])
-        collection_path = reverse('place-list', args=[owner, dataset])
-        action_collection_path = reverse('action-list', args=[owner, dataset])
-        prefixes.update([instance_path, collection_path, action_collection_path])
-
-        return prefixes
+        return set([get_place_namespace(place),
+                    get_dataset_namespace(owner, dataset),
+                    self.place_cache.get_serialized_data_namespace(place)])
 
     def get_other_keys(self, **params):
         dataset_id = params.get('dataset_id')
-        thing_id = params.get('thing_id')
         thing_attachments_key = self.thing_cache.get_attachments_key(dataset_id)
-
-        if params['thing_type'] == 'submission':
-            thing_serialized_data_keys = self.submission_cache.get_serialized_data_keys(thing_id)
-        else:
-            thing_serialized_data_keys = self.place_cache.get_serialized_data_keys(thing_id)
-
-        # Union the two sets
-        return set([thing_attachments_key]) | thing_serialized_data_keys
+        return set([thing_attachments_key])
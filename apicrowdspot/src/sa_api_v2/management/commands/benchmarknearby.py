@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from optparse import make_option
+from sa_api_v2.models import DataSet, DataSetCounter, Place, User
+from sa_api_v2.utils import to_distance, to_geom
+import time
+
+class Command(BaseCommand):
+    args = '<owner_username> <dataset_slug>'
+    help = ('Time finding the places nearest to a point, and within a '
+            'distance of it, using the spatial index and using a full scan. '
+            'With --create, first fill a new dataset with random points.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--create', type='int', default=0, metavar='COUNT',
+            help='Create the dataset with this many random points (e.g., 100000)'),
+        make_option('--near', default='40.7,-74.0',
+            help='The reference point, as "lat,lng"'),
+        make_option('--distance', default='1km',
+            help='The distance to search within'),
+        make_option('--page-size', type='int', default=100,
+            help='Number of places to fetch'),
+        make_option('--repeat', type='int', default=5,
+            help='Number of times to run each query'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 2:
+            raise CommandError('Usage: benchmarknearby %s' % self.args)
+
+        owner_username, dataset_slug = args
+        try:
+            reference = to_geom(options['near'])
+            distance = to_distance(options['distance'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['create']:
+            dataset = self.create_dataset(owner_username, dataset_slug, reference, options['create'])
+        else:
+            try:
+                dataset = DataSet.objects.get(owner__username=owner_username, slug=dataset_slug)
+            except DataSet.DoesNotExist:
+                raise CommandError('No dataset %s/%s' % (owner_username, dataset_slug))
+
+        places = Place.objects.filter(dataset=dataset, visible=True)
+        page_size = options['page_size']
+        self.stdout.write('%s places' % places.count())
+
+        queries = [
+            ('near, full scan', lambda:
+                places.distance(reference).order_by('distance')),
+            ('near, spatial index', lambda:
+                places.order_by_distance(reference)),
+            ('near within %s, full scan' % options['distance'], lambda:
+                places.filter(geometry__distance_lt=(reference, distance))
+                      .distance(reference).order_by('distance')),
+            ('near within %s, spatial index' % options['distance'], lambda:
+                places.filter_by_distance(reference, distance)
+                      .distance(reference).order_by('distance')),
+        ]
+
+        for label, get_queryset in queries:
+            list(get_queryset()[:page_size])  # Warm up
+
+            start = time.time()
+            for _ in range(options['repeat']):
+                results = list(get_queryset()[:page_size])
+            duration = (time.time() - start) / options['repeat']
+
+            self.stdout.write('%s: %0.4fs for %s places' % (label, duration, len(results)))
+
+    def create_dataset(self, owner_username, dataset_slug, center, count):
+        """
+        Create a dataset with count random points within about a degree of
+        the center.
+        """
+        owner, _ = User.objects.get_or_create(username=owner_username)
+        if DataSet.objects.filter(owner=owner, slug=dataset_slug).exists():
+            raise CommandError('Dataset %s/%s already exists' % (owner_username, dataset_slug))
+
+        dataset = DataSet.objects.create(owner=owner, slug=dataset_slug, display_name=dataset_slug)
+
+        # Insert the points in bulk; saving each place would take most of
+        # the time.
+        with transaction.atomic():
+            cursor = connection.cursor()
+            cursor.execute(
+                'WITH things AS ('
+                '  INSERT INTO sa_api_submittedthing (data, dataset_id, visible, created_datetime, updated_datetime)'
+                '  SELECT %s, %s, TRUE, NOW(), NOW() FROM generate_series(1, %s)'
+                '  RETURNING id'
+                ')'
+                ' INSERT INTO sa_api_place (submittedthing_ptr_id, geometry)'
+                ' SELECT id, ST_SetSRID(ST_MakePoint(%s + 2 * random() - 1, %s + 2 * random() - 1), 4326)'
+                '   FROM things',
+                ['{}', dataset.id, count, center.x, center.y])
+            cursor.execute('ANALYZE sa_api_place')
+            DataSetCounter.objects.rebuild(dataset)
+
+        return dataset
@@ -0,0 +1,63 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.test.client import RequestFactory
+from optparse import make_option
+from sa_api_v2.models import DataSet
+from sa_api_v2.serializers import ShareaboutsFieldMixin
+from sa_api_v2.views import PlaceListView
+import time
+
+class Command(BaseCommand):
+    args = '<owner_username> <dataset_slug>'
+    help = ('Time building the place list for a dataset, with URLs built by '
+            'reverse() and by precompiled URL templates.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--repeat', type='int', default=5,
+            help='Number of times to build the list in each mode'),
+        make_option('--page-size', type='int', default=1000,
+            help='Number of places per page'),
+        make_option('--include-submissions', action='store_true', default=False,
+            help='Include the submissions for each place'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 2:
+            raise CommandError('Usage: benchmarkplacelist %s' % self.args)
+
+        owner_username, dataset_slug = args
+        if not DataSet.objects.filter(owner__username=owner_username, slug=dataset_slug).exists():
+            raise CommandError('No dataset %s/%s' % (owner_username, dataset_slug))
+
+        kwargs = {'owner_username': owner_username, 'dataset_slug': dataset_slug}
+        path = reverse('place-list', kwargs=kwargs)
+        params = {'page_size': options['page_size']}
+        if options['include_submissions']:
+            params['include_submissions'] = 'on'
+
+        view = PlaceListView.as_view()
+
+        def build_list():
+            request = RequestFactory().get(path, params)
+            request.user = AnonymousUser()
+            # Skip the response cache, so that the list is built every time.
+            request.refresh_cache = True
+            response = view(request, **kwargs)
+            response.render()
+
+        original = ShareaboutsFieldMixin.use_url_templates
+        try:
+            for use_url_templates in (False, True):
+                ShareaboutsFieldMixin.use_url_templates = use_url_templates
+                build_list()  # Warm up
+
+                start = time.time()
+                for _ in range(options['repeat']):
+                    build_list()
+                duration = (time.time() - start) / options['repeat']
+
+                self.stdout.write('%s: %0.3fs per list' % (
+                    'URL templates' if use_url_templates else 'reverse()', duration))
+        finally:
+            ShareaboutsFieldMixin.use_url_templates = original
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from sa_api_v2.models import DataSet, DataAttribute
+
+import logging
+log = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    args = '[<owner_username> <dataset_slug>]'
+    help = ('Recount the data attributes of the places and submissions in '
+            'one dataset or in all of them.')
+
+    def handle(self, *args, **options):
+        if len(args) not in (0, 2):
+            raise CommandError('Usage: rebuilddataattributes %s' % self.args)
+
+        if args:
+            owner_username, dataset_slug = args
+            try:
+                datasets = [DataSet.objects.get(owner__username=owner_username, slug=dataset_slug)]
+            except DataSet.DoesNotExist:
+                raise CommandError('No dataset %s/%s' % (owner_username, dataset_slug))
+        else:
+            datasets = DataSet.objects.all().select_related('owner')
+
+        count = 0
+        for dataset in datasets:
+            log.info('Recounting data attributes in %s/%s' % (dataset.owner.username, dataset.slug))
+            count += DataAttribute.objects.rebuild(dataset)
+
+        self.stdout.write('Stored %s data attributes' % count)
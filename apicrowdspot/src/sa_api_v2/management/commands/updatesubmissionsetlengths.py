@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from optparse import make_option
+from sa_api_v2.models import DataSet, SubmissionSet
+
+import logging
+log = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    args = '[<owner_username> <dataset_slug>]'
+    help = ('Recount the visible and total submissions stored on each '
+            'submission set, for one dataset or for all of them.')
+
+    def handle(self, *args, **options):
+        if len(args) not in (0, 2):
+            raise CommandError('Usage: updatesubmissionsetlengths %s' % self.args)
+
+        if args:
+            owner_username, dataset_slug = args
+            try:
+                dataset = DataSet.objects.get(owner__username=owner_username, slug=dataset_slug)
+            except DataSet.DoesNotExist:
+                raise CommandError('No dataset %s/%s' % (owner_username, dataset_slug))
+
+            log.info('Recounting submissions in %s/%s' % (owner_username, dataset_slug))
+            ids = SubmissionSet.objects.filter(place__dataset=dataset).values_list('id', flat=True)
+            count = SubmissionSet.objects.update_lengths(ids)
+        else:
+            log.info('Recounting submissions in all datasets')
+            count = SubmissionSet.objects.update_lengths()
+
+        self.stdout.write('Updated %s submission sets' % count)
@@ -1,5 +1,6 @@
 import time
 import logging
+from .cache import cache_buffer
 
 class RequestTimeLogger (object):
     def process_request(self, request):
@@ -64,4 +65,19 @@ class UniversalP3PHeader (object):
     """
     def process_response(self, request, response):
         response['P3P'] = 'CP="Shareabouts does not have a P3P policy."'
-        return response
\ No newline at end of file
+        return response
+
+class CacheBufferMiddleware (object):
+    """
+    Gives each request its own cache buffer, and writes out anything left in
+    the buffer once the response is ready.
+    """
+    def process_request(self, request):
+        cache_buffer.bind()
+
+    def process_response(self, request, response):
+        try:
+            cache_buffer.flush()
+        finally:
+            cache_buffer.unbind()
+        return response
@@ -1,4 +1,6 @@
 from .core import *
+from .data_counters import *
+from .data_attributes import *
 from .data_indexes import *
 from .data_permissions import *
 from .profiles import *
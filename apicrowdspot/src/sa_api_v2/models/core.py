@@ -1,13 +1,17 @@
-import ujson as json
 from django.contrib.gis.db import models
 from django.contrib.gis.db.models import query
+from django.contrib.gis.geos import Point
 from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models.signals import pre_delete
 from django.core.files.storage import get_storage_class
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils.timezone import now
 from django.utils.importlib import import_module
 from .. import cache
 from .. import utils
+from .data_stats import (DataSetStatsMixin, PlaceStatsMixin, SubmissionStatsMixin,
+    deleting_in_bulk, forget_deleted_thing)
 from .data_indexes import IndexedValue, FilterByIndexMixin
 from .profiles import User
 import sa_api_v1.models
@@ -89,7 +93,7 @@ class SubmittedThingManager (FilterByIndexMixin, models.Manager):
         return SubmittedThingQuerySet(self.model, using=self._db)
 
 
-class SubmittedThing (CacheClearingModel, ModelWithDataBlob, TimeStampedModel):
+class SubmittedThing (DataSetStatsMixin, CacheClearingModel, ModelWithDataBlob, TimeStampedModel):
     """
     A SubmittedThing generally comes from the end-user.  It may be a place, a
     comment, a vote, etc.
@@ -109,17 +113,14 @@ class SubmittedThing (CacheClearingModel, ModelWithDataBlob, TimeStampedModel):
         if indexes is None:
             indexes = self.dataset.indexes.all()
 
-        if len(indexes) == 0:
-            return
-
-        data = json.loads(self.data)
-        for index in indexes:
-            IndexedValue.objects.sync(self, index, data=data)
+        IndexedValue.objects.sync_things([(self.id, self.data)], indexes)
 
     def save(self, silent=False, source='', reindex=True, *args, **kwargs):
         is_new = (self.id == None)
 
-        ret = super(SubmittedThing, self).save(*args, **kwargs)
+        with transaction.atomic():
+            ret = super(SubmittedThing, self).save(*args, **kwargs)
+            self.sync_dataset_stats()
 
         if reindex:
             self.index_values()
@@ -156,6 +157,12 @@ class DataSet (CacheClearingModel, models.Model):
         unique_together = (('owner', 'slug'),
                            )
 
+    def delete(self, *args, **kwargs):
+        # The dataset's counters and data attributes are deleted along with
+        # it, so its things needn't be taken out of them one by one.
+        with deleting_in_bulk(dataset_ids=[self.pk]):
+            return super(DataSet, self).delete(*args, **kwargs)
+
     @property
     def places(self):
         if not hasattr(self, '_places'):
@@ -172,12 +179,67 @@ class DataSet (CacheClearingModel, models.Model):
     def get_permissions(self):
         return self.permissions
 
-    def reindex(self):
-        things = self.things.all()
-        indexes = self.indexes.all()
+    def get_attribute_names(self, submission_set_name='places'):
+        """
+        Get the sorted names of the data attributes used by the dataset's
+        places, or by its submissions in the named submission set.
+        """
+        return sorted(set(self.attributes
+            .filter(submission_set_name=submission_set_name, count__gt=0)
+            .values_list('attr_name', flat=True)))
+
+    def get_submission_set_names(self):
+        return sorted(set(SubmissionSet.objects
+            .filter(place__dataset=self)
+            .values_list('name', flat=True)))
+
+    def reindex(self, indexes=None, chunk_size=1000, progress=None):
+        """
+        Sync the values of the given indexes (or all of the dataset's
+        indexes) for every thing in the dataset, a chunk of things at a time
+        in order of id. After each chunk, progress is called, if given, with
+        the number of things done and the total number of things.
+        """
+        if indexes is None:
+            indexes = self.indexes.all()
+        indexes = list(indexes)
+        if not indexes:
+            return
+
+        things = self.things.order_by('pk').values_list('pk', 'data')
+        total = things.count() if progress else None
+        done = last_pk = 0
+
+        while True:
+            chunk = list(things.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+
+            IndexedValue.objects.sync_things(chunk, indexes)
+            done += len(chunk)
+            last_pk = chunk[-1][0]
+
+            if progress:
+                progress(done, total)
+
+    def schedule_reindex(self, indexes=None):
+        """
+        Reindex the dataset in a background task, unless it has few enough
+        things to reindex right away.
+        """
+        if self.things.count() < settings.API_BACKGROUND_REINDEX_MIN_THINGS:
+            self.reindex(indexes)
+            return
 
-        for thing in things:
-            thing.index_values(indexes)
+        # The task is queued before the caller's transaction is committed, so
+        # send the indexes' attributes along for the task to check.
+        from ..tasks import reindex_dataset
+        if indexes is None:
+            reindex_dataset.delay(self.id)
+        else:
+            indexes = list(indexes)
+            reindex_dataset.delay(self.id, [index.id for index in indexes],
+                                  [[index.attr_name, index.attr_type] for index in indexes])
 
 
 class Webhook (TimeStampedModel):
@@ -204,7 +266,153 @@ class Webhook (TimeStampedModel):
 
 
 class GeoSubmittedThingQuerySet (query.GeoQuerySet, SubmittedThingQuerySet):
-    pass
+    def get_reference_geometry(self, reference, field_name='geometry'):
+        """
+        Get a copy of the reference geometry in the coordinate system of the
+        geometry field.
+        """
+        srid = self.model._meta.get_field(field_name).srid
+        reference = reference.clone()
+        if reference.srid is None:
+            reference.srid = srid
+        elif reference.srid != srid:
+            reference.transform(srid)
+        return reference
+
+    def filter_by_distance(self, reference, distance, field_name='geometry'):
+        """
+        Filter to the things within the distance (a Distance) of the
+        reference geometry. Distances from geographic coordinates are
+        measured in meters on the sphere, which can't use the spatial index,
+        so things are first narrowed down to those whose bounding boxes
+        overlap a box around the reference.
+        """
+        connection = connections[self.db]
+        field = self.model._meta.get_field(field_name)
+        reference = self.get_reference_geometry(reference, field_name)
+
+        if not field.geodetic(connection):
+            return self.filter(**{field_name + '__dwithin': (reference, distance)})
+
+        envelope = utils.get_distance_envelope(reference, distance)
+        return self\
+            .filter(**{field_name + '__bboverlaps': envelope})\
+            .filter(**{field_name + '__distance_lt': (reference, distance)})
+
+    def order_by_distance(self, reference, field_name='geometry'):
+        """
+        Order the things by distance from the reference geometry, nearest
+        first, with the distance (in meters, for geographic coordinates) in
+        each thing's distance attribute.
+
+        On PostGIS 2.0 and later the order comes from a KNN scan of the
+        spatial index (the <-> operator), so a page of the nearest things
+        doesn't need the distance to every thing in the queryset. KNN
+        measures between the centers of bounding boxes, in the units of the
+        coordinates, so the order is approximate for geographic coordinates
+        away from the equator.
+        """
+        connection = connections[self.db]
+        reference = self.get_reference_geometry(reference, field_name)
+        queryset = self.distance(reference, field_name=field_name)
+
+        if not getattr(connection.ops, 'postgis', False) or connection.ops.spatial_version < (2, 0, 0):
+            return queryset.order_by('distance')
+
+        qn = connection.ops.quote_name
+        column = '%s.%s' % (qn(self.model._meta.db_table),
+                            qn(self.model._meta.get_field(field_name).column))
+        return queryset\
+            .extra(select={'knn_distance': column + ' <-> ST_GeomFromEWKT(%s)'},
+                   select_params=[reference.ewkt])\
+            .order_by('knn_distance')
+
+    def simplified_geojson(self, tolerance, precision=8, field_name='geometry'):
+        """
+        Like geojson, but with each geometry simplified first, so that no
+        vertex is dropped that is more than tolerance (in the units of the
+        coordinates) from the simplified shape. Simplification preserves
+        topology, so polygons stay valid, and points are left alone.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        column = '%s.%s' % (qn(self.model._meta.db_table),
+                            qn(self.model._meta.get_field(field_name).column))
+        return self.extra(
+            select={'geojson': 'ST_AsGeoJSON(ST_SimplifyPreserveTopology(%s, %%s), %%s)' % column},
+            select_params=[tolerance, precision])
+
+    def cluster(self, cell_size, index=None, field_name='geometry'):
+        """
+        Group the things by the cell of a grid, cell_size wide in the units
+        of the coordinates, that their centroids fall in. The grouping is
+        done in the database, so the things themselves are never loaded.
+
+        Returns a list of clusters, largest first, each a dict with the
+        center of its things (a Point), its count, and the bbox of its things
+        as [xmin, ymin, xmax, ymax]. If a DataIndex is given, each cluster
+        also has the number of its things with each of the index's values,
+        under categories.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        field = self.model._meta.get_field(field_name)
+        table = qn(self.model._meta.db_table)
+        column = '%s.%s' % (table, qn(field.column))
+        pk_column = '%s.%s' % (table, qn(self.model._meta.pk.column))
+
+        ids_sql, ids_params = self.order_by().values('pk').query.sql_with_params()
+
+        if index is not None:
+            values_table = qn(IndexedValue._meta.db_table)
+            category_column = '%s.%s' % (values_table, qn(IndexedValue._meta.get_field('value').column))
+            join_sql = 'LEFT JOIN %s ON (%s.%s = %s AND %s.%s = %%s)' % (
+                values_table,
+                values_table, qn(IndexedValue._meta.get_field('thing').column), pk_column,
+                values_table, qn(IndexedValue._meta.get_field('index').column))
+            join_params = [index.id]
+        else:
+            category_column = 'NULL'
+            join_sql = ''
+            join_params = []
+
+        # Each row is one cell, or with an index, one category within a cell.
+        cursor = connection.cursor()
+        cursor.execute(
+            'SELECT FLOOR(ST_X(c) / %%s) AS cell_x, FLOOR(ST_Y(c) / %%s) AS cell_y, category, '
+            '       COUNT(*), SUM(ST_X(c)), SUM(ST_Y(c)), '
+            '       MIN(ST_XMin(g)), MIN(ST_YMin(g)), MAX(ST_XMax(g)), MAX(ST_YMax(g))'
+            '  FROM (SELECT %s AS g, ST_Centroid(%s) AS c, %s AS category'
+            '          FROM %s %s'
+            '         WHERE %s IN (%s)) AS things'
+            ' GROUP BY cell_x, cell_y, category' % (
+                column, column, category_column, table, join_sql, pk_column, ids_sql),
+            [cell_size, cell_size] + join_params + list(ids_params))
+
+        clusters = {}
+        sums = {}
+        for cell_x, cell_y, category, count, sum_x, sum_y, xmin, ymin, xmax, ymax in cursor.fetchall():
+            cell = (cell_x, cell_y)
+            if cell not in clusters:
+                clusters[cell] = {'count': 0, 'bbox': [xmin, ymin, xmax, ymax]}
+                if index is not None:
+                    clusters[cell]['categories'] = {}
+                sums[cell] = [0.0, 0.0]
+
+            cluster = clusters[cell]
+            cluster['count'] += count
+            cluster['bbox'] = [min(cluster['bbox'][0], xmin), min(cluster['bbox'][1], ymin),
+                               max(cluster['bbox'][2], xmax), max(cluster['bbox'][3], ymax)]
+            if category is not None:
+                cluster['categories'][category] = count
+            sums[cell][0] += sum_x
+            sums[cell][1] += sum_y
+
+        for cell, cluster in clusters.iteritems():
+            sum_x, sum_y = sums[cell]
+            cluster['geometry'] = Point(sum_x / cluster['count'], sum_y / cluster['count'], srid=field.srid)
+
+        return sorted(clusters.values(), key=lambda cluster: -cluster['count'])
 
 
 class GeoSubmittedThingManager (models.GeoManager, SubmittedThingManager):
@@ -212,7 +420,7 @@ class GeoSubmittedThingManager (models.GeoManager, SubmittedThingManager):
         return GeoSubmittedThingQuerySet(self.model, using=self._db)
 
 
-class Place (SubmittedThing):
+class Place (PlaceStatsMixin, SubmittedThing):
     """
     A Place is a submitted thing with some geographic information, to which
     other submissions such as comments or surveys can be attached.
@@ -223,6 +431,7 @@ class Place (SubmittedThing):
     objects = GeoSubmittedThingManager()
     cache = cache.PlaceCache()
     previous_version = 'sa_api_v1.models.Place'
+    submission_model = 'sa_api_v2.models.Submission'
 
     class Meta:
         app_label = 'sa_api_v2'
@@ -230,6 +439,35 @@ class Place (SubmittedThing):
         ordering = ['-updated_datetime']
 
 
+class SubmissionSetManager (models.Manager):
+    def update_lengths(self, ids=None):
+        """
+        Recount the visible and total submissions in the submission sets with
+        the given ids, or in every submission set if no ids are given. The
+        counts are made and stored in a single statement, so concurrent saves
+        cannot leave them out of date.
+        """
+        sql = (
+            'UPDATE sa_api_submissionset AS ss SET'
+            ' total_length = (SELECT COUNT(*) FROM sa_api_submission AS s'
+            '                  WHERE s.parent_id = ss.id),'
+            ' visible_length = (SELECT COUNT(*) FROM sa_api_submission AS s'
+            '                     JOIN sa_api_submittedthing AS t ON (s.submittedthing_ptr_id = t.id)'
+            '                    WHERE s.parent_id = ss.id AND t.visible)'
+        )
+        params = []
+
+        if ids is not None:
+            params = [id for id in set(ids) if id is not None]
+            if not params:
+                return 0
+            sql += ' WHERE ss.id IN (%s)' % ', '.join(['%s'] * len(params))
+
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
 class SubmissionSet (CacheClearingModel, models.Model):
     """
     A submission set is a collection of user Submissions attached to a place.
@@ -240,6 +478,14 @@ class SubmissionSet (CacheClearingModel, models.Model):
     place = models.ForeignKey(Place, related_name='submission_sets')
     name = models.CharField(max_length=128)
 
+    # Denormalized submission counts, so that summaries of the set don't have
+    # to load its submissions. These are maintained by Submission.save and
+    # Submission.delete, and can be repaired with the updatesubmissionsetlengths
+    # management command.
+    visible_length = models.PositiveIntegerField(default=0, editable=False)
+    total_length = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = SubmissionSetManager()
     cache = cache.SubmissionSetCache()
     previous_version = 'sa_api_v1.models.SubmissionSet'
 
@@ -253,7 +499,7 @@ class SubmissionSet (CacheClearingModel, models.Model):
         return self.name
 
 
-class Submission (SubmittedThing):
+class Submission (SubmissionStatsMixin, SubmittedThing):
     """
     A Submission is the simplest flavor of SubmittedThing.
     It belongs to a SubmissionSet, and thus indirectly to a Place.
@@ -282,6 +528,13 @@ class Submission (SubmittedThing):
         db_table = 'sa_api_submission'
         ordering = ['-updated_datetime']
 
+    def get_set_name(self, submission_set):
+        return submission_set.name
+
+
+pre_delete.connect(forget_deleted_thing, sender=Place, dispatch_uid="place-forget-deleted-thing")
+pre_delete.connect(forget_deleted_thing, sender=Submission, dispatch_uid="submission-forget-deleted-thing")
+
 
 class Action (CacheClearingModel, TimeStampedModel):
     """
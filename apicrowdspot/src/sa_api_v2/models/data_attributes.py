@@ -0,0 +1,159 @@
+import operator
+import ujson as json
+from collections import defaultdict
+from django.contrib.gis.db import models
+from django.db import IntegrityError, transaction
+
+
+def get_attribute_type(value):
+    if value is None:
+        return 'null'
+    elif isinstance(value, bool):
+        return 'boolean'
+    elif isinstance(value, (int, long, float)):
+        return 'number'
+    elif isinstance(value, basestring):
+        return 'string'
+    elif isinstance(value, list):
+        return 'array'
+    else:
+        return 'object'
+
+
+def get_attribute_types(data):
+    """
+    Map the name of each attribute in a JSON data blob to the type of its
+    value.
+    """
+    if not data:
+        return {}
+    return dict((name, get_attribute_type(value))
+                for name, value in json.loads(data).iteritems())
+
+
+class DataAttributeManager (models.Manager):
+    def record(self, dataset_id, submission_set_name, old_data, new_data):
+        """
+        Update the attribute counts for a thing in the given dataset and
+        submission set (or 'places') whose data blob changed from old_data to
+        new_data. Either may be None, for a new or a deleted thing.
+        """
+        old_types = get_attribute_types(old_data)
+        new_types = get_attribute_types(new_data)
+
+        removed = [(name, attr_type) for name, attr_type in old_types.iteritems()
+                   if new_types.get(name) != attr_type]
+        added = [(name, attr_type) for name, attr_type in new_types.iteritems()
+                 if old_types.get(name) != attr_type]
+
+        if removed:
+            self.change_counts(dataset_id, submission_set_name, removed, -1)
+        if added:
+            self.change_counts(dataset_id, submission_set_name, added, 1)
+
+    def change_counts(self, dataset_id, submission_set_name, keys, delta):
+        attributes = self.filter(dataset_id=dataset_id, submission_set_name=submission_set_name)
+        matches_any_key_clause = reduce(
+            operator.or_,
+            [models.Q(attr_name=name, attr_type=attr_type) for name, attr_type in keys])
+        attributes = attributes.filter(matches_any_key_clause)
+
+        if delta < 0:
+            # Don't count below zero, in case the counts have drifted.
+            updated = attributes.filter(count__gte=-delta).update(count=models.F('count') + delta)
+            if updated < len(keys):
+                attributes.filter(count__lt=-delta).update(count=0)
+            return
+
+        updated = attributes.update(count=models.F('count') + delta)
+        if updated == len(keys):
+            return
+
+        existing = set(attributes.values_list('attr_name', 'attr_type'))
+        for name, attr_type in keys:
+            if (name, attr_type) in existing:
+                continue
+
+            try:
+                with transaction.atomic():
+                    self.create(dataset_id=dataset_id, submission_set_name=submission_set_name,
+                                attr_name=name, attr_type=attr_type, count=delta)
+            except IntegrityError:
+                # Another save created the attribute since we looked.
+                self.filter(dataset_id=dataset_id, submission_set_name=submission_set_name,
+                            attr_name=name, attr_type=attr_type)\
+                    .update(count=models.F('count') + delta)
+
+    def rebuild(self, dataset):
+        """
+        Recount the attributes of all of the dataset's places and submissions
+        from their data blobs. Returns the number of attributes stored.
+        """
+        counts = defaultdict(int)
+
+        for data in dataset.places.values_list('data', flat=True).iterator():
+            for name, attr_type in get_attribute_types(data).iteritems():
+                counts[('places', name, attr_type)] += 1
+
+        submissions = dataset.submissions.values_list('parent__name', 'data')
+        for submission_set_name, data in submissions.iterator():
+            for name, attr_type in get_attribute_types(data).iteritems():
+                counts[(submission_set_name, name, attr_type)] += 1
+
+        with transaction.atomic():
+            self.filter(dataset=dataset).delete()
+            self.bulk_create([
+                DataAttribute(dataset=dataset, submission_set_name=submission_set_name,
+                              attr_name=name, attr_type=attr_type, count=count)
+                for (submission_set_name, name, attr_type), count in counts.iteritems()])
+
+        return len(counts)
+
+    def get_schema(self, dataset):
+        """
+        Get a mapping from each submission set name (and 'places') in the
+        dataset to the attributes used in it, with the number of things that
+        have each attribute, by the type of its value.
+        """
+        schema = defaultdict(dict)
+        attributes = self.filter(dataset=dataset, count__gt=0)\
+            .order_by('submission_set_name', 'attr_name', 'attr_type')
+        for attribute in attributes:
+            attr_schema = schema[attribute.submission_set_name].setdefault(
+                attribute.attr_name, {'count': 0, 'types': {}})
+            attr_schema['count'] += attribute.count
+            attr_schema['types'][attribute.attr_type] = attribute.count
+        return dict(schema)
+
+
+class DataAttribute (models.Model):
+    """
+    The number of places, or of submissions in a submission set, in a dataset
+    that have a given data attribute with a value of a given type. These are
+    maintained by SubmittedThing.save and delete, and can be rebuilt with the
+    rebuilddataattributes management command.
+    """
+    ATTR_TYPE_CHOICES = (
+        ('string', 'String'),
+        ('number', 'Number'),
+        ('boolean', 'Boolean'),
+        ('null', 'Null'),
+        ('array', 'Array'),
+        ('object', 'Object'),
+    )
+
+    dataset = models.ForeignKey('DataSet', related_name='attributes')
+    submission_set_name = models.CharField(max_length=128)
+    attr_name = models.TextField(verbose_name='Attribute name')
+    attr_type = models.CharField(max_length=10, choices=ATTR_TYPE_CHOICES, verbose_name='Attribute type')
+    count = models.PositiveIntegerField(default=0)
+
+    objects = DataAttributeManager()
+
+    class Meta:
+        app_label = 'sa_api_v2'
+        unique_together = (('dataset', 'submission_set_name', 'attr_name', 'attr_type'),
+                           )
+
+    def __unicode__(self):
+        return self.attr_name
@@ -0,0 +1,113 @@
+from collections import defaultdict
+from django.contrib.gis.db import models
+from django.db import IntegrityError, transaction
+
+
+class DataSetCounterManager (models.Manager):
+    def record(self, old_key, new_key):
+        """
+        Move a thing from the counter with old_key to the one with new_key.
+        Each key is a (dataset id, submission set name, visibility) tuple,
+        and either may be None, for a new or a deleted thing.
+        """
+        if old_key == new_key:
+            return
+        if old_key is not None:
+            self.change_count(old_key, -1)
+        if new_key is not None:
+            self.change_count(new_key, 1)
+
+    def change_count(self, key, delta):
+        dataset_id, submission_set_name, visible = key
+        counters = self.filter(dataset_id=dataset_id,
+                               submission_set_name=submission_set_name,
+                               visible=visible)
+
+        if delta < 0:
+            # Don't count below zero, in case the counter has drifted.
+            if not counters.filter(count__gte=-delta).update(count=models.F('count') + delta):
+                counters.update(count=0)
+            return
+
+        if counters.update(count=models.F('count') + delta):
+            return
+
+        try:
+            with transaction.atomic():
+                self.create(dataset_id=dataset_id, submission_set_name=submission_set_name,
+                            visible=visible, count=delta)
+        except IntegrityError:
+            # Another save created the counter since we looked.
+            counters.update(count=models.F('count') + delta)
+
+    def rebuild(self, dataset):
+        """
+        Recount the visible and invisible places and submissions in the
+        dataset. Returns the number of counters stored.
+        """
+        counts = defaultdict(int)
+
+        places = dataset.places.order_by().values('visible').annotate(count=models.Count('id'))
+        for row in places:
+            counts[('places', row['visible'])] += row['count']
+
+        submissions = dataset.submissions.order_by()\
+            .values('parent__name', 'visible').annotate(count=models.Count('id'))
+        for row in submissions:
+            counts[(row['parent__name'], row['visible'])] += row['count']
+
+        with transaction.atomic():
+            self.filter(dataset=dataset).delete()
+            self.bulk_create([
+                DataSetCounter(dataset=dataset, submission_set_name=submission_set_name,
+                               visible=visible, count=count)
+                for (submission_set_name, visible), count in counts.iteritems()])
+
+        return len(counts)
+
+    def get_counts(self, datasets, include_invisible=False):
+        """
+        Get a mapping from the id of each of the given datasets to a mapping
+        from each of its submission set names (and 'places') to the number of
+        things in it. Invisible things are only counted if include_invisible
+        is set.
+        """
+        counters = self.filter(dataset__in=datasets, count__gt=0)
+        if not include_invisible:
+            counters = counters.filter(visible=True)
+
+        counts = defaultdict(dict)
+        rows = counters.values_list('dataset_id', 'submission_set_name', 'count')
+        for dataset_id, submission_set_name, count in rows:
+            dataset_counts = counts[dataset_id]
+            dataset_counts[submission_set_name] = dataset_counts.get(submission_set_name, 0) + count
+        return dict(counts)
+
+    def get_count(self, dataset, submission_set_name, include_invisible=False):
+        counters = self.filter(dataset=dataset, submission_set_name=submission_set_name)
+        if not include_invisible:
+            counters = counters.filter(visible=True)
+        return counters.aggregate(count=models.Sum('count'))['count'] or 0
+
+
+class DataSetCounter (models.Model):
+    """
+    The number of visible or invisible places, or submissions in a submission
+    set, in a dataset. These are maintained by SubmittedThing.save and delete,
+    in the same transaction as the thing, and can be reconciled with the
+    things with the rebuilddatasetcounters management command.
+    """
+    dataset = models.ForeignKey('DataSet', related_name='counters')
+    submission_set_name = models.CharField(max_length=128)
+    visible = models.BooleanField(default=True)
+    count = models.PositiveIntegerField(default=0)
+
+    objects = DataSetCounterManager()
+
+    class Meta:
+        app_label = 'sa_api_v2'
+        unique_together = (('dataset', 'submission_set_name', 'visible'),
+                           )
+
+    def __unicode__(self):
+        return self.submission_set_name
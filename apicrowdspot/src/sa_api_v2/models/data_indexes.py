@@ -1,11 +1,19 @@
 import operator
 import ujson as json
+from datetime import datetime, time
+from django.conf import settings
 from django.contrib.gis.db import models
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 
 class DataIndex (models.Model):
     ATTR_TYPE_CHOICES = (
         ('string', 'String'),
+        ('number', 'Number'),
+        ('boolean', 'Boolean'),
+        ('datetime', 'Date/time'),
     )
 
     dataset = models.ForeignKey('DataSet', related_name='indexes')
@@ -19,53 +27,85 @@ class DataIndex (models.Model):
         return self.attr_name
 
     def index_things(self):
-        things = self.dataset.things.all()
-        for thing in things:
-            IndexedValue.objects.sync(thing, self)
+        self.dataset.reindex([self])
 
     def save(self, reindex=True, *args, **kwargs):
         ret = super(DataIndex, self).save(*args, **kwargs)
         if reindex:
-            self.index_things()
+            self.dataset.schedule_reindex([self])
         return ret
 
 
 class IndexedValueManager (models.Manager):
     def sync(self, thing, index, data=None):
         if data is None:
-            data = json.loads(thing.data)
+            data = thing.data
+        self.sync_things([(thing.id, data)], [index])
 
-        if index.attr_name in data:
-            # If there is a value, index it.
-            try:
-                value = self.get(thing_id=thing.id, index_id=index.id)
-            except IndexedValue.DoesNotExist:
-                value = IndexedValue(thing_id=thing.id, index_id=index.id)
+    def sync_things(self, things, indexes):
+        """
+        Sync the values of the given indexes for a batch of things, given as
+        (id, data) pairs. The existing values are read in one query, and the
+        stale ones are replaced with one delete and one bulk insert.
+        """
+        things = list(things)
+        indexes = list(indexes)
+        if not things or not indexes:
+            return
+
+        value_fields = IndexedValue.VALUE_FIELDS.values()
+
+        # Work out what the indexed values should be...
+        expected = {}
+        for thing_id, data in things:
+            if isinstance(data, basestring):
+                data = json.loads(data)
+            for index in indexes:
+                if index.attr_name in data:
+                    expected[(thing_id, index.id)] = get_indexed_value_fields(index, data[index.attr_name])
+
+        # ...and keep the ones that already are.
+        stale_ids = []
+        existing_values = self\
+            .filter(thing__in=[thing_id for thing_id, _ in things],
+                    index__in=[index.id for index in indexes])\
+            .values('id', 'thing', 'index', *value_fields)
+        for existing in existing_values:
+            key = (existing['thing'], existing['index'])
+            if expected.get(key) == dict((field, existing[field]) for field in value_fields):
+                del expected[key]
+            else:
+                stale_ids.append(existing['id'])
 
-            new_indexable_value = unicode(data[index.attr_name])
-            if value.value != new_indexable_value:
-                value.value = new_indexable_value
-                value.save()
-        else:
-            # If there's no value and there was one previously indexed, get
-            # rid of it.
-            self.filter(thing_id=thing.id, index_id=index.id).delete()
+        with transaction.atomic():
+            if stale_ids:
+                self.filter(id__in=stale_ids).delete()
+            if expected:
+                self.bulk_create([
+                    IndexedValue(thing_id=thing_id, index_id=index_id, **fields)
+                    for (thing_id, index_id), fields in expected.iteritems()])
 
 
 class IndexedValue (models.Model):
     index = models.ForeignKey('DataIndex', related_name='values')
     thing = models.ForeignKey('SubmittedThing', related_name='indexed_values')
 
+    # Every value is stored as a string. Values of number, boolean and
+    # datetime indexes are also stored in the corresponding typed field, so
+    # that they can be compared appropriately (less than operates differently
+    # on strings than on numbers). Values that cannot be read as the index's
+    # type are left null there.
     value = models.CharField(max_length=100, null=True, db_index=True)
-    # TODO: This might be better as:
-    #
-    #   * string_value
-    #   * number_value
-    #   * boolean_value
-    #   * datetime_value
-    #
-    #   So that we can use the appropriate comparisons for each (i.e., less
-    #   than operates differently on strings than on numbers)
+    number_value = models.FloatField(null=True, db_index=True)
+    boolean_value = models.NullBooleanField(db_index=True)
+    datetime_value = models.DateTimeField(null=True, db_index=True)
+
+    VALUE_FIELDS = {
+        'string': 'value',
+        'number': 'number_value',
+        'boolean': 'boolean_value',
+        'datetime': 'datetime_value',
+    }
 
     objects = IndexedValueManager()
 
@@ -84,12 +124,137 @@ class FilterByIndexMixin (object):
     """
     Mixin for model managers of indexed models.
     """
-    def filter_by_index(self, key, *values):
+    def filter_by_index(self, key, *values, **kwargs):
+        """
+        Filter for things whose indexed value for the given attribute matches
+        any of the given values. The optional lookup ('exact', 'gt', 'gte',
+        'lt' or 'lte') is applied to the index's typed values, given the
+        index's attr_type. Raises ValueError if a value cannot be read as
+        that type.
+        """
+        lookup = kwargs.pop('lookup', 'exact')
+        attr_type = kwargs.pop('attr_type', 'string')
+        value_field = IndexedValue.VALUE_FIELDS[attr_type]
+
+        if attr_type != 'string':
+            values = [get_typed_value(attr_type, value, strict=True) for value in values]
+
         matches_any_values_clause = reduce(
             operator.or_,
-            [models.Q(indexed_values__value=value) for value in values])
-        return self\
-            .filter(indexed_values__index__attr_name=key)\
-            .filter(matches_any_values_clause)
+            [models.Q(**{'indexed_values__%s__%s' % (value_field, lookup): value})
+             for value in values])
+
+        # The conditions are applied in one call so that they must be met by
+        # the same indexed value.
+        return self.filter(
+            models.Q(indexed_values__index__attr_name=key) &
+            matches_any_values_clause)
+
+    def filter_by_data(self, key, *values):
+        """
+        Filter for things that have any of the given values for the given
+        attribute in their data blobs. Values are compared as text, so a
+        number matches its string form. Blobs that aren't JSON objects never
+        match.
+        """
+        connection = connections[self.db]
+        if connection.vendor == 'postgresql' and connection.pg_version >= 90300:
+            data_field = self.model._meta.get_field('data')
+            data_column = '%s.%s' % (
+                connection.ops.quote_name(data_field.model._meta.db_table),
+                connection.ops.quote_name(data_field.column))
+            placeholders = ', '.join(['%s'] * len(values))
+
+            # The ->> operator fails on arrays and scalars, so only apply it
+            # to blobs that hold an object.
+            value_expression = (
+                "CASE WHEN left(ltrim(%(data)s, E' \\t\\n\\r'), 1) = '{'"
+                " THEN %(data)s::json ->> %%s END" % {'data': data_column})
+
+            # Filtering on the data field makes sure that the table holding
+            # it is joined, even in count queries.
+            return self\
+                .filter(data__isnull=False)\
+                .extra(where=['(%s) IN (%s)' % (value_expression, placeholders)],
+                       params=[key] + list(values))
+
+        # The JSON operators are only available from PostgreSQL 9.3, so
+        # otherwise scan the data blobs in a single pass.
+        matching_pks = []
+        for pk, data in self.values_list('pk', 'data').iterator():
+            try:
+                data = json.loads(data)
+            except ValueError:
+                continue
+            if not isinstance(data, dict):
+                continue
+
+            value = data.get(key)
+            if value is not None and get_text_value(value) in values:
+                matching_pks.append(pk)
+        return self.filter(pk__in=matching_pks)
+
+
+def get_text_value(value):
+    """
+    Get a JSON value as PostgreSQL's ->> operator would return it.
+    """
+    if isinstance(value, basestring):
+        return value
+    return json.dumps(value)
+
+
+def get_indexed_value_fields(index, value):
+    """
+    Get the field values of an IndexedValue for the given data value.
+    """
+    fields = dict.fromkeys(IndexedValue.VALUE_FIELDS.values())
+    fields['value'] = unicode(value)
+    if index.attr_type != 'string':
+        fields[IndexedValue.VALUE_FIELDS[index.attr_type]] = get_typed_value(index.attr_type, value)
+    return fields
+
+
+def get_typed_value(attr_type, value, strict=False):
+    """
+    Read a data value, or a query parameter, as the given index type. Returns
+    None if it cannot be read, or raises ValueError if strict is set.
+    """
+    typed_value = None
+
+    if attr_type == 'string':
+        typed_value = value
+
+    elif attr_type == 'number':
+        if not isinstance(value, bool):
+            try:
+                typed_value = float(value)
+            except (TypeError, ValueError):
+                pass
+
+    elif attr_type == 'boolean':
+        if isinstance(value, bool):
+            typed_value = value
+        elif isinstance(value, basestring):
+            typed_value = {'true': True, '1': True, 'yes': True, 'on': True,
+                           'false': False, '0': False, 'no': False, 'off': False,
+                          }.get(value.lower())
+
+    elif attr_type == 'datetime':
+        if isinstance(value, basestring):
+            try:
+                typed_value = parse_datetime(value)
+                if typed_value is None:
+                    date_value = parse_date(value)
+                    if date_value is not None:
+                        typed_value = datetime.combine(date_value, time())
+            except ValueError:
+                pass
 
+            if (typed_value is not None and settings.USE_TZ and
+                timezone.is_naive(typed_value)):
+                typed_value = timezone.make_aware(typed_value, timezone.get_default_timezone())
 
+    if typed_value is None and strict:
+        raise ValueError('%r is not a valid %s value' % (value, attr_type))
+    return typed_value
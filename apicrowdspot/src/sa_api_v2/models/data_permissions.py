@@ -168,3 +168,106 @@ def check_data_permission(user, client, do_action, dataset, submission_set):
 
     return False
 
+
+class DataPermissionMatrix (object):
+    """
+    The answers to check_data_permission for a given user and client on a
+    dataset, for every action and submission set. Each kind of applicable
+    permission is loaded at most once, and only when it is needed, and each
+    answer is remembered in the matrix, a dictionary of
+    {do_action: {submission_set_name: allowed}}.
+    """
+    actions = ('retrieve', 'create', 'update', 'destroy')
+
+    def __init__(self, user, client, dataset):
+        self.user = user
+        self.client = client
+        self.dataset = dataset
+
+        # Superusers and the dataset owner can do anything
+        self.allow_all = bool(user and (user.is_superuser or
+                                        (dataset and user.id == dataset.owner_id)))
+
+        self.sources = self.get_permission_sources()
+        self.allowed_sets = []
+        self.matrix = dict((action, {}) for action in self.actions)
+
+    def get_permission_sources(self):
+        """
+        Get a list of functions that load the applicable permissions, in the
+        order that check_data_permission consults them: the dataset's, the
+        client's, and then those of the user's groups.
+        """
+        user, client, dataset = self.user, self.client, self.dataset
+        sources = []
+
+        if dataset:
+            sources.append(lambda: dataset.get_permissions().all_permissions())
+
+        if client is not None:
+            sources.append(lambda: client.permissions.all_permissions()
+                                   if client.dataset == dataset else [])
+
+        if dataset and user is not None and user.is_authenticated():
+            sources.append(lambda: [permission
+                                    for group in user.get_groups()
+                                    if group.dataset_id == dataset.id
+                                    for permission in group.get_permissions().all_permissions()])
+
+        return sources
+
+    def get_allowed_sets(self, index):
+        """
+        Get a dictionary of {do_action: set of submission set names} for the
+        permissions from the source at the given index.
+        """
+        while len(self.allowed_sets) <= index:
+            allowed_sets = dict((action, set()) for action in self.actions)
+            for permission in self.sources[len(self.allowed_sets)]():
+                for action in self.actions:
+                    if getattr(permission, 'can_' + action, False):
+                        allowed_sets[action].add(permission.submission_set)
+            self.allowed_sets.append(allowed_sets)
+        return self.allowed_sets[index]
+
+    def allows(self, do_action, submission_set):
+        if do_action not in self.matrix:
+            raise ValueError
+
+        if isinstance(submission_set, SubmissionSet):
+            submission_set = submission_set.name
+
+        try:
+            return self.matrix[do_action][submission_set]
+        except KeyError:
+            allowed = self.allow_all
+            for index in range(len(self.sources)):
+                if allowed: break
+                allowed_sets = self.get_allowed_sets(index)[do_action]
+                allowed = submission_set in allowed_sets or '*' in allowed_sets
+
+            self.matrix[do_action][submission_set] = allowed
+            return allowed
+
+
+def get_data_permission_matrix(request, dataset):
+    """
+    Get the permission matrix for the request's user and client on the given
+    dataset. The matrix is only built once per request.
+    """
+    user = getattr(request, 'user', None)
+    client = getattr(request, 'client', None)
+    key = (getattr(user, 'pk', None),
+           (client.__class__.__name__, client.pk) if client is not None else None,
+           getattr(dataset, 'pk', None))
+
+    try:
+        matrices = request._data_permission_matrices
+    except AttributeError:
+        matrices = request._data_permission_matrices = {}
+
+    try:
+        return matrices[key]
+    except KeyError:
+        matrix = matrices[key] = DataPermissionMatrix(user, client, dataset)
+        return matrix
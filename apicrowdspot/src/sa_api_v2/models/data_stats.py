@@ -0,0 +1,226 @@
+import threading
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from django.db import transaction
+from .data_attributes import DataAttribute, get_attribute_types
+from .data_counters import DataSetCounter
+
+
+# The fields of a place or submission that decide how it is counted in its
+# dataset's stats.
+StatsState = namedtuple('StatsState', ['dataset_id', 'visible', 'parent_id', 'data'])
+
+
+# The datasets and submission sets whose things are being deleted together,
+# for each thread. Their things are not taken out of the stats one by one.
+_bulk_deletions = threading.local()
+
+
+def get_bulk_deletions():
+    if not hasattr(_bulk_deletions, 'stack'):
+        _bulk_deletions.stack = []
+    return _bulk_deletions.stack
+
+
+@contextmanager
+def deleting_in_bulk(dataset_ids=(), parent_ids=()):
+    """
+    Within the block, skip the stats updates for places and submissions in
+    the given datasets, or submissions in the given submission sets, as they
+    are deleted. The caller takes care of the stats for them all at once.
+    """
+    stack = get_bulk_deletions()
+    stack.append((set(dataset_ids), set(parent_ids)))
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+def is_deleted_in_bulk(thing):
+    fields = thing.__dict__
+    return any(fields.get('dataset_id') in dataset_ids or fields.get('parent_id') in parent_ids
+               for dataset_ids, parent_ids in get_bulk_deletions())
+
+
+class DataSetStatsMixin (object):
+    """
+    Keeps a dataset's counters and data attribute counts up to date as its
+    places and submissions are saved and deleted. This is shared by the
+    models of both versions of the API, since they write to the same tables.
+
+    Models should call sync_dataset_stats in the same transaction as each
+    save, and connect forget_deleted_thing to their pre_delete signal.
+    """
+    def __init__(self, *args, **kwargs):
+        super(DataSetStatsMixin, self).__init__(*args, **kwargs)
+
+        # Remember how the thing is counted in the database, so that those
+        # counts can be taken back when it changes.
+        self._saved_stats_state = self.get_stats_state() if self.pk else None
+
+    def get_submission_set_name(self):
+        """
+        The name of the submission set (or 'places') under which the thing is
+        counted, or None if it is not counted.
+        """
+        return None
+
+    def get_stats_set_name(self, state):
+        """
+        The name under which the thing is counted in the given state.
+        """
+        return self.get_submission_set_name()
+
+    def get_stats_state(self):
+        # Read the fields from __dict__ so that deferred ones are not loaded.
+        fields = self.__dict__
+        return StatsState(fields.get('dataset_id'), fields.get('visible'),
+                          fields.get('parent_id'), fields.get('data'))
+
+    def sync_dataset_stats(self, deleted=False):
+        old_state = self._saved_stats_state
+        new_state = None if deleted else self.get_stats_state()
+        if old_state != new_state:
+            old_name = None if old_state is None else self.get_stats_set_name(old_state)
+            new_name = None if new_state is None else self.get_stats_set_name(new_state)
+            self.record_counters(old_state, old_name, new_state, new_name)
+            self.record_data_attributes(old_state, old_name, new_state, new_name)
+        self._saved_stats_state = new_state
+
+    def record_counters(self, old_state, old_name, new_state, new_name):
+        old_key = None if old_name is None else (old_state.dataset_id, old_name, old_state.visible)
+        new_key = None if new_name is None else (new_state.dataset_id, new_name, new_state.visible)
+        DataSetCounter.objects.record(old_key, new_key)
+
+    def record_data_attributes(self, old_state, old_name, new_state, new_name):
+        old_set = None if old_name is None else (old_state.dataset_id, old_name)
+        new_set = None if new_name is None else (new_state.dataset_id, new_name)
+
+        if old_set == new_set:
+            if old_set is not None:
+                DataAttribute.objects.record(old_set[0], old_set[1],
+                                             old_state.data, new_state.data)
+            return
+
+        # The thing has moved to another dataset or submission set.
+        if old_set is not None:
+            DataAttribute.objects.record(old_set[0], old_set[1], old_state.data, None)
+        if new_set is not None:
+            DataAttribute.objects.record(new_set[0], new_set[1], None, new_state.data)
+
+
+class PlaceStatsMixin (DataSetStatsMixin):
+    """
+    A DataSetStatsMixin for places, which are counted as 'places'. The
+    submissions that are deleted along with a place are taken out of the
+    stats together, instead of one at a time.
+
+    Models should set submission_model to the submission model (or its
+    dotted path).
+    """
+    def get_submission_set_name(self):
+        return 'places'
+
+    def delete(self, *args, **kwargs):
+        submission_model = self.resolve_attr('submission_model')
+        parent_ids = list(self.submission_sets.values_list('pk', flat=True))
+
+        with transaction.atomic():
+            submission_model.forget_deleted_children(parent_ids)
+            with deleting_in_bulk(parent_ids=parent_ids):
+                return super(PlaceStatsMixin, self).delete(*args, **kwargs)
+
+
+class SubmissionStatsMixin (DataSetStatsMixin):
+    """
+    A DataSetStatsMixin for submissions, which are counted under the name of
+    their submission set. This also keeps the submission sets' stored lengths
+    up to date.
+    """
+    def get_set_name(self, submission_set):
+        raise NotImplementedError()
+
+    def get_submission_set_name(self):
+        return self.get_set_name(self.parent)
+
+    def get_stats_set_name(self, state):
+        if state.parent_id == self.parent_id:
+            return self.get_submission_set_name()
+
+        set_model = self._meta.get_field('parent').rel.to
+        return self.get_set_name(set_model.objects.get(pk=state.parent_id))
+
+    def save(self, *args, **kwargs):
+        old_state = self._saved_stats_state
+        ret = super(SubmissionStatsMixin, self).save(*args, **kwargs)
+        self.update_set_lengths(old_state, self._saved_stats_state)
+        return ret
+
+    def delete(self, *args, **kwargs):
+        old_state = self._saved_stats_state
+        ret = super(SubmissionStatsMixin, self).delete(*args, **kwargs)
+        self.update_set_lengths(old_state, None)
+        return ret
+
+    @classmethod
+    def forget_deleted_children(cls, parent_ids):
+        """
+        Take the submissions in the given sets out of their datasets' stats,
+        just before they are deleted together. This takes a query for each
+        counter and attribute that changes, instead of a few for each
+        submission.
+        """
+        if not parent_ids:
+            return
+
+        counter_deltas = defaultdict(int)
+        attribute_deltas = defaultdict(lambda: defaultdict(int))
+        for submission in cls.objects.filter(parent__in=parent_ids).select_related('parent'):
+            state = submission.get_stats_state()
+            set_name = submission.get_submission_set_name()
+            if set_name is None:
+                continue
+
+            counter_deltas[(state.dataset_id, set_name, state.visible)] -= 1
+            for attr in get_attribute_types(state.data).iteritems():
+                attribute_deltas[(state.dataset_id, set_name)][attr] -= 1
+
+        for key, delta in counter_deltas.iteritems():
+            DataSetCounter.objects.change_count(key, delta)
+
+        for (dataset_id, set_name), deltas in attribute_deltas.iteritems():
+            attrs_by_delta = defaultdict(list)
+            for attr, delta in deltas.iteritems():
+                attrs_by_delta[delta].append(attr)
+            for delta, attrs in attrs_by_delta.iteritems():
+                DataAttribute.objects.change_counts(dataset_id, set_name, attrs, delta)
+
+    def update_set_lengths(self, old_state, new_state):
+        """
+        Recount the sets that the submission left or joined, or in which its
+        visibility changed. Saves that change neither are not recounted.
+        """
+        def membership(state):
+            return None if state is None else (state.parent_id, state.visible)
+
+        if membership(old_state) == membership(new_state):
+            return
+
+        # The lengths are stored on the v2 submission sets, which the v1 sets
+        # share a table with.
+        set_model = self._meta.get_field('parent').rel.to
+        set_model = set_model.resolve_attr('next_version') or set_model
+        set_model.objects.update_lengths([state.parent_id for state in (old_state, new_state)
+                                          if state is not None])
+
+
+def forget_deleted_thing(sender, instance, **kwargs):
+    """
+    Take a deleted place or submission out of its dataset's stats, including
+    one that is deleted along with its place or dataset. This runs in the
+    deletion's transaction.
+    """
+    if is_deleted_in_bulk(instance):
+        return
+    instance.sync_dataset_stats(deleted=True)
@@ -7,9 +7,19 @@ INCLUDE_SUBMISSIONS_PARAM = 'include_submissions'
 NEAR_PARAM = 'near'
 DISTANCE_PARAM = 'distance_lt'
 BBOX_PARAM = 'bounds'
+SNAP_PARAM = 'snap'
+ZOOM_PARAM = 'zoom'
+BREAKDOWN_PARAM = 'breakdown'
+PRECISION_PARAM = 'precision'
+SIMPLIFY_PARAM = 'simplify'
 FORMAT_PARAM = 'format'
 
 PAGE_PARAM = 'page'
+CURSOR_PARAM = 'cursor'
+AFTER_PARAM = 'after'
+BEFORE_PARAM = 'before'
+LIMIT_PARAM = 'limit'
+COUNT_PARAM = 'count'
 PAGE_SIZE_PARAM = lambda: getattr(settings, 'REST_FRAMEWORK', {}).get('PAGINATE_BY_PARAM')
 CALLBACK_PARAM = lambda view: (
     'callback'
@@ -1,7 +1,12 @@
+import csv
+import re
+import uuid
 import ujson as json
 from rest_framework.renderers import JSONRenderer, JSONPRenderer
 from rest_framework_csv.renderers import CSVRenderer
+from StringIO import StringIO
 from django.contrib.gis.geos import GEOSGeometry
+from .utils import GeoJSONGeometry
 
 
 class PaginatedCSVRenderer (CSVRenderer):
@@ -10,6 +15,53 @@ class PaginatedCSVRenderer (CSVRenderer):
             data = data.get('results') or data.get('features')
         return super(PaginatedCSVRenderer, self).render(data, media_type, renderer_context)
 
+    def render_stream(self, header, result_chunks):
+        """
+        Render CSV in pieces: first the given header, and then the rows for
+        each chunk of serialized results as it is pulled from result_chunks.
+        Unlike render, the rows are never scanned to discover the header.
+        """
+        yield self.render_rows([header])
+        for chunk in result_chunks:
+            yield self.render_rows([self.get_row(header, item) for item in chunk])
+
+    def render_rows(self, rows):
+        csv_buffer = StringIO()
+        csv_writer = csv.writer(csv_buffer)
+        for row in rows:
+            # Assume that strings should be encoded as UTF-8
+            csv_writer.writerow([
+                elem.encode('utf-8') if isinstance(elem, unicode) else elem
+                for elem in row
+            ])
+        return csv_buffer.getvalue()
+
+    def get_row(self, header, item):
+        return [self.get_column_value(item, column) for column in header]
+
+    def get_column_value(self, item, column):
+        """
+        Get the value for a column from a serialized item. Nested columns
+        (e.g., 'submitter.username') are looked up level by level. Values
+        that are still nested are written as JSON.
+        """
+        if column in item:
+            value = item[column]
+        else:
+            value = item
+            for key in column.split(self.level_sep):
+                if isinstance(value, dict):
+                    value = value.get(key)
+                elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+                    value = value[int(key)]
+                else:
+                    value = None
+                    break
+
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value)
+        return value
+
 
 class GeoJSONRenderer(JSONRenderer):
     """
@@ -30,23 +82,44 @@ class GeoJSONRenderer(JSONRenderer):
         if response and response.status_code >= 400:
             return super(GeoJSONRenderer, self).render(data, media_type, renderer_context)
 
+        # Geometries that are already GeoJSON are swapped out for placeholder
+        # strings while the rest of the data is serialized, and spliced back
+        # into the output afterwards.
+        raw_geometries = []
+
         # Assume everything else is a successful geometry.
         if isinstance(data, list):
             new_data = {
               'type': 'FeatureCollection',
-              'features': [(self.get_feature(elem) or elem) for elem in data]
+              'features': [(self.get_feature(elem, raw_geometries) or elem) for elem in data]
             }
         elif isinstance(data, dict) and data.get('type') == 'FeatureCollection':
             new_data = data.copy()
-            new_data['features'] = [(self.get_feature(elem) or elem) for elem in data['features']]
+            new_data['features'] = [(self.get_feature(elem, raw_geometries) or elem) for elem in data['features']]
         elif data is None:
             new_data = None
         else:
-            new_data = self.get_feature(data) or data
+            new_data = self.get_feature(data, raw_geometries) or data
+
+        if not raw_geometries:
+            return super(GeoJSONRenderer, self).render(new_data, media_type, renderer_context)
+
+        placeholder_prefix = uuid.uuid4().hex
+        geometries = []
+        for index, feature in enumerate(raw_geometries):
+            geometries.append(feature['geometry'].encode('utf-8'))
+            feature['geometry'] = '%s:%d' % (placeholder_prefix, index)
 
-        return super(GeoJSONRenderer, self).render(new_data, media_type, renderer_context)
+        content = super(GeoJSONRenderer, self).render(new_data, media_type, renderer_context)
+        placeholder_pattern = re.compile(r'"%s:(\d+)"' % (placeholder_prefix,))
+        return placeholder_pattern.sub(lambda match: geometries[int(match.group(1))], content)
 
-    def get_feature(self, data):
+    def get_feature(self, data, raw_geometries=None):
+        """
+        Convert a serialized object into a GeoJSON feature. If a list is given
+        as raw_geometries, features whose geometry is already a GeoJSON string
+        are appended to it instead of having their geometry parsed.
+        """
         if 'geometry' not in data:
             return None
 
@@ -54,17 +127,22 @@ class GeoJSONRenderer(JSONRenderer):
         geometry = feature_props.pop(self.geometry_field)
         feature_id = feature_props.get(self.id_field)  # Should this be popped?
 
-        if isinstance(geometry, basestring):
-            geometry = json.loads(GEOSGeometry(geometry).json)
-        elif isinstance(geometry, GEOSGeometry):
-            geometry = json.loads(geometry.json)
-
         feature = {
           'type': 'Feature',
           'geometry': geometry,
           'properties': feature_props,
         }
 
+        if isinstance(geometry, GeoJSONGeometry):
+            if raw_geometries is not None:
+                raw_geometries.append(feature)
+            else:
+                feature['geometry'] = json.loads(geometry)
+        elif isinstance(geometry, basestring):
+            feature['geometry'] = json.loads(GEOSGeometry(geometry).json)
+        elif isinstance(geometry, GEOSGeometry):
+            feature['geometry'] = json.loads(geometry.json)
+
         if feature_id is not None:
             feature['id'] = feature_id
 
@@ -81,6 +159,49 @@ class GeoJSONPRenderer(JSONPRenderer, GeoJSONRenderer):
     pass
 
 
+def render_json_stream(renderer, envelope, results_field, result_chunks, renderer_context=None):
+    """
+    Render a JSON (or JSONP) response body in pieces with the given renderer.
+    The envelope is rendered with its results_field left out, and then the
+    results are rendered into that field one at a time as each chunk of
+    serialized results is pulled from result_chunks.
+    """
+    renderer_context = renderer_context or {}
+
+    # JSONP renderers wrap their output in a callback; render each part with
+    # the underlying JSON renderer and put the callback around the whole.
+    if isinstance(renderer, JSONPRenderer):
+        callback = renderer.get_callback(renderer_context)
+        render = super(JSONPRenderer, renderer).render
+    else:
+        callback = None
+        render = renderer.render
+
+    # The envelope is plain JSON, even for GeoJSON renderers.
+    placeholder = uuid.uuid4().hex
+    envelope = envelope.copy()
+    envelope[results_field] = placeholder
+    envelope_content = JSONRenderer.render(renderer, envelope, None, renderer_context)
+    head, tail = envelope_content.split('"%s"' % (placeholder,), 1)
+
+    if callback is not None:
+        yield callback.encode(renderer.charset) + b'('
+    yield head + b'['
+
+    separator = b''
+    for chunk in result_chunks:
+        parts = []
+        for result in chunk:
+            parts.append(separator)
+            parts.append(render(result, None, renderer_context))
+            separator = b','
+        yield b''.join(parts)
+
+    yield b']' + tail
+    if callback is not None:
+        yield b');'
+
+
 class NullJSONRenderer(JSONRenderer):
     """
     Renderer JSON with a simple None value as null
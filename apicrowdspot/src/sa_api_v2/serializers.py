@@ -4,16 +4,24 @@ DjangoRestFramework resources for the Shareabouts REST API.
 import ujson as json
 import re
 from itertools import chain
+from django.conf import settings
 from django.contrib.gis.geos import GEOSGeometry
 from django.core.exceptions import ValidationError
+from django.core.urlresolvers import (get_resolver, get_script_prefix,
+    get_urlconf, NoReverseMatch)
+from django.utils.encoding import force_text
+from django.utils.http import urlquote
+from django.utils.regex_helper import normalize
 from rest_framework import pagination
 from rest_framework import serializers
 from rest_framework.reverse import reverse
+from rest_framework.templatetags.rest_framework import replace_query_param
 
 from . import models
-from .models import check_data_permission
+from .models import get_data_permission_matrix
+from .utils import GeoJSONGeometry
 from .params import (INCLUDE_INVISIBLE_PARAM, INCLUDE_PRIVATE_PARAM,
-    INCLUDE_SUBMISSIONS_PARAM, FORMAT_PARAM)
+    INCLUDE_SUBMISSIONS_PARAM, FORMAT_PARAM, CURSOR_PARAM)
 
 import logging
 log = logging.getLogger(__name__)
@@ -53,6 +61,80 @@ class GeometryField(serializers.WritableField):
         except Exception as exc:
             raise ValidationError('Problem converting native data to Geometry: %s' % (exc,))
 
+###############################################################################
+#
+# URL templates
+# -------------
+# Reversing a URL walks the resolver's patterns every time. For the URLs that
+# are built for every object in a list, compile each pattern once into a
+# string template and fill it in with the URL arguments instead.
+#
+
+_url_templates = {}
+
+def get_url_template(view_name, arg_names):
+    """
+    Return a string template for the URL of the given view with the given
+    keyword argument names, such that filling it in with quoted argument
+    values produces the same path as reverse().
+    """
+    prefix = get_script_prefix()
+    urlconf = get_urlconf()
+    key = (view_name, frozenset(arg_names), prefix, urlconf or settings.ROOT_URLCONF)
+
+    try:
+        return _url_templates[key]
+    except KeyError:
+        pass
+
+    resolver = get_resolver(urlconf)
+    prefix_norm, prefix_args = normalize(urlquote(prefix))[0]
+    for possibility, pattern, defaults in resolver.reverse_dict.getlist(view_name):
+        if defaults:
+            continue
+        for result, params in possibility:
+            if set(params) == set(arg_names):
+                template = _url_templates[key] = prefix_norm.replace('%', '%%') + result
+                return template
+
+    raise NoReverseMatch('No URL template for %r with arguments %r' % (view_name, sorted(arg_names)))
+
+def get_url_root(request):
+    """
+    Return the scheme and host that absolute URLs for the request start with.
+    """
+    try:
+        return request._shareabouts_url_root
+    except AttributeError:
+        url_root = request._shareabouts_url_root = request.build_absolute_uri('/')[:-1]
+        return url_root
+
+def reverse_from_template(view_name, kwargs, request=None, format=None):
+    """
+    A faster equivalent of rest_framework.reverse.reverse for keyword
+    arguments.
+    """
+    if format is not None:
+        kwargs = dict(kwargs, format=format)
+
+    text_kwargs = dict((k, force_text(v)) for k, v in kwargs.iteritems())
+
+    # Values with slashes would not match the URL patterns; let reverse()
+    # deal with them.
+    if any('/' in v for v in text_kwargs.itervalues()):
+        return reverse(view_name, kwargs=kwargs, request=request)
+
+    try:
+        template = get_url_template(view_name, text_kwargs.keys())
+    except NoReverseMatch:
+        return reverse(view_name, kwargs=kwargs, request=request)
+
+    url = template % dict((k, urlquote(v)) for k, v in text_kwargs.iteritems())
+    if request is not None:
+        url = get_url_root(request) + url
+    return url
+
+
 ###############################################################################
 #
 # Shareabouts-specific fields
@@ -65,6 +147,10 @@ class ShareaboutsFieldMixin (object):
     # in the same order as the corresponding URL arguments.
     url_arg_names = ()
 
+    # Whether to build URLs from precompiled URL templates rather than by
+    # calling reverse() for every object.
+    use_url_templates = True
+
     def get_url_kwargs(self, obj):
         """
         Pull the appropriate arguments off of the cache to construct the URL.
@@ -72,7 +158,7 @@ class ShareaboutsFieldMixin (object):
         if isinstance(obj, models.User):
             instance_kwargs = {'owner_username': obj.username}
         else:
-            instance_kwargs = obj.cache.get_cached_instance_params(obj.pk, lambda: obj)
+            instance_kwargs = self.get_instance_params(obj)
 
         url_kwargs = {}
         for arg_name in self.url_arg_names:
@@ -85,6 +171,21 @@ class ShareaboutsFieldMixin (object):
             url_kwargs[arg_name] = arg_value
         return url_kwargs
 
+    def build_url(self, view_name, kwargs, request, format):
+        if self.use_url_templates:
+            return reverse_from_template(view_name, kwargs, request=request, format=format)
+        else:
+            return reverse(view_name, kwargs=kwargs, request=request, format=format)
+
+    def get_instance_params(self, obj):
+        # List views resolve the parameters for a whole page of objects up
+        # front; see InstanceParamsMapMixin.
+        params_map = self.context.get('instance_params_map') or {}
+        params = params_map.get(obj.cache.get_instance_params_key(obj.pk))
+        if params is None:
+            params = obj.cache.get_cached_instance_params(obj.pk, lambda: obj)
+        return params
+
 
 class ShareaboutsRelatedField (ShareaboutsFieldMixin, serializers.HyperlinkedRelatedField):
     """
@@ -108,7 +209,7 @@ class ShareaboutsRelatedField (ShareaboutsFieldMixin, serializers.HyperlinkedRel
             return
 
         kwargs = self.get_url_kwargs(obj)
-        return reverse(view_name, kwargs=kwargs, request=request, format=format)
+        return self.build_url(view_name, kwargs, request, format)
 
 
 class DataSetRelatedField (ShareaboutsRelatedField):
@@ -155,7 +256,7 @@ class ShareaboutsIdentityField (ShareaboutsFieldMixin, serializers.HyperlinkedId
         if format and self.format and self.format != format:
             format = self.format
 
-        return reverse(view_name, kwargs=kwargs, request=request, format=format)
+        return self.build_url(view_name, kwargs, request, format)
 
 
 class PlaceIdentityField (ShareaboutsIdentityField):
@@ -444,14 +545,12 @@ class DataSetSubmissionSetSummarySerializer (serializers.HyperlinkedModelSeriali
         submission_sets_map = self.context['submission_sets_map_getter']()
         sets = submission_sets_map.get(obj.id, {})
         summaries = {}
+        permissions = get_data_permission_matrix(request, obj)
         for submission_set in sets:
             set_name = submission_set['parent__name']
 
             # Ensure the user has read permission on the submission set.
-            user = getattr(request, 'user', None)
-            client = getattr(request, 'client', None)
-            dataset = obj
-            if not check_data_permission(user, client, 'retrieve', dataset, set_name):
+            if not permissions.allows('retrieve', set_name):
                 continue
 
             obj.submission_set_name = set_name
@@ -518,18 +617,19 @@ class PlaceSerializer (SubmittedThingSerializer, serializers.HyperlinkedModelSer
         include_invisible = INCLUDE_INVISIBLE_PARAM in request.GET
 
         summaries = {}
+        dataset = getattr(request, 'get_dataset', lambda: None)()
+        permissions = get_data_permission_matrix(request, dataset)
         for submission_set in place.submission_sets.all():
             # Ensure the user has read permission on the submission set.
-            user = getattr(request, 'user', None)
-            client = getattr(request, 'client', None)
-            dataset = getattr(request, 'get_dataset', lambda: None)()
-            if not check_data_permission(user, client, 'retrieve', dataset, submission_set):
+            if not permissions.allows('retrieve', submission_set):
                 continue
 
-            submissions = submission_set.children.all()
-            if not include_invisible:
-                submissions = filter(lambda s: s.visible, submissions)
-            submission_set.length = len(submissions)
+            # Use the set's denormalized counts, so that none of its
+            # submissions have to be loaded.
+            if include_invisible:
+                submission_set.length = submission_set.total_length
+            else:
+                submission_set.length = submission_set.visible_length
 
             if submission_set.length == 0:
                 continue
@@ -549,12 +649,11 @@ class PlaceSerializer (SubmittedThingSerializer, serializers.HyperlinkedModelSer
         include_invisible = INCLUDE_INVISIBLE_PARAM in request.GET
 
         details = {}
+        dataset = getattr(request, 'get_dataset', lambda: None)()
+        permissions = get_data_permission_matrix(request, dataset)
         for submission_set in place.submission_sets.all():
             # Ensure the user has read permission on the submission set.
-            user = getattr(request, 'user', None)
-            client = getattr(request, 'client', None)
-            dataset = getattr(request, 'get_dataset', lambda: None)()
-            if not check_data_permission(user, client, 'retrieve', dataset, submission_set):
+            if not permissions.allows('retrieve', submission_set):
                 continue
 
             submissions = submission_set.children.all()
@@ -575,6 +674,16 @@ class PlaceSerializer (SubmittedThingSerializer, serializers.HyperlinkedModelSer
 
         return details
 
+    def get_geometry(self, place):
+        """
+        Get the place's geometry as WKT, or as a GeoJSON string if the place
+        was selected along with its GeoJSON (see GeoQuerySet.geojson).
+        """
+        geojson = getattr(place, 'geojson', None)
+        if geojson is not None:
+            return GeoJSONGeometry(geojson)
+        return str(place.geometry or 'POINT(0 0)')
+
     def to_native(self, obj):
         obj = self.ensure_obj(obj)
         fields = self.get_fields()
@@ -582,7 +691,7 @@ class PlaceSerializer (SubmittedThingSerializer, serializers.HyperlinkedModelSer
         data = {
             'url': fields['url'].field_to_native(obj, 'pk'),  # = PlaceIdentityField()
             'id': obj.pk,  # = serializers.PrimaryKeyRelatedField(read_only=True)
-            'geometry': str(obj.geometry or 'POINT(0 0)'),  # = GeometryField(format='wkt')
+            'geometry': self.get_geometry(obj),  # = GeometryField(format='wkt')
             'dataset': obj.dataset_id,  # = DataSetRelatedField()
             'attachments': [AttachmentSerializer(a).data for a in obj.attachments.all()],  # = AttachmentSerializer(read_only=True)
             'submitter': UserSerializer(obj.submitter).data if obj.submitter else None,
@@ -732,3 +841,29 @@ class FeatureCollectionSerializer (PaginatedResultsSerializer):
         data['type'] = 'FeatureCollection'
         return data
 
+
+class NextCursorField (serializers.Field):
+    """
+    The URL of the next page of cursor-paginated results, if any.
+    """
+    cursor_field = CURSOR_PARAM
+
+    def to_native(self, page):
+        if page.next_cursor is None:
+            return None
+        request = self.context.get('request')
+        url = request and request.build_absolute_uri() or ''
+        return replace_query_param(url, self.cursor_field, page.next_cursor)
+
+
+class CursorPaginationMetadataSerializer (serializers.Serializer):
+    next = NextCursorField(source='*')
+
+
+class CursorPaginatedResultsSerializer (PaginatedResultsSerializer):
+    metadata = CursorPaginationMetadataSerializer(source='*')
+
+
+class CursorFeatureCollectionSerializer (FeatureCollectionSerializer):
+    metadata = CursorPaginationMetadataSerializer(source='*')
+
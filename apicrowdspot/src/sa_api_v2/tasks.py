@@ -2,9 +2,11 @@ from __future__ import unicode_literals
 
 from celery import shared_task
 from celery.result import AsyncResult
+from django.contrib.auth.models import AnonymousUser
+from django.core.urlresolvers import resolve
 from django.test.client import RequestFactory
 from django.utils.timezone import now
-from .models import DataSnapshotRequest, DataSnapshot
+from .models import DataSnapshotRequest, DataSnapshot, DataSet, DataIndex
 from .serializers import PlaceSerializer, SubmissionSerializer
 from .renderers import CSVRenderer, JSONRenderer, GeoJSONRenderer
 
@@ -79,3 +81,54 @@ def bulk_data_status_update(uuid):
     datarequest = DataSnapshotRequest.objects.get(guid=uuid)
     datarequest.status = taskresult.status.lower()
     datarequest.save()
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=10)
+def reindex_dataset(self, dataset_id, index_ids=None, index_attrs=None):
+    """
+    Sync the values of the given indexes (or of all the dataset's indexes)
+    for every thing in the dataset, reporting progress in the task state.
+    index_attrs are the [attr_name, attr_type] that each index was saved
+    with.
+    """
+    dataset = DataSet.objects.get(pk=dataset_id)
+    if index_ids is None:
+        indexes = list(dataset.indexes.all())
+    else:
+        indexes = list(DataIndex.objects.filter(pk__in=index_ids))
+
+        # The task may start before the transaction that saved an index
+        # has been committed, in which case the index is either missing or
+        # still has its old attributes.
+        if len(indexes) < len(index_ids):
+            raise self.retry()
+
+        if index_attrs is not None:
+            saved_attrs = dict((index_id, list(attrs)) for index_id, attrs in zip(index_ids, index_attrs))
+            if any([index.attr_name, index.attr_type] != saved_attrs[index.id] for index in indexes):
+                raise self.retry()
+
+    def report_progress(done, total):
+        log.info('Reindexed %s of %s things in dataset %s' % (done, total, dataset_id))
+        if self.request.id:
+            self.update_state(state='PROGRESS', meta={'done': done, 'total': total})
+
+    dataset.reindex(indexes, progress=report_progress)
+
+@shared_task
+def refresh_cached_response(path, query_string, accept, script_name=''):
+    """
+    Rebuild the cached response for an anonymous GET request, while the stale
+    response continues to be served from the cache.
+    """
+    if query_string:
+        path_with_query = path + '?' + query_string
+    else:
+        path_with_query = path
+
+    r = RequestFactory().get(path_with_query, HTTP_ACCEPT=accept, SCRIPT_NAME=script_name)
+    r.user = AnonymousUser()
+    r.refresh_cache = True
+
+    match = resolve(path)
+    response = match.func(r, *match.args, **match.kwargs)
+    log.debug('Refreshed cached response for %s (%s)' % (path_with_query, response.status_code))
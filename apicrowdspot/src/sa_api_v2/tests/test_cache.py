@@ -0,0 +1,188 @@
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.http import HttpResponse
+from django.core.cache import cache as django_cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from threading import Thread
+from ..cache import CacheBuffer, cache_buffer
+from ..models import User, DataSet, Place, SubmissionSet, Submission
+from ..middleware import CacheBufferMiddleware
+
+
+class TestCacheBuffer (TestCase):
+    def setUp(self):
+        django_cache.clear()
+
+    def tearDown(self):
+        django_cache.clear()
+
+    def test_set_is_not_written_until_flush(self):
+        buf = CacheBuffer()
+        buf.set('a', 1)
+        self.assertEqual(buf.get('a'), 1)
+        self.assertIsNone(django_cache.get('a'))
+
+        buf.flush()
+        self.assertEqual(django_cache.get('a'), 1)
+        self.assertEqual(buf.buffer, {})
+
+    def test_delete_is_not_written_until_flush(self):
+        django_cache.set('a', 1)
+
+        buf = CacheBuffer()
+        buf.delete('a')
+        self.assertIsNone(buf.get('a'))
+        self.assertEqual(django_cache.get('a'), 1)
+
+        buf.flush()
+        self.assertIsNone(django_cache.get('a'))
+
+    def test_set_membership_changes_apply_to_current_value(self):
+        django_cache.set('s', set([1, 2]))
+
+        buf = CacheBuffer()
+        buf.add('s', [3])
+        buf.remove('s', [1])
+        self.assertEqual(buf.get('s'), set([2, 3]))
+
+        # Another request changes the set before this one is flushed
+        django_cache.set('s', set([1, 2, 4]))
+
+        buf.flush()
+        self.assertEqual(django_cache.get('s'), set([2, 3, 4]))
+
+    def test_add_to_deleted_set_starts_from_empty(self):
+        django_cache.set('s', set([1, 2]))
+
+        buf = CacheBuffer()
+        buf.delete('s')
+        buf.add('s', [3])
+        buf.flush()
+
+        self.assertEqual(django_cache.get('s'), set([3]))
+
+
+class TestLocalCacheBuffer (TestCase):
+    def setUp(self):
+        cache_buffer.unbind()
+        django_cache.clear()
+
+    def tearDown(self):
+        cache_buffer.unbind()
+        django_cache.clear()
+
+    def test_each_thread_gets_its_own_buffer(self):
+        cache_buffer.set('a', 1)
+
+        seen = {}
+        def other_request():
+            seen['a'] = cache_buffer.get('a')
+            cache_buffer.set('b', 2)
+
+        thread = Thread(target=other_request)
+        thread.start()
+        thread.join()
+
+        self.assertIsNone(seen['a'])
+        self.assertIsNone(cache_buffer.get('b'))
+        self.assertEqual(cache_buffer.get('a'), 1)
+
+    def test_middleware_binds_and_flushes_buffer(self):
+        middleware = CacheBufferMiddleware()
+        request = RequestFactory().get('/')
+
+        cache_buffer.set('stale', 'from another request')
+
+        middleware.process_request(request)
+        self.assertIsNone(cache_buffer.get('stale'))
+        cache_buffer.set('a', 1)
+
+        middleware.process_response(request, HttpResponse())
+        self.assertEqual(django_cache.get('a'), 1)
+        self.assertIsNone(django_cache.get('stale'))
+
+
+    def test_bound_buffer_is_flushed_and_unbound(self):
+        cache_buffer.set('outer', 1)
+        outer_buffer = cache_buffer.current
+
+        with cache_buffer.bound():
+            self.assertIsNone(cache_buffer.get('outer'))
+            cache_buffer.set('inner', 2)
+
+        self.assertEqual(django_cache.get('inner'), 2)
+        self.assertIs(cache_buffer.current, outer_buffer)
+        self.assertIsNone(django_cache.get('outer'))
+
+        # Without an outer buffer, nothing is left bound after the block.
+        cache_buffer.unbind()
+        with cache_buffer.bound():
+            cache_buffer.set('inner', 3)
+        self.assertNotIn('buffer', cache_buffer._local.__dict__)
+
+class TestInstanceParamsMany (TestCase):
+    def setUp(self):
+        cache_buffer.reset()
+        django_cache.clear()
+
+        self.owner = User.objects.create_user(username='aaron', password='123', email='abc@example.com')
+        self.dataset = DataSet.objects.create(slug='ds', owner=self.owner)
+        self.places = [
+            Place.objects.create(dataset=self.dataset, geometry='POINT(2 3)'),
+            Place.objects.create(dataset=self.dataset, geometry='POINT(3 4)'),
+        ]
+        self.comments = SubmissionSet.objects.create(place=self.places[0], name='comments')
+        self.submissions = [
+            Submission.objects.create(parent=self.comments, dataset=self.dataset),
+            Submission.objects.create(parent=self.comments, dataset=self.dataset),
+        ]
+
+        cache_buffer.reset()
+        django_cache.clear()
+
+    def tearDown(self):
+        cache_buffer.reset()
+        django_cache.clear()
+
+    def test_params_match_those_calculated_from_instances(self):
+        for obj_list in (self.places, [self.comments], self.submissions, [self.dataset]):
+            cache = obj_list[0].cache
+            params_map = cache.get_cached_instance_params_many([obj.pk for obj in obj_list])
+
+            for obj in obj_list:
+                self.assertEqual(params_map[obj.pk], cache.get_instance_params(obj))
+
+    def test_missing_params_are_calculated_with_one_query(self):
+        place_ids = [place.pk for place in self.places]
+
+        with self.assertNumQueries(1):
+            Place.cache.get_cached_instance_params_many(place_ids)
+
+        cache_buffer.flush()
+
+        with self.assertNumQueries(0):
+            Place.cache.get_cached_instance_params_many(place_ids)
+
+    def test_batch_params_take_fewer_queries_than_per_instance_params(self):
+        submissions = list(Submission.objects.filter(pk__in=[s.pk for s in self.submissions]))
+
+        with CaptureQueriesContext(connection) as per_instance_queries:
+            for submission in submissions:
+                Submission.cache.get_cached_instance_params(submission.pk, lambda: submission)
+
+        with CaptureQueriesContext(connection) as batch_queries:
+            Submission.cache.get_cached_instance_params_many([s.pk for s in submissions])
+
+        # The per-instance path loads each submission's set, place and
+        # dataset in turn; the batch path joins them in one query.
+        self.assertEqual(len(batch_queries), 1)
+        self.assertLess(len(batch_queries), len(per_instance_queries))
+
+    def test_saving_an_instance_stores_its_params(self):
+        place = Place.objects.create(dataset=self.dataset, geometry='POINT(5 6)')
+        cache_buffer.flush()
+
+        with self.assertNumQueries(0):
+            params_map = Place.cache.get_cached_instance_params_many([place.pk])
+        self.assertEqual(params_map[place.pk]['place_id'], place.pk)
@@ -2,16 +2,21 @@ import json
 from django.test import TestCase
 # from django.test.client import Client
 from django.test.client import RequestFactory
+from django.test.utils import override_settings
 # from django.contrib.auth.models import User
 from django.core.cache import cache
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 # from djangorestframework.response import ErrorResponse
 # from mock import patch
 # from nose.tools import (istest, assert_equal, assert_not_equal, assert_in,
 #                         assert_raises)
 from ..models import (DataSet, User, SubmittedThing, Action, Place, SubmissionSet, Submission,
-    DataSetPermission, check_data_permission, DataIndex, IndexedValue)
+    DataSetPermission, check_data_permission, DataIndex, IndexedValue,
+    DataPermissionMatrix, get_data_permission_matrix, DataAttribute, DataSetCounter)
 from ..apikey.models import ApiKey
+from ..tasks import reindex_dataset
+from celery.exceptions import Retry
 # from ..views import SubmissionCollectionView
 # from ..views import raise_error_if_not_authenticated
 # from ..views import ApiKeyCollectionView
@@ -19,6 +24,7 @@ from ..apikey.models import ApiKey
 # import json
 import mock
 from mock import patch
+from StringIO import StringIO
 
 
 class TestSubmittedThing (TestCase):
@@ -62,6 +68,227 @@ class TestSubmittedThing (TestCase):
         self.assertEqual(qs.count(), 1)
 
 
+class TestSubmissionSetLengths (TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create(username='myuser')
+        self.dataset = DataSet.objects.create(slug='data', owner_id=self.owner.id)
+        self.place = Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)')
+        self.comments = SubmissionSet.objects.create(place=self.place, name='comments')
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_lengths(self):
+        submission_set = SubmissionSet.objects.get(pk=self.comments.pk)
+        return submission_set.visible_length, submission_set.total_length
+
+    def test_lengths_are_updated_when_submissions_are_saved(self):
+        self.assertEqual(self.get_lengths(), (0, 0))
+
+        Submission.objects.create(parent=self.comments, dataset=self.dataset)
+        hidden = Submission.objects.create(parent=self.comments, dataset=self.dataset, visible=False)
+        self.assertEqual(self.get_lengths(), (1, 2))
+
+        hidden.visible = True
+        hidden.save()
+        self.assertEqual(self.get_lengths(), (2, 2))
+
+    def test_lengths_are_updated_when_submissions_are_deleted(self):
+        submission = Submission.objects.create(parent=self.comments, dataset=self.dataset)
+        Submission.objects.create(parent=self.comments, dataset=self.dataset, visible=False)
+
+        submission.delete()
+        self.assertEqual(self.get_lengths(), (0, 1))
+
+    def test_lengths_are_updated_when_submissions_are_moved(self):
+        votes = SubmissionSet.objects.create(place=self.place, name='votes')
+        submission = Submission.objects.create(parent=self.comments, dataset=self.dataset)
+        self.assertEqual(self.get_lengths(), (1, 1))
+
+        submission = Submission.objects.get(pk=submission.pk)
+        submission.parent = votes
+        submission.save()
+        self.assertEqual(self.get_lengths(), (0, 0))
+
+        votes = SubmissionSet.objects.get(pk=votes.pk)
+        self.assertEqual((votes.visible_length, votes.total_length), (1, 1))
+
+    def test_lengths_are_not_recounted_when_unchanged(self):
+        submission = Submission.objects.create(parent=self.comments, dataset=self.dataset)
+        submission = Submission.objects.get(pk=submission.pk)
+
+        with patch.object(SubmissionSet.objects, 'update_lengths') as update_lengths:
+            submission.data = '{"name": "a"}'
+            submission.save()
+            self.assertEqual(update_lengths.call_count, 0)
+
+    def test_lengths_can_be_repaired(self):
+        Submission.objects.create(parent=self.comments, dataset=self.dataset)
+        Submission.objects.create(parent=self.comments, dataset=self.dataset)
+        SubmissionSet.objects.filter(pk=self.comments.pk).update(visible_length=0, total_length=5)
+
+        call_command('updatesubmissionsetlengths', stdout=StringIO())
+        self.assertEqual(self.get_lengths(), (2, 2))
+
+
+class TestDataAttributes (TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create(username='myuser')
+        self.dataset = DataSet.objects.create(slug='data', owner_id=self.owner.id)
+
+    def tearDown(self):
+        User.objects.all().delete()
+        cache.clear()
+
+    def get_counts(self, submission_set_name='places'):
+        attributes = DataAttribute.objects.filter(
+            dataset=self.dataset, submission_set_name=submission_set_name, count__gt=0)
+        return dict(((a.attr_name, a.attr_type), a.count) for a in attributes)
+
+    def test_counts_are_updated_when_things_are_saved(self):
+        Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data='{"name": "a", "rank": 1}')
+        place = Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data='{"name": "b"}')
+        self.assertEqual(self.get_counts(), {('name', 'string'): 2, ('rank', 'number'): 1})
+
+        place = Place.objects.get(pk=place.pk)
+        place.data = '{"name": null, "tags": ["x"]}'
+        place.save()
+        self.assertEqual(self.get_counts(), {('name', 'string'): 1, ('name', 'null'): 1,
+                                             ('rank', 'number'): 1, ('tags', 'array'): 1})
+
+        comments = SubmissionSet.objects.create(place=place, name='comments')
+        Submission.objects.create(parent=comments, dataset=self.dataset, data='{"comment": "hi"}')
+        self.assertEqual(self.get_counts('comments'), {('comment', 'string'): 1})
+        self.assertEqual(self.dataset.get_attribute_names('comments'), ['comment'])
+        self.assertEqual(self.dataset.get_attribute_names(), ['name', 'rank', 'tags'])
+
+    def test_counts_are_updated_when_things_are_deleted(self):
+        place = Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data='{"name": "a"}')
+        comments = SubmissionSet.objects.create(place=place, name='comments')
+        submission = Submission.objects.create(parent=comments, dataset=self.dataset, data='{"comment": "hi"}')
+        Submission.objects.create(parent=comments, dataset=self.dataset, data='{"comment": "yo"}')
+
+        submission.delete()
+        self.assertEqual(self.get_counts('comments'), {('comment', 'string'): 1})
+
+        # Submissions are deleted along with their place
+        place.delete()
+        self.assertEqual(self.get_counts(), {})
+        self.assertEqual(self.get_counts('comments'), {})
+
+    def test_counts_can_be_rebuilt(self):
+        place = Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data='{"name": "a"}')
+        comments = SubmissionSet.objects.create(place=place, name='comments')
+        Submission.objects.create(parent=comments, dataset=self.dataset, data='{"comment": "hi", "private-email": "a@b.c"}')
+        DataAttribute.objects.filter(dataset=self.dataset).update(count=7)
+
+        call_command('rebuilddataattributes', stdout=StringIO())
+        self.assertEqual(self.get_counts(), {('name', 'string'): 1})
+        self.assertEqual(self.get_counts('comments'), {('comment', 'string'): 1,
+                                                       ('private-email', 'string'): 1})
+        self.assertEqual(DataAttribute.objects.get_schema(self.dataset), {
+            'places': {'name': {'count': 1, 'types': {'string': 1}}},
+            'comments': {'comment': {'count': 1, 'types': {'string': 1}},
+                         'private-email': {'count': 1, 'types': {'string': 1}}},
+        })
+
+
+class TestDataSetCounters (TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create(username='myuser')
+        self.dataset = DataSet.objects.create(slug='data', owner_id=self.owner.id)
+
+    def tearDown(self):
+        User.objects.all().delete()
+        cache.clear()
+
+    def get_counts(self, include_invisible=False):
+        counts = DataSetCounter.objects.get_counts([self.dataset], include_invisible)
+        return counts.get(self.dataset.pk, {})
+
+    def test_counts_are_updated_when_things_are_saved(self):
+        place = Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)')
+        Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', visible=False)
+        comments = SubmissionSet.objects.create(place=place, name='comments')
+        Submission.objects.create(parent=comments, dataset=self.dataset)
+        hidden = Submission.objects.create(parent=comments, dataset=self.dataset, visible=False)
+        self.assertEqual(self.get_counts(), {'places': 1, 'comments': 1})
+        self.assertEqual(self.get_counts(include_invisible=True), {'places': 2, 'comments': 2})
+
+        hidden = Submission.objects.get(pk=hidden.pk)
+        hidden.visible = True
+        hidden.save()
+        self.assertEqual(self.get_counts(), {'places': 1, 'comments': 2})
+
+        # Saving without changing visibility doesn't count the thing again
+        place.data = '{"name": "a"}'
+        place.save()
+        self.assertEqual(self.get_counts(), {'places': 1, 'comments': 2})
+        self.assertEqual(DataSetCounter.objects.get_count(self.dataset, 'comments'), 2)
+
+    def test_counts_are_updated_when_things_are_deleted(self):
+        place = Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)')
+        comments = SubmissionSet.objects.create(place=place, name='comments')
+        submission = Submission.objects.create(parent=comments, dataset=self.dataset)
+        Submission.objects.create(parent=comments, dataset=self.dataset)
+
+        submission.delete()
+        self.assertEqual(self.get_counts(), {'places': 1, 'comments': 1})
+
+        # Submissions are deleted along with their place
+        place.delete()
+        self.assertEqual(self.get_counts(include_invisible=True), {})
+
+    def test_things_deleted_together_are_uncounted_together(self):
+        place = Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)')
+        other_place = Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)')
+        comments = SubmissionSet.objects.create(place=place, name='comments')
+        for visible in [True, True, False]:
+            Submission.objects.create(parent=comments, dataset=self.dataset, visible=visible,
+                                      data='{"comment": "hi"}')
+        SubmissionSet.objects.create(place=other_place, name='comments')
+
+        # A place's submissions are taken out of the counts all at once.
+        place = Place.objects.get(pk=place.pk)
+        with patch.object(Submission, 'sync_dataset_stats') as sync_dataset_stats:
+            place.delete()
+            self.assertEqual(sync_dataset_stats.call_count, 0)
+        self.assertEqual(self.get_counts(include_invisible=True), {'places': 1})
+        self.assertEqual(DataAttribute.objects.filter(dataset=self.dataset, count__gt=0).count(), 0)
+
+        # A dataset's counters go along with it.
+        dataset = DataSet.objects.get(pk=self.dataset.pk)
+        with patch.object(Place, 'sync_dataset_stats') as sync_dataset_stats:
+            dataset.delete()
+            self.assertEqual(sync_dataset_stats.call_count, 0)
+        self.assertEqual(DataSetCounter.objects.filter(dataset_id=self.dataset.pk).count(), 0)
+
+    def test_counts_are_moved_with_a_submission(self):
+        place = Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)')
+        comments = SubmissionSet.objects.create(place=place, name='comments')
+        votes = SubmissionSet.objects.create(place=place, name='votes')
+        submission = Submission.objects.create(parent=comments, dataset=self.dataset)
+
+        submission = Submission.objects.get(pk=submission.pk)
+        submission.parent = votes
+        submission.save()
+        self.assertEqual(self.get_counts(), {'places': 1, 'votes': 1})
+
+    def test_counts_can_be_reconciled(self):
+        place = Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)')
+        comments = SubmissionSet.objects.create(place=place, name='comments')
+        Submission.objects.create(parent=comments, dataset=self.dataset)
+        Place.objects.filter(pk=place.pk).update(visible=False)
+        DataSetCounter.objects.filter(dataset=self.dataset, submission_set_name='comments').update(count=7)
+
+        call_command('rebuilddatasetcounters', stdout=StringIO())
+        self.assertEqual(self.get_counts(), {'comments': 1})
+        self.assertEqual(self.get_counts(include_invisible=True), {'places': 1, 'comments': 1})
+
+
 class TestDataIndexes (TestCase):
     def setUp(self):
         User.objects.all().delete()
@@ -196,6 +423,107 @@ class TestDataIndexes (TestCase):
         # Delete should have cascaded to indexed values.
         self.assertEqual(IndexedValue.objects.all().count(), num_indexed_values - 1)
 
+    def test_datasets_are_reindexed_in_chunks(self):
+        for value in ['a', 'b', 'c']:
+            SubmittedThing.objects.create(dataset=self.dataset, data='{"index": "%s"}' % value)
+        index = DataIndex(attr_name='index', dataset=self.dataset)
+        index.save(reindex=False)
+
+        progress = mock.Mock()
+        self.dataset.reindex(chunk_size=2, progress=progress)
+
+        self.assertEqual(progress.call_args_list, [mock.call(2, 3), mock.call(3, 3)])
+        self.assertEqual(set(IndexedValue.objects.filter(index=index).values_list('value', flat=True)),
+                         set(['a', 'b', 'c']))
+
+    @override_settings(API_BACKGROUND_REINDEX_MIN_THINGS=2)
+    def test_large_datasets_are_reindexed_in_the_background(self):
+        for value in ['a', 'b']:
+            SubmittedThing.objects.create(dataset=self.dataset, data='{"index": "%s"}' % value)
+
+        with patch('sa_api_v2.tasks.reindex_dataset.delay') as delay:
+            index = DataIndex(attr_name='index', dataset=self.dataset)
+            index.save()
+            delay.assert_called_once_with(self.dataset.id, [index.id], [['index', 'string']])
+            self.assertEqual(IndexedValue.objects.filter(index=index).count(), 0)
+
+        reindex_dataset(self.dataset.id, [index.id], [['index', 'string']])
+        self.assertEqual(IndexedValue.objects.filter(index=index).count(), 2)
+
+    def test_background_reindex_waits_for_the_saved_index_attributes(self):
+        SubmittedThing.objects.create(dataset=self.dataset, data='{"index": "a"}')
+        index = DataIndex(attr_name='index', dataset=self.dataset)
+        index.save(reindex=False)
+
+        # The index has been renamed in a transaction that the task can't see
+        # yet.
+        with self.assertRaises(Retry):
+            reindex_dataset(self.dataset.id, [index.id], [['renamed', 'string']])
+        self.assertEqual(IndexedValue.objects.filter(index=index).count(), 0)
+
+    def test_stale_values_are_replaced_in_bulk(self):
+        index = DataIndex(attr_name='index', dataset=self.dataset)
+        index.save(reindex=False)
+        things = []
+        for data, old_value in [('{"index": "a"}', 'a'), ('{"index": "b"}', 'old'), ('{}', 'gone')]:
+            thing = SubmittedThing(dataset=self.dataset, data=data)
+            thing.save(reindex=False)
+            IndexedValue.objects.create(thing=thing, index=index, value=old_value)
+            things.append(thing)
+        unchanged_value = IndexedValue.objects.get(thing=things[0])
+
+        IndexedValue.objects.sync_things([(thing.id, thing.data) for thing in things], [index])
+
+        self.assertEqual(set(IndexedValue.objects.values_list('thing', 'value')),
+                         set([(things[0].id, 'a'), (things[1].id, 'b')]))
+        self.assertEqual(IndexedValue.objects.get(thing=things[0]).id, unchanged_value.id)
+
+    def test_typed_values_can_be_compared(self):
+        self.dataset.indexes.add(DataIndex(attr_name='votes', attr_type='number'))
+        self.dataset.indexes.add(DataIndex(attr_name='date', attr_type='datetime'))
+        self.dataset.indexes.add(DataIndex(attr_name='done', attr_type='boolean'))
+
+        for data in ['{"votes": 5, "date": "2013-12-31", "done": true}',
+                     '{"votes": 10, "date": "2014-01-01T12:00:00Z", "done": false}',
+                     '{"votes": "25", "date": "2014-02-01", "done": "yes"}',
+                     '{"votes": "many", "date": "someday"}']:
+            SubmittedThing.objects.create(dataset=self.dataset, data=data)
+
+        things = self.dataset.things
+        self.assertEqual(things.filter_by_index('votes', '10', lookup='gte', attr_type='number').count(), 2)
+        self.assertEqual(things.filter_by_index('votes', '9', lookup='lt', attr_type='number').count(), 1)
+        self.assertEqual(things.filter_by_index('date', '2014-01-01', lookup='lt', attr_type='datetime').count(), 1)
+        self.assertEqual(things.filter_by_index('date', '2014-01-01', lookup='gte', attr_type='datetime').count(), 2)
+        self.assertEqual(things.filter_by_index('done', 'true', attr_type='boolean').count(), 2)
+        self.assertEqual(things.filter_by_index('votes', '10', attr_type='number').count(), 1)
+
+        with self.assertRaises(ValueError):
+            things.filter_by_index('votes', 'many', lookup='gt', attr_type='number')
+
+    def test_things_can_be_filtered_by_unindexed_data(self):
+        Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data='{"category": "parks", "rank": 1}')
+        Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data='{"category": "parks", "rank": 2}')
+        Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data='{"category": "schools"}')
+        Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data='{}')
+
+        places = Place.objects.filter(dataset=self.dataset)
+        self.assertEqual(places.filter_by_data('category', 'parks').count(), 2)
+        self.assertEqual(places.filter_by_data('category', 'parks', 'schools').count(), 3)
+        self.assertEqual(places.filter_by_data('rank', '2').count(), 1)
+        self.assertEqual(places.filter_by_data('nonexistent', 'parks').count(), 0)
+
+    def test_things_with_non_object_data_are_not_matched_by_unindexed_data(self):
+        Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data='{"category": "parks"}')
+        array_place = Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)')
+        scalar_place = Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)')
+
+        # Blobs like these can't be saved normally, so write them directly.
+        Place.objects.filter(pk=array_place.pk).update(data='["parks"]')
+        Place.objects.filter(pk=scalar_place.pk).update(data='"parks"')
+
+        places = Place.objects.filter(dataset=self.dataset)
+        self.assertEqual(places.filter_by_data('category', 'parks').count(), 1)
+
 
 class TestCacheClearingModel (TestCase):
     def setUp(self):
@@ -474,6 +802,55 @@ class DataPermissionTests (TestCase):
             check_data_permission(user, None, 'retrieve', dataset, comment_set)
             self.assertEqual(any_allow.call_args[0][1], 'comments')
 
+    def test_permission_matrix_agrees_with_check_data_permission(self):
+        owner = User.objects.create(username='myowner')
+        user = User.objects.create(username='myuser')
+        dataset = DataSet.objects.create(slug='data', owner_id=owner.id)
+        place = Place.objects.create(dataset_id=dataset.id, geometry='POINT(0 0)')
+        comment_set = SubmissionSet.objects.create(place_id=place.id, name='comments')
+        key = ApiKey.objects.create(key='abc', dataset=dataset)
+
+        comments_perm = dataset.permissions.all().get()
+        comments_perm.submission_set = 'comments'
+        comments_perm.can_create = True
+        comments_perm.save()
+
+        places_perm = DataSetPermission(submission_set='places')
+        places_perm.can_retrieve = False
+        dataset.permissions.add(places_perm)
+
+        for user, client in [(None, None), (user, None), (user, key), (owner, None)]:
+            matrix = DataPermissionMatrix(user, client, dataset)
+            for do_action in ('retrieve', 'create', 'update', 'destroy'):
+                for submission_set in ('comments', 'places', 'likes', comment_set):
+                    self.assertEqual(matrix.allows(do_action, submission_set),
+                                     check_data_permission(user, client, do_action, dataset, submission_set))
+
+    def test_permission_matrix_is_built_once_per_request(self):
+        owner = User.objects.create(username='myowner')
+        user = User.objects.create(username='myuser')
+        dataset = DataSet.objects.create(slug='data', owner_id=owner.id)
+        cache.clear()
+
+        request = RequestFactory().get('')
+        request.user = user
+        request.client = None
+
+        # One query for the dataset permissions, and one for the user's groups
+        with self.assertNumQueries(2):
+            matrix = get_data_permission_matrix(request, dataset)
+            self.assertTrue(matrix.allows('retrieve', 'comments'))
+            self.assertFalse(matrix.allows('create', 'comments'))
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_data_permission_matrix(request, dataset), matrix)
+            self.assertTrue(matrix.allows('retrieve', 'places'))
+
+    def test_permission_matrix_fails_when_requesting_an_unknown_permission(self):
+        matrix = DataPermissionMatrix(None, None, None)
+        with self.assertRaises(ValueError):
+            matrix.allows('obliterate', 'comments')
+
 
 # More permissions tests to write:
 # - General client permission allows reading and restricts writing
@@ -3,6 +3,8 @@
 from django.test import TestCase
 from nose.tools import istest
 from sa_api_v2.renderers import GeoJSONRenderer
+from sa_api_v2.utils import GeoJSONGeometry
+import json
 
 class TestGeoJSONRenderer (TestCase):
 
@@ -27,6 +29,19 @@ class TestGeoJSONRenderer (TestCase):
         result = renderer.render(data)
         self.assertEqual(result, '')
 
+    def test_embeds_geojson_geometries(self):
+        renderer = GeoJSONRenderer()
+        data = [
+          {'id': 1, 'geometry': GeoJSONGeometry('{"type":"Point","coordinates":[2,3]}'), 'name': 'K-Mart'},
+          {'id': 2, 'geometry': 'POINT (4 5)', 'name': 'Target'},
+        ]
+
+        result = json.loads(renderer.render(data))
+        self.assertEqual(result['type'], 'FeatureCollection')
+        self.assertEqual(result['features'][0]['geometry'], {'type': 'Point', 'coordinates': [2, 3]})
+        self.assertEqual(result['features'][0]['properties'], {'id': 1, 'name': 'K-Mart'})
+        self.assertEqual(result['features'][1]['geometry'], {'type': 'Point', 'coordinates': [4, 5]})
+
 # class TestCSVRenderer (TestCase):
 
 #     def test_tablize_a_list_with_no_elements(self):
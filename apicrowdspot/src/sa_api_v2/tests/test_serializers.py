@@ -8,6 +8,8 @@ from nose.tools import istest
 from sa_api_v2.cache import cache_buffer
 from sa_api_v2.models import Attachment, Action, User, DataSet, Place, SubmissionSet, Submission, Group
 from sa_api_v2.serializers import AttachmentSerializer, ActionSerializer, UserSerializer, PlaceSerializer, DataSetSerializer, SubmissionSerializer
+from sa_api_v2.serializers import reverse_from_template
+from rest_framework.reverse import reverse as drf_reverse
 from social.apps.django_app.default.models import UserSocialAuth
 import json
 from os import path
@@ -290,3 +292,23 @@ class TestDataSetSerializer (TestCase):
 
         data = serializer.data
         self.assertIsInstance(data, dict)
+
+
+class TestURLTemplates (TestCase):
+    def test_urls_match_reverse(self):
+        request = RequestFactory().get('')
+        url_kwargs = [
+            ('dataset-detail', {'owner_username': 'aaron', 'dataset_slug': 'my-ds'}),
+            ('place-list', {'owner_username': 'aaron', 'dataset_slug': 'my-ds'}),
+            ('place-detail', {'owner_username': 'aaron', 'dataset_slug': 'my-ds', 'place_id': 12}),
+            ('submission-list', {'owner_username': 'aaron', 'dataset_slug': 'my-ds', 'place_id': 12, 'submission_set_name': 'comments'}),
+            ('submission-detail', {'owner_username': 'aaron', 'dataset_slug': 'my-ds', 'place_id': 12, 'submission_set_name': 'comments', 'submission_id': 34}),
+            ('dataset-submission-list', {'owner_username': 'aaron', 'dataset_slug': 'my-ds', 'submission_set_name': 'comments'}),
+            ('user-detail', {'owner_username': u'\xe5aron w.'}),
+        ]
+
+        for view_name, kwargs in url_kwargs:
+            self.assertEqual(reverse_from_template(view_name, kwargs),
+                             drf_reverse(view_name, kwargs=kwargs))
+            self.assertEqual(reverse_from_template(view_name, kwargs, request=request),
+                             drf_reverse(view_name, kwargs=kwargs, request=request))
@@ -6,6 +6,7 @@
 # """
 
 from django.test import TestCase
+from django.contrib.gis.geos import Point
 from django.contrib.gis.measure import D
 # from nose.tools import istest
 from nose.tools import assert_equal, assert_false, assert_true, assert_raises
@@ -51,6 +52,63 @@ class TestBuildRelativeURL (TestCase):
         assert_equal(url, '/about.html')
 
 
+
+class TestGetDistanceEnvelope (TestCase):
+    def test_envelope_contains_points_at_the_distance(self):
+        envelope = utils.get_distance_envelope(Point(10, 60, srid=4326), D(km=10))
+        assert_equal(envelope.srid, 4326)
+
+        # 10km is about 0.09 degrees of latitude, and twice as many degrees
+        # of longitude at 60 degrees north.
+        assert_true(envelope.contains(Point(10, 60.089)))
+        assert_true(envelope.contains(Point(10.179, 60)))
+        assert_false(envelope.contains(Point(10, 60.2)))
+        assert_false(envelope.contains(Point(10.3, 60)))
+
+    def test_envelope_near_the_pole_covers_every_longitude(self):
+        envelope = utils.get_distance_envelope(Point(10, 89.95, srid=4326), D(km=10))
+        assert_true(envelope.contains(Point(-170, 89.99)))
+
+
+class TestSnapBoundsToTiles (TestCase):
+    def test_nearby_bounds_snap_to_the_same_tiles(self):
+        bounds = utils.snap_bounds_to_tiles((-75.17, 39.94, -75.15, 39.96))
+        assert_equal(bounds, utils.snap_bounds_to_tiles((-75.1699, 39.9401, -75.1501, 39.9599)))
+
+    def test_snapped_bounds_contain_the_bounds(self):
+        west, south, east, north = utils.snap_bounds_to_tiles((-75.17, 39.94, -75.15, 39.96))
+        assert_true(west <= -75.17 and south <= 39.94)
+        assert_true(east >= -75.15 and north >= 39.96)
+
+    def test_bounds_at_the_edge_of_the_map_snap_to_the_poles(self):
+        assert_equal(utils.snap_bounds_to_tiles((-180, -89, 180, 89)), (-180.0, -90.0, 180.0, 90.0))
+
+
+class TestUncountedPaginator (TestCase):
+    def test_pages_are_not_counted(self):
+        paginator = utils.UncountedPaginator(range(5), 2)
+        assert_equal(paginator.count, None)
+        assert_equal(paginator.num_pages, None)
+
+        page = paginator.page(2)
+        assert_equal(list(page.object_list), [2, 3])
+        assert_true(page.has_next())
+        assert_equal(page.next_page_number(), 3)
+
+        page = paginator.page(3)
+        assert_equal(list(page.object_list), [4])
+        assert_false(page.has_next())
+
+    def test_count_is_taken_from_get_count(self):
+        paginator = utils.UncountedPaginator(range(5), 2, get_count=lambda objs: 4)
+        assert_equal(paginator.count, 4)
+        assert_equal(paginator.num_pages, 2)
+
+        # The count does not limit the pages
+        page = paginator.page(3)
+        assert_equal(list(page.object_list), [4])
+
+
 # class TestToWkt (object):
 
 #     @istest
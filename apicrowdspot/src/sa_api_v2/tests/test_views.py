@@ -12,12 +12,15 @@ import mock
 from StringIO import StringIO
 from ..models import User, DataSet, Place, SubmissionSet, Submission, Attachment, Action, Group, DataIndex
 from ..cache import cache_buffer
+from ..renderers import GeoJSONRenderer
+from ..tasks import refresh_cached_response
 from ..apikey.models import ApiKey
 from ..apikey.auth import KEY_HEADER
 from ..cors.models import Origin
 from ..views import (PlaceInstanceView, PlaceListView, SubmissionInstanceView,
     SubmissionListView, DataSetSubmissionListView, DataSetInstanceView,
-    DataSetListView, AttachmentListView, ActionListView)
+    DataSetListView, DataSetSchemaView, AttachmentListView, ActionListView,
+    PlaceTileView, PlaceClusterListView)
 
 
 class APITestMixin (object):
@@ -235,6 +238,7 @@ class TestPlaceInstanceView (APITestMixin, TestCase):
         # Create a dummy view instance so that we can call get_cache_key
         temp_view = PlaceInstanceView()
         temp_view.request = request
+        temp_view.kwargs = self.request_kwargs
 
         # Check that the response is cached
         cache_key = temp_view.get_cache_key(request)
@@ -492,13 +496,6 @@ class TestPlaceInstanceView (APITestMixin, TestCase):
         # - SELECT * FROM sa_api_submissionset AS ss
         #    WHERE ss.place_id IN (<self.place.id>);
         #
-        # - SELECT * FROM sa_api_submission AS s
-        #     JOIN sa_api_submittedthing AS t ON (s.submittedthing_ptr_id = t.id)
-        #    WHERE s.parent_id IN (<self.comments.id>, <self.likes.id>, <self.applause.id>);
-        #
-        # - SELECT * FROM sa_api_attachment AS a
-        #    WHERE a.thing_id IN (<[each submission id]>);
-        #
         # - SELECT * FROM sa_api_attachment AS a
         #    WHERE a.thing_id IN (<self.place.id>);
         #
@@ -506,7 +503,7 @@ class TestPlaceInstanceView (APITestMixin, TestCase):
         #     JOIN sa_api_group_submitters as s ON (g.id = s.group_id)
         #    WHERE gs.user_id IN (<[each submitter id]>);
         #
-        with self.assertNumQueries(9):
+        with self.assertNumQueries(7):
             response = self.view(request, **self.request_kwargs)
             self.assertStatusCode(response, 200)
 
@@ -551,13 +548,6 @@ class TestPlaceInstanceView (APITestMixin, TestCase):
         # - SELECT * FROM sa_api_submissionset AS ss
         #    WHERE ss.place_id IN (<self.place.id>);
         #
-        # - SELECT * FROM sa_api_submission AS s
-        #     JOIN sa_api_submittedthing AS t ON (s.submittedthing_ptr_id = t.id)
-        #    WHERE s.parent_id IN (<self.comments.id>, <self.likes.id>, <self.applause.id>);
-        #
-        # - SELECT * FROM sa_api_attachment AS a
-        #    WHERE a.thing_id IN (<[each submission id]>);
-        #
         # - SELECT * FROM sa_api_attachment AS a
         #    WHERE a.thing_id IN (<self.place.id>);
         #
@@ -568,7 +558,7 @@ class TestPlaceInstanceView (APITestMixin, TestCase):
         # - SELECT * FROM sa_api_datasetpermission as perm
         #    WHERE perm.dataset_id = <self.place.dataset.id>;
         #
-        with self.assertNumQueries(19):
+        with self.assertNumQueries(15):
             response = self.view(anon_request, **self.request_kwargs)
             self.assertStatusCode(response, 200)
             response = self.view(auth_request, **self.request_kwargs)
@@ -878,6 +868,10 @@ class TestPlaceListView (APITestMixin, TestCase):
             'http://testserver/api/v2/%s/datasets/%s/places/%s' %
             (self.owner.username, self.dataset.slug, self.place.id))
 
+        # Check that the geometry came through as GeoJSON
+        self.assertEqual(data['features'][0]['geometry'],
+            {'type': 'Point', 'coordinates': [2, 3]})
+
     def test_GET_response_for_multiple_specific_objects(self):
         places = []
         for _ in range(10):
@@ -939,6 +933,10 @@ class TestPlaceListView (APITestMixin, TestCase):
         # Check that we have the right number of rows
         self.assertEqual(len(rows), 2)
 
+        # Check that the geometry is still written as WKT
+        geometry = rows[1][headers.index('geometry')]
+        self.assertEqual(geos.GEOSGeometry(geometry), geos.Point(2, 3))
+
     def test_GET_filtered_response(self):
         Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data=json.dumps({'foo': 'bar', 'name': 1})),
         Place.objects.create(dataset=self.dataset, geometry='POINT(1 0)', data=json.dumps({'foo': 'bar', 'name': 2})),
@@ -998,6 +996,105 @@ class TestPlaceListView (APITestMixin, TestCase):
             self.view(request, **self.request_kwargs)
             self.assertEqual(patched_filter.call_count, 0)
 
+    def test_GET_indexed_range_response(self):
+        Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data=json.dumps({'foo': 'bar', 'votes': 1})),
+        Place.objects.create(dataset=self.dataset, geometry='POINT(1 0)', data=json.dumps({'foo': 'bar', 'votes': 10})),
+        Place.objects.create(dataset=self.dataset, geometry='POINT(2 0)', data=json.dumps({'foo': 'baz', 'votes': 30})),
+
+        self.dataset.indexes.add(DataIndex(attr_name='votes', attr_type='number'))
+
+        request = self.factory.get(self.path + '?votes__gte=10&votes__lt=20')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+
+        self.assertStatusCode(response, 200)
+        self.assertEqual([feature['properties']['votes'] for feature in data['features']], [10])
+
+        request = self.factory.get(self.path + '?votes__gte=lots')
+        response = self.view(request, **self.request_kwargs)
+        self.assertStatusCode(response, 400)
+
+    def test_GET_cursor_paginated_response(self):
+        for i in range(5):
+            Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data=json.dumps({'i': i}))
+
+        # Follow the cursors until the end
+        seen = []
+        url = self.path + '?cursor&page_size=2'
+        while url:
+            request = self.factory.get(url)
+            response = self.view(request, **self.request_kwargs)
+            data = json.loads(response.rendered_content)
+
+            self.assertStatusCode(response, 200)
+            self.assertNotIn('length', data['metadata'])
+            self.assertLessEqual(len(data['features']), 2)
+            seen.extend(feature['id'] for feature in data['features'])
+            url = data['metadata']['next']
+
+        # All the places are listed once, most recently updated first
+        places = Place.objects.filter(dataset=self.dataset).order_by('-updated_datetime', '-id')
+        self.assertEqual(seen, [place.id for place in places])
+
+    def test_GET_cursor_paginated_response_with_invalid_cursor(self):
+        request = self.factory.get(self.path + '?cursor=not-a-cursor')
+        response = self.view(request, **self.request_kwargs)
+        self.assertStatusCode(response, 400)
+
+    def test_GET_response_count_is_cached_until_the_data_changes(self):
+        request = self.factory.get(self.path + '?type=ATM')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+        self.assertStatusCode(response, 200)
+        self.assertEqual(data['metadata']['length'], 1)
+
+        # Change the data without starting a new cache generation. A
+        # different page size is a new response, but the same count.
+        Place.objects.filter(pk=self.invisible_place.pk).update(visible=True)
+
+        request = self.factory.get(self.path + '?type=ATM&page_size=10')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+        self.assertEqual(data['metadata']['length'], 1)
+
+        # Saving a place starts a new generation, with a new count.
+        Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data=json.dumps({'type': 'ATM'}))
+
+        request = self.factory.get(self.path + '?type=ATM&page_size=10')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+        self.assertEqual(data['metadata']['length'], 3)
+
+    def test_GET_response_with_estimated_or_no_count(self):
+        for i in range(3):
+            Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data=json.dumps({'i': i}))
+
+        request = self.factory.get(self.path + '?count=none&page_size=2')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+        self.assertStatusCode(response, 200)
+        self.assertIsNone(data['metadata']['length'])
+        self.assertEqual(len(data['features']), 2)
+        self.assertIsNotNone(data['metadata']['next'])
+
+        request = self.factory.get(self.path + '?count=none&page_size=2&page=2')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+        self.assertStatusCode(response, 200)
+        self.assertEqual(len(data['features']), 2)
+        self.assertIsNone(data['metadata']['next'])
+
+        request = self.factory.get(self.path + '?count=estimate&page_size=2')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+        self.assertStatusCode(response, 200)
+        self.assertIsInstance(data['metadata']['length'], int)
+        self.assertIsNotNone(data['metadata']['next'])
+
+        request = self.factory.get(self.path + '?count=sometimes')
+        response = self.view(request, **self.request_kwargs)
+        self.assertStatusCode(response, 400)
+
     def test_GET_paginated_response(self):
         # Create a view with pagination configuration set, for consistency
         class OverridePlaceListView (PlaceListView):
@@ -1046,6 +1143,75 @@ class TestPlaceListView (APITestMixin, TestCase):
                          [3,2,4,1])
         self.assertIn('distance', data['features'][0]['properties'])
 
+    def test_GET_nearby_response_within_distance(self):
+        Place.objects.create(dataset=self.dataset, geometry='POINT(0.01 0)', data=json.dumps({'new_place': 'yes', 'name': 2})),
+        Place.objects.create(dataset=self.dataset, geometry='POINT(0 0)', data=json.dumps({'new_place': 'yes', 'name': 1})),
+        Place.objects.create(dataset=self.dataset, geometry='POINT(0.1 0)', data=json.dumps({'new_place': 'yes', 'name': 3})),
+        Place.objects.create(dataset=self.dataset, geometry='POINT(0 60.05)', data=json.dumps({'new_place': 'yes', 'name': 4})),
+
+        request = self.factory.get(self.path + '?near=0,0&distance_lt=2km&new_place=yes')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+
+        # Only the places within 2km (about 0.018 degrees at the equator)
+        # are listed, nearest first, with their distances in meters.
+        self.assertStatusCode(response, 200)
+        self.assertEqual([feature['properties']['name'] for feature in data['features']], [1, 2])
+        self.assertAlmostEqual(float(data['features'][1]['properties']['distance']), 1112, delta=5)
+
+    def test_GET_simplified_response(self):
+        Place.objects.create(dataset=self.dataset, data=json.dumps({'new_place': 'yes'}),
+            geometry='POLYGON((0 0, 0.5 0.001, 1 0, 1 1, 0 1, 0 0))')
+
+        request = self.factory.get(self.path + '?new_place=yes&precision=2')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+
+        self.assertStatusCode(response, 200)
+        self.assertEqual(data['features'][0]['geometry']['coordinates'][0],
+                         [[0, 0], [0.5, 0], [1, 0], [1, 1], [0, 1], [0, 0]])
+
+        # The vertex that is within the tolerance of the simplified polygon
+        # is dropped.
+        request = self.factory.get(self.path + '?new_place=yes&simplify=0.01')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+
+        self.assertStatusCode(response, 200)
+        self.assertEqual(data['features'][0]['geometry']['coordinates'][0],
+                         [[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]])
+
+        for query in ('?precision=fine', '?precision=16', '?simplify=-1'):
+            request = self.factory.get(self.path + query)
+            response = self.view(request, **self.request_kwargs)
+            self.assertStatusCode(response, 400)
+
+    def test_GET_snapped_bounds_response(self):
+        Place.objects.create(dataset=self.dataset, geometry='POINT(2.05 3)', data=json.dumps({'new_place': 'yes', 'name': 1})),
+
+        # Bounds that differ a little are snapped to the same tiles, and so
+        # make the same (cacheable) request.
+        request1 = self.factory.get(self.path + '?bounds=1.9,2.9,2.04,3.1&snap&new_place=yes')
+        response1 = self.view(request1, **self.request_kwargs)
+        request2 = self.factory.get(self.path + '?new_place=yes&snap&bounds=1.91,2.91,2.03,3.09')
+        response2 = self.view(request2, **self.request_kwargs)
+
+        self.assertStatusCode(response1, 200)
+        self.assertEqual(request1.META['QUERY_STRING'], request2.META['QUERY_STRING'])
+        self.assertEqual(response1.rendered_content, response2.rendered_content)
+
+        # The snapped bounds include the place just outside of the original
+        # bounds.
+        data = json.loads(response1.rendered_content)
+        self.assertEqual([feature['properties']['name'] for feature in data['features']], [1])
+
+    def test_GET_snapped_nearby_response(self):
+        request = self.factory.get(self.path + '?near=3.00012,2.00049&snap')
+        response = self.view(request, **self.request_kwargs)
+
+        self.assertStatusCode(response, 200)
+        self.assertEqual(request.GET['near'], '3.000,2.000')
+
     def test_GET_response_with_private_data(self):
         #
         # View should not return private data normally
@@ -1564,6 +1730,415 @@ class TestPlaceListView (APITestMixin, TestCase):
         with self.assertNumQueries(8):
             view(request, **request_kwargs)
 
+    def test_GET_from_rendered_cache(self):
+        request = self.factory.get(self.path)
+        response = self.view(request, **self.request_kwargs)
+        initial_content = response.rendered_content
+
+        # The cached body should be returned without rendering it again.
+        request = self.factory.get(self.path)
+        with mock.patch.object(GeoJSONRenderer, 'render') as patched_render:
+            response = self.view(request, **self.request_kwargs)
+            self.assertEqual(patched_render.call_count, 0)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, initial_content)
+
+    def test_GET_jsonp_response_from_rendered_json_cache(self):
+        request = self.factory.get(self.path)
+        response = self.view(request, **self.request_kwargs)
+        json_content = response.rendered_content
+
+        # JSONP should wrap the cached JSON body, whatever the callback name.
+        request = self.factory.get(self.path + '?callback=myFunc')
+        with self.assertNumQueries(2):
+            response = self.view(request, **self.request_kwargs)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, 'myFunc(' + json_content + ');')
+        self.assertIn('javascript', response['Content-Type'])
+
+    def test_renaming_the_dataset_updates_cached_place_urls(self):
+        request = self.factory.get(self.path + '?include_submissions')
+        self.view(request, **self.request_kwargs)
+        cache_buffer.flush()
+
+        self.dataset.slug = 'renamed'
+        self.dataset.save()
+        cache_buffer.flush()
+
+        request_kwargs = dict(self.request_kwargs, dataset_slug='renamed')
+        path = reverse('place-list', kwargs=request_kwargs)
+        request = self.factory.get(path + '?include_submissions')
+        response = self.view(request, **request_kwargs)
+        data = json.loads(response.rendered_content)
+
+        self.assertStatusCode(response, 200)
+        place_urls = [feature['properties']['url'] for feature in data['features']]
+        submission_urls = [
+            submission['url']
+            for feature in data['features']
+            for submission_set in feature['properties']['submission_sets'].values()
+            for submission in submission_set]
+        self.assertTrue(submission_urls)
+        for url in place_urls + submission_urls:
+            self.assertIn('/datasets/renamed/', url)
+
+    def test_new_submission_clears_GET_cache(self):
+        request = self.factory.get(self.path)
+        response = self.view(request, **self.request_kwargs)
+        initial_data = json.loads(response.rendered_content)
+
+        # Adding a submission bumps the dataset's cache generation, so the
+        # list should not be served from the old cache entry.
+        place = Place.objects.filter(dataset=self.dataset, visible=True)[0]
+        comments = SubmissionSet.objects.get_or_create(place=place, name='comments')[0]
+        Submission.objects.create(parent=comments, dataset=self.dataset, data='{}')
+        cache_buffer.flush()
+
+        request = self.factory.get(self.path)
+        response = self.view(request, **self.request_kwargs)
+        new_data = json.loads(response.rendered_content)
+        self.assertNotEqual(initial_data, new_data)
+
+    def test_GET_serves_previous_version_while_another_request_rebuilds(self):
+        request = self.factory.get(self.path)
+        response = self.view(request, **self.request_kwargs)
+        initial_content = response.rendered_content
+
+        # Invalidate the cached list
+        Place.objects.create(dataset=self.dataset, geometry='POINT(4 5)')
+        cache_buffer.flush()
+
+        # While the rebuild lock is held elsewhere, the previous version
+        # should be served without hitting the database for places.
+        with mock.patch.object(PlaceListView, 'acquire_cache_lock', return_value=None):
+            request = self.factory.get(self.path)
+            with self.assertNumQueries(2):
+                response = self.view(request, **self.request_kwargs)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, initial_content)
+
+        # Once the lock is free, the list is rebuilt.
+        request = self.factory.get(self.path)
+        response = self.view(request, **self.request_kwargs)
+        self.assertNotEqual(response.rendered_content, initial_content)
+
+    def test_GET_builds_response_when_lock_wait_times_out(self):
+        with mock.patch.object(PlaceListView, 'acquire_cache_lock', return_value=None), \
+             mock.patch.object(PlaceListView, 'cache_lock_wait', 0):
+            request = self.factory.get(self.path)
+            response = self.view(request, **self.request_kwargs)
+
+        self.assertStatusCode(response, 200)
+        data = json.loads(response.rendered_content)
+        self.assertIn('features', data)
+
+    def test_GET_releases_cache_lock(self):
+        request = self.factory.get(self.path)
+        self.view(request, **self.request_kwargs)
+
+        temp_view = PlaceListView()
+        temp_view.request = request
+        temp_view.kwargs = self.request_kwargs
+        temp_view.format_kwarg = None
+        lock_key = temp_view.get_cache_lock_key(temp_view.get_cache_key(request))
+        self.assertIsNone(django_cache.get(lock_key))
+
+    @mock.patch.object(PlaceListView, 'cache_soft_timeout', 60)
+    def test_GET_serves_stale_response_and_refreshes_in_background(self):
+        request = self.factory.get(self.path)
+        response = self.view(request, **self.request_kwargs)
+        initial_content = response.rendered_content
+
+        # Invalidate the cached list
+        Place.objects.create(dataset=self.dataset, geometry='POINT(4 5)')
+        cache_buffer.flush()
+
+        # Anonymous users get the stale list, and a refresh is queued once.
+        with mock.patch('sa_api_v2.tasks.refresh_cached_response.delay') as delay:
+            for _ in range(2):
+                request = self.factory.get(self.path)
+                response = self.view(request, **self.request_kwargs)
+                self.assertEqual(response.content, initial_content)
+            self.assertEqual(delay.call_count, 1)
+
+        # Authenticated users never get stale data.
+        request = self.factory.get(self.path)
+        request.user = self.owner
+        response = self.view(request, **self.request_kwargs)
+        self.assertNotEqual(response.rendered_content, initial_content)
+
+        # After the refresh runs, anonymous users get the new list.
+        refresh_cached_response(self.path, '', '')
+        request = self.factory.get(self.path)
+        response = self.view(request, **self.request_kwargs)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.content, initial_content)
+
+    @mock.patch.object(PlaceListView, 'cache_soft_timeout', -1)
+    def test_GET_rebuilds_stale_authenticated_response(self):
+        request = self.factory.get(self.path)
+        request.user = self.owner
+        response = self.view(request, **self.request_kwargs)
+        initial_content = response.rendered_content
+
+        # Change a place without clearing the cache. The cached list went
+        # stale as soon as it was cached.
+        Place.objects.filter(pk=self.place.pk).update(data=json.dumps({'name': 'Wal-Mart'}))
+
+        # Background refreshes are anonymous, so the authenticated list is
+        # rebuilt right away instead.
+        with mock.patch('sa_api_v2.tasks.refresh_cached_response.delay') as delay:
+            request = self.factory.get(self.path)
+            request.user = self.owner
+            response = self.view(request, **self.request_kwargs)
+            self.assertEqual(delay.call_count, 0)
+        self.assertStatusCode(response, 200)
+        self.assertNotEqual(response.rendered_content, initial_content)
+
+    @mock.patch.object(PlaceListView, 'stream_min_page_size', 2)
+    @mock.patch.object(PlaceListView, 'stream_chunk_size', 2)
+    def test_GET_streamed_response(self):
+        for x in range(4):
+            Place.objects.create(dataset=self.dataset, geometry='POINT(%s 0)' % x, data='{}')
+        cache_buffer.flush()
+
+        request = self.factory.get(self.path + '?page_size=3')
+        response = self.view(request, **self.request_kwargs)
+        self.assertStatusCode(response, 200)
+        self.assertTrue(response.streaming)
+
+        data = json.loads(''.join(response.streaming_content))
+        self.assertEqual(data['type'], 'FeatureCollection')
+        self.assertEqual(data['metadata']['length'], 5)
+        self.assertEqual(data['metadata']['num_pages'], 2)
+        self.assertEqual(len(data['features']), 3)
+        self.assertEqual(data['features'][0]['type'], 'Feature')
+        self.assertIn('coordinates', data['features'][0]['geometry'])
+
+        # The streamed pages should not overlap.
+        request = self.factory.get(self.path + '?page_size=3&page=2')
+        response = self.view(request, **self.request_kwargs)
+        data2 = json.loads(''.join(response.streaming_content))
+        ids = [f['id'] for f in data['features'] + data2['features']]
+        self.assertEqual(len(set(ids)), 5)
+
+    @mock.patch.object(PlaceListView, 'stream_min_page_size', 2)
+    def test_GET_streamed_jsonp_response(self):
+        request = self.factory.get(self.path + '?page_size=3&callback=myFunc')
+        response = self.view(request, **self.request_kwargs)
+        self.assertStatusCode(response, 200)
+
+        content = ''.join(response.streaming_content)
+        self.assertTrue(content.startswith('myFunc('))
+        self.assertTrue(content.endswith(');'))
+        data = json.loads(content[len('myFunc('):-len(');')])
+        self.assertEqual(len(data['features']), 1)
+
+    @mock.patch.object(PlaceListView, 'stream_min_page_size', 2)
+    def test_GET_streamed_csv_response(self):
+        request = self.factory.get(self.path + '?format=csv&page_size=10')
+        response = self.view(request, **self.request_kwargs)
+        self.assertStatusCode(response, 200)
+        self.assertTrue(response.streaming)
+
+        rows = list(csv.reader(StringIO(''.join(response.streaming_content))))
+        headers = rows[0]
+
+        # Check that the header comes from the known columns and attributes
+        self.assertEqual(headers, sorted(headers))
+        self.assertIn('geometry', headers)
+        self.assertIn('name', headers)
+        self.assertIn('submitter.username', headers)
+        self.assertIn('submission_sets.likes.length', headers)
+        self.assertNotIn('private-secrets', headers)
+
+        # Check that we have the right rows
+        self.assertEqual(len(rows), 2)
+        row = dict(zip(headers, rows[1]))
+        self.assertEqual(row['name'], 'K-Mart')
+        self.assertEqual(row['submitter.username'], 'mjumbe')
+        self.assertEqual(row['submission_sets.likes.length'], '3')
+
+
+class TestPlaceTileView (APITestMixin, TestCase):
+    def setUp(self):
+        cache_buffer.reset()
+        django_cache.clear()
+
+        self.owner = User.objects.create_user(username='aaron', password='123', email='abc@example.com')
+        self.dataset = DataSet.objects.create(slug='ds', owner=self.owner)
+        self.place = Place.objects.create(
+          dataset=self.dataset,
+          geometry='POINT(2 3)',
+          data=json.dumps({'name': 'K-Mart'}),
+        )
+        self.invisible_place = Place.objects.create(
+          dataset=self.dataset,
+          geometry='POINT(2 3)',
+          visible=False,
+          data=json.dumps({'name': 'Walmart'}),
+        )
+        self.far_place = Place.objects.create(
+          dataset=self.dataset,
+          geometry='POINT(-75 40)',
+          data=json.dumps({'name': 'Target'}),
+        )
+
+        self.factory = RequestFactory()
+        self.view = PlaceTileView.as_view()
+
+    def tearDown(self):
+        User.objects.all().delete()
+        DataSet.objects.all().delete()
+        Place.objects.all().delete()
+
+        cache_buffer.reset()
+        django_cache.clear()
+
+    def get_tile(self, zoom, x, y, query=''):
+        kwargs = {
+          'owner_username': self.owner.username,
+          'dataset_slug': self.dataset.slug,
+          'zoom': str(zoom), 'x': str(x), 'y': str(y)
+        }
+        request = self.factory.get(reverse('place-tile', kwargs=kwargs) + query)
+        return request, self.view(request, **kwargs)
+
+    def test_GET_response(self):
+        # POINT(2 3) is in tile 517/503 at zoom 10.
+        request, response = self.get_tile(10, 517, 503)
+        data = json.loads(response.rendered_content)
+
+        self.assertStatusCode(response, 200)
+        self.assertEqual(data['type'], 'FeatureCollection')
+        self.assertNotIn('metadata', data)
+        self.assertEqual([feature['properties']['name'] for feature in data['features']], ['K-Mart'])
+
+        request, response = self.get_tile(0, 0, 0)
+        data = json.loads(response.rendered_content)
+        self.assertEqual(set(feature['properties']['name'] for feature in data['features']), set(['K-Mart', 'Target']))
+
+    def test_GET_low_zoom_tile_is_truncated(self):
+        with mock.patch.object(PlaceTileView, 'max_places_per_tile', 1):
+            request, response = self.get_tile(0, 0, 0)
+        data = json.loads(response.rendered_content)
+
+        self.assertStatusCode(response, 200)
+        self.assertEqual(data['type'], 'FeatureCollection')
+        self.assertEqual(data['metadata'], {'truncated': True, 'limit': 1})
+        self.assertEqual(len(data['features']), 1)
+        self.assertIn(data['features'][0]['properties']['name'], ['K-Mart', 'Target'])
+
+    def test_GET_response_for_tile_outside_of_grid(self):
+        request, response = self.get_tile(1, 2, 0)
+        self.assertStatusCode(response, 404)
+
+    def test_GET_response_is_cached_until_dataset_changes(self):
+        request, response = self.get_tile(10, 517, 503)
+
+        temp_view = PlaceTileView()
+        temp_view.request = request
+        temp_view.kwargs = {'owner_username': self.owner.username, 'dataset_slug': self.dataset.slug}
+        cache_key = temp_view.get_cache_key(request)
+        self.assertIsNotNone(django_cache.get(cache_key))
+
+        Place.objects.create(dataset=self.dataset, geometry='POINT(2.01 3)', data=json.dumps({'name': 'Costco'}))
+        cache_buffer.flush()
+        self.assertIsNone(django_cache.get(temp_view.get_cache_key(request)))
+
+        request, response = self.get_tile(10, 517, 503)
+        data = json.loads(response.rendered_content)
+        self.assertEqual(len(data['features']), 2)
+
+    def test_POST_is_not_allowed(self):
+        kwargs = {
+          'owner_username': self.owner.username,
+          'dataset_slug': self.dataset.slug,
+          'zoom': '0', 'x': '0', 'y': '0'
+        }
+        request = self.factory.post(reverse('place-tile', kwargs=kwargs), data='{}', content_type='application/json')
+        response = self.view(request, **kwargs)
+        self.assertStatusCode(response, 405)
+
+
+class TestPlaceClusterListView (APITestMixin, TestCase):
+    def setUp(self):
+        cache_buffer.reset()
+        django_cache.clear()
+
+        self.owner = User.objects.create_user(username='aaron', password='123', email='abc@example.com')
+        self.dataset = DataSet.objects.create(slug='ds', owner=self.owner)
+        Place.objects.create(dataset=self.dataset, geometry='POINT(2.001 3.001)', data=json.dumps({'type': 'ATM'}))
+        Place.objects.create(dataset=self.dataset, geometry='POINT(2.003 3.003)', data=json.dumps({'type': 'ATM'}))
+        Place.objects.create(dataset=self.dataset, geometry='POINT(2.002 3.005)', data=json.dumps({'type': 'Bank'}))
+        Place.objects.create(dataset=self.dataset, geometry='POINT(2.002 3.002)', data=json.dumps({'type': 'Bank'}), visible=False)
+        Place.objects.create(dataset=self.dataset, geometry='POINT(-75 40)', data=json.dumps({'type': 'ATM'}))
+
+        self.request_kwargs = {
+          'owner_username': self.owner.username,
+          'dataset_slug': self.dataset.slug
+        }
+
+        self.factory = RequestFactory()
+        self.path = reverse('place-cluster-list', kwargs=self.request_kwargs)
+        self.view = PlaceClusterListView.as_view()
+
+    def tearDown(self):
+        User.objects.all().delete()
+        DataSet.objects.all().delete()
+        Place.objects.all().delete()
+
+        cache_buffer.reset()
+        django_cache.clear()
+
+    def test_GET_response(self):
+        request = self.factory.get(self.path + '?zoom=10')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+
+        # The nearby visible places are clustered together, largest cluster
+        # first.
+        self.assertStatusCode(response, 200)
+        self.assertEqual(data['type'], 'FeatureCollection')
+        self.assertEqual([feature['properties']['count'] for feature in data['features']], [3, 1])
+
+        cluster = data['features'][0]
+        self.assertEqual(cluster['geometry']['type'], 'Point')
+        self.assertAlmostEqual(cluster['geometry']['coordinates'][0], 2.002)
+        self.assertAlmostEqual(cluster['geometry']['coordinates'][1], 3.003)
+        for actual, expected in zip(cluster['properties']['bbox'], [2.001, 3.001, 2.003, 3.005]):
+            self.assertAlmostEqual(actual, expected)
+        self.assertNotIn('categories', cluster['properties'])
+
+        # Only the places that match the filters are clustered.
+        request = self.factory.get(self.path + '?zoom=10&type=ATM')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+        self.assertEqual([feature['properties']['count'] for feature in data['features']], [2, 1])
+
+    def test_GET_response_with_breakdown(self):
+        self.dataset.indexes.add(DataIndex(attr_name='type'))
+
+        request = self.factory.get(self.path + '?zoom=10&breakdown=type')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+
+        self.assertStatusCode(response, 200)
+        self.assertEqual(data['features'][0]['properties']['categories'], {'ATM': 2, 'Bank': 1})
+
+        request = self.factory.get(self.path + '?zoom=10&breakdown=name')
+        response = self.view(request, **self.request_kwargs)
+        self.assertStatusCode(response, 400)
+
+    def test_GET_response_with_invalid_zoom(self):
+        for query in ('', '?zoom=far', '?zoom=99'):
+            request = self.factory.get(self.path + query)
+            response = self.view(request, **self.request_kwargs)
+            self.assertStatusCode(response, 400)
+
 
 class TestSubmissionInstanceView (APITestMixin, TestCase):
     def setUp(self):
@@ -2086,6 +2661,24 @@ class TestSubmissionListView (APITestMixin, TestCase):
         self.assertStatusCode(response, 200)
         self.assertEqual(len(data['results']), 0)
 
+    def test_GET_response_count_from_submission_set_lengths(self):
+        # Make the stored length disagree with the submissions, to show
+        # where the count comes from.
+        SubmissionSet.objects.filter(pk=self.comments.pk).update(visible_length=5)
+
+        request = self.factory.get(self.path + '?count=estimate')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+        self.assertStatusCode(response, 200)
+        self.assertEqual(data['metadata']['length'], 5)
+
+        # Filtered lists are counted.
+        request = self.factory.get(self.path + '?foo=3')
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+        self.assertStatusCode(response, 200)
+        self.assertEqual(data['metadata']['length'], 2)
+
     def test_GET_response_with_private_data(self):
         #
         # View should not return private data normally
@@ -2940,6 +3533,20 @@ class TestDataSetSubmissionListView (APITestMixin, TestCase):
         self.assertStatusCode(response, 200)
         self.assertEqual(len(data['results']), 6)
 
+    @mock.patch.object(DataSetSubmissionListView, 'stream_min_page_size', 2)
+    @mock.patch.object(DataSetSubmissionListView, 'stream_chunk_size', 3)
+    def test_GET_streamed_response(self):
+        request = self.factory.get(self.path + '?page_size=10')
+        response = self.view(request, **self.request_kwargs)
+        self.assertStatusCode(response, 200)
+        self.assertTrue(response.streaming)
+
+        data = json.loads(''.join(response.streaming_content))
+        self.assertEqual(data['metadata']['length'], 4)
+        self.assertEqual(len(data['results']), 4)
+        self.assertEqual(len(set(r['id'] for r in data['results'])), 4)
+        self.assertNotIn('private-email', data['results'][0])
+
 
 class TestDataSetInstanceView (APITestMixin, TestCase):
     def setUp(self):
@@ -3048,16 +3655,9 @@ class TestDataSetInstanceView (APITestMixin, TestCase):
         # - SELECT * FROM "auth_user"
         #       WHERE id = <owner_id>;
         #
-        # - SELECT COUNT(*) FROM sa_api_place
-        #       INNER JOIN sa_api_submittedthing ON (submittedthing_ptr_id = sa_api_submittedthing.id)
-        #       WHERE dataset_id = <dataset_id>  AND visible = True;
-        #
-        # - SELECT sa_api_submittedthing.dataset_id, sa_api_submissionset.name, COUNT(*) AS "length" FROM sa_api_submission
-        #       LEFT OUTER JOIN sa_api_submittedthing ON (submittedthing_ptr_id = sa_api_submittedthing.id)
-        #       INNER JOIN sa_api_submissionset ON (parent_id = sa_api_submissionset.id)
-        #       WHERE dataset_id = <dataset_id>
-        #       GROUP BY dataset_id, sa_api_submissionset.name;
-        with self.assertNumQueries(5):
+        # - SELECT dataset_id, submission_set_name, count FROM sa_api_v2_datasetcounter
+        #       WHERE dataset_id IN (<dataset_id>) AND count > 0 AND visible = True;
+        with self.assertNumQueries(4):
             response = self.view(request, **self.request_kwargs)
             self.assertStatusCode(response, 200)
 
@@ -3217,6 +3817,92 @@ class TestDataSetInstanceView (APITestMixin, TestCase):
         self.assertEqual(data.get('submission_sets').get('likes').get('length'), 3)
 
 
+class TestDataSetSchemaView (APITestMixin, TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='aaron', password='123', email='abc@example.com')
+        self.dataset = DataSet.objects.create(slug='ds', owner=self.owner)
+        self.place = Place.objects.create(
+          dataset=self.dataset,
+          geometry='POINT(2 3)',
+          data=json.dumps({
+            'type': 'ATM',
+            'name': 'K-Mart',
+            'private-secrets': 42
+          }),
+        )
+        Place.objects.create(
+          dataset=self.dataset,
+          geometry='POINT(3 4)',
+          data=json.dumps({
+            'type': 'Bank',
+            'name': None,
+          }),
+        )
+        self.comments = SubmissionSet.objects.create(place=self.place, name='comments')
+        Submission.objects.create(parent=self.comments, dataset=self.dataset, data='{"comment": "Wow!", "private-email": "abc@example.com"}')
+        Submission.objects.create(parent=self.comments, dataset=self.dataset, data='{"comment": "Meh"}')
+
+        self.request_kwargs = {
+          'owner_username': self.owner.username,
+          'dataset_slug': self.dataset.slug
+        }
+
+        self.factory = RequestFactory()
+        self.path = reverse('dataset-schema', kwargs=self.request_kwargs)
+        self.view = DataSetSchemaView.as_view()
+
+        cache_buffer.reset()
+        django_cache.clear()
+
+    def tearDown(self):
+        User.objects.all().delete()
+        DataSet.objects.all().delete()
+
+        cache_buffer.reset()
+        django_cache.clear()
+
+    def test_GET_response(self):
+        request = self.factory.get(self.path)
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+
+        self.assertStatusCode(response, 200)
+        self.assertEqual(data, {
+          'places': {
+            'type': {'count': 2, 'types': {'string': 2}},
+            'name': {'count': 2, 'types': {'string': 1, 'null': 1}},
+          },
+          'comments': {
+            'comment': {'count': 2, 'types': {'string': 2}},
+          },
+        })
+
+    def test_GET_response_with_private_data(self):
+        request = self.factory.get(self.path + '?include_private')
+        response = self.view(request, **self.request_kwargs)
+        self.assertStatusCode(response, 401)
+
+        request = self.factory.get(self.path + '?include_private')
+        request.user = self.owner
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+
+        self.assertStatusCode(response, 200)
+        self.assertIn('private-secrets', data['places'])
+        self.assertIn('private-email', data['comments'])
+
+    def test_GET_response_omits_unreadable_submission_sets(self):
+        self.dataset.permissions.all().delete()
+        self.dataset.permissions.create(submission_set='places', can_retrieve=True)
+
+        request = self.factory.get(self.path)
+        response = self.view(request, **self.request_kwargs)
+        data = json.loads(response.rendered_content)
+
+        self.assertStatusCode(response, 200)
+        self.assertEqual(data.keys(), ['places'])
+
+
 class TestDataSetListView (APITestMixin, TestCase):
     def setUp(self):
         cache_buffer.reset()
@@ -4145,6 +4831,61 @@ class TestActivityView(APITestMixin, TestCase):
         self.assertIn('results', data)
         self.assertEqual(len(data['results']), len(self.actions))
 
+    def test_GET_with_id_range_polls_for_new_actions(self):
+        ids = sorted(action.id for action in self.actions)
+
+        request = self.factory.get(self.url + '?limit=2')
+        response = self.view(request, **self.kwargs)
+        data = json.loads(response.rendered_content)
+        self.assertStatusCode(response, 200)
+        self.assertEqual([result['id'] for result in data], [ids[3], ids[2]])
+
+        request = self.factory.get(self.url + '?after=%s' % ids[1])
+        response = self.view(request, **self.kwargs)
+        data = json.loads(response.rendered_content)
+        self.assertEqual([result['id'] for result in data], [ids[3], ids[2]])
+
+        request = self.factory.get(self.url + '?before=%s&limit=1' % ids[2])
+        response = self.view(request, **self.kwargs)
+        data = json.loads(response.rendered_content)
+        self.assertEqual([result['id'] for result in data], [ids[2]])
+
+        # A client that is up to date gets nothing new
+        request = self.factory.get(self.url + '?after=%s' % ids[3])
+        response = self.view(request, **self.kwargs)
+        data = json.loads(response.rendered_content)
+        self.assertEqual(data, [])
+
+        request = self.factory.get(self.url + '?after=latest')
+        response = self.view(request, **self.kwargs)
+        self.assertStatusCode(response, 400)
+
+    def test_GET_with_id_range_limit_is_capped_at_page_size(self):
+        with mock.patch.object(ActionListView, 'paginate_by', 3):
+            request = self.factory.get(self.url + '?limit=1000')
+            response = self.view(request, **self.kwargs)
+            data = json.loads(response.rendered_content)
+
+        self.assertStatusCode(response, 200)
+        self.assertEqual(len(data), 3)
+
+    def test_GET_with_cursor_pages_through_actions(self):
+        request = self.factory.get(self.url + '?cursor&page_size=3')
+        response = self.view(request, **self.kwargs)
+        data = json.loads(response.rendered_content)
+
+        self.assertEqual(len(data['results']), 3)
+        self.assertIsNotNone(data['metadata']['next'])
+
+        request = self.factory.get(data['metadata']['next'])
+        response = self.view(request, **self.kwargs)
+        next_data = json.loads(response.rendered_content)
+
+        self.assertEqual(len(next_data['results']), 1)
+        self.assertIsNone(next_data['metadata']['next'])
+        self.assertEqual(set(result['id'] for result in data['results'] + next_data['results']),
+                         set(action.id for action in self.actions))
+
     def test_GET_returns_all_things_with_include_invisible(self):
         #
         # View should 401 when not allowed to request private data (not authenticated)
@@ -32,6 +32,12 @@ urlpatterns = patterns('sa_api_v2',
         views.SubmissionListView.as_view(),
         name='submission-list'),
 
+    url(r'^(?P<owner_username>[^/]+)/datasets/(?P<dataset_slug>[^/]+)/places/clusters$',
+        views.PlaceClusterListView.as_view(),
+        name='place-cluster-list'),
+    url(r'^(?P<owner_username>[^/]+)/datasets/(?P<dataset_slug>[^/]+)/places/tiles/(?P<zoom>\d+)/(?P<x>\d+)/(?P<y>\d+)$',
+        views.PlaceTileView.as_view(),
+        name='place-tile'),
     url(r'^(?P<owner_username>[^/]+)/datasets/(?P<dataset_slug>[^/]+)/places/(?P<place_id>\d+)$',
         views.PlaceInstanceView.as_view(),
         name='place-detail'),
@@ -43,6 +49,10 @@ urlpatterns = patterns('sa_api_v2',
         views.AdminDataSetListView.as_view(),
         name='admin-dataset-list'),
 
+    url(r'^(?P<owner_username>[^/]+)/datasets/(?P<dataset_slug>[^/]+)/schema$',
+        views.DataSetSchemaView.as_view(),
+        name='dataset-schema'),
+
     url(r'^(?P<owner_username>[^/]+)/datasets/(?P<dataset_slug>[^/]+)/keys$',
         views.ApiKeyListView.as_view(),
         name='apikey-list'),
@@ -1,10 +1,145 @@
 import re
 import time
-from django.contrib.gis.geos import GEOSGeometry, Point
+import ujson as json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.contrib.gis.geos import GEOSGeometry, Point, Polygon
 from django.contrib.gis.measure import D
 from functools import wraps
+from math import asin, atan, ceil, cos, degrees, log, pi, radians, sin, sinh, tan
 from urlparse import urlparse, urljoin
 
+class GeoJSONGeometry (unicode):
+    """
+    A geometry that has already been serialized as a GeoJSON string, e.g. by
+    PostGIS's ST_AsGeoJSON. Renderers embed it in their output as-is.
+    """
+    pass
+
+class CursorPage (object):
+    """
+    A page of cursor-paginated results. Like a Django Page, it has an
+    object_list, but instead of a page number and a paginator it only knows
+    the cursor for the next page, if there is one.
+    """
+    def __init__(self, object_list, next_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(values):
+    """
+    Encode a list of values as an opaque, URL-safe cursor string.
+    """
+    data = json.dumps([unicode(value) for value in values])
+    return urlsafe_b64encode(data).rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode the list of values (as strings) from a cursor string. Raises
+    ValueError if the cursor is not valid.
+    """
+    try:
+        data = urlsafe_b64decode(str(cursor) + '=' * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (TypeError, ValueError, UnicodeEncodeError):
+        raise ValueError('Invalid cursor: %r' % (cursor,))
+
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor: %r' % (cursor,))
+    return values
+
+
+class CountingPaginator (Paginator):
+    """
+    A paginator that gets its count by calling get_count with the object
+    list (e.g., to look the count up in a cache) instead of by counting the
+    objects itself.
+    """
+    def __init__(self, object_list, per_page, get_count, **kwargs):
+        super(CountingPaginator, self).__init__(object_list, per_page, **kwargs)
+        self.get_count = get_count
+
+    @property
+    def count(self):
+        if self._count is None:
+            self._count = self.get_count(self.object_list)
+        return self._count
+
+
+class UncountedPaginator (CountingPaginator):
+    """
+    A paginator that does not need a count to validate page numbers or to
+    tell whether there is a next page; it looks for an object past the end of
+    the page instead. Its count, from get_count, may be approximate, and is
+    None if there is no get_count.
+    """
+    def __init__(self, object_list, per_page, get_count=None, **kwargs):
+        super(UncountedPaginator, self).__init__(object_list, per_page, get_count, **kwargs)
+
+    @property
+    def count(self):
+        if self._count is None and self.get_count is not None:
+            self._count = self.get_count(self.object_list)
+        return self._count
+
+    @property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return max(1, int(ceil(float(self.count) / self.per_page)))
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        has_next = len(self.object_list[top:top + 1]) > 0
+        return UncountedPage(self.object_list[bottom:top], number, self, has_next)
+
+
+class UncountedPage (Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super(UncountedPage, self).__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+def estimate_count(queryset):
+    """
+    Get the query planner's estimate of the number of rows that a queryset
+    would return, without running the query. Only PostgreSQL gives
+    estimates; on other databases the queryset is counted.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    try:
+        sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    except EmptyResultSet:
+        return 0
+    cursor = connection.cursor()
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, basestring):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
 def isiterable(obj):
     try:
         iter(obj)
@@ -26,6 +161,96 @@ def to_distance(string):
 
     return D(**{units: number})
 
+# The radius of the sphere that PostGIS measures geodetic distances on (see
+# ST_Distance_Sphere), in meters.
+EARTH_RADIUS = 6370986.0
+
+def get_distance_envelope(geom, distance):
+    """
+    Get a longitude/latitude box that contains everything within the given
+    distance (a Distance) of a geometry in geographic coordinates. Comparing
+    bounding boxes can use a spatial index, where measuring distances in
+    meters cannot.
+    """
+    # Leave a little slack for rounding, and for the difference between the
+    # sphere and the spheroid.
+    angle = 1.01 * distance.m / EARTH_RADIUS
+    xmin, ymin, xmax, ymax = geom.extent
+
+    dlat = degrees(angle)
+    ymin, ymax = max(ymin - dlat, -90.0), min(ymax + dlat, 90.0)
+
+    # Degrees of longitude get shorter away from the equator. Near the poles,
+    # or across the antimeridian, the box covers every longitude.
+    max_lat = radians(max(abs(ymin), abs(ymax)))
+    if angle < pi / 2 and sin(angle) < cos(max_lat):
+        dlng = degrees(asin(sin(angle) / cos(max_lat)))
+        xmin, xmax = xmin - dlng, xmax + dlng
+    else:
+        xmin, xmax = -180.0, 180.0
+    if xmin < -180.0 or xmax > 180.0:
+        xmin, xmax = -180.0, 180.0
+
+    envelope = Polygon.from_bbox((xmin, ymin, xmax, ymax))
+    envelope.srid = geom.srid
+    return envelope
+
+# The latitude at which square web map tiles are cut off at the poles.
+MAX_TILE_LAT = 85.0511287798
+MAX_TILE_ZOOM = 22
+
+def get_tile(lng, lat, zoom):
+    """
+    Get the x and y of the web map (XYZ) tile at the given zoom level that
+    contains a longitude and latitude.
+    """
+    n = 2 ** zoom
+    lat = radians(max(min(lat, MAX_TILE_LAT), -MAX_TILE_LAT))
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - log(tan(lat) + 1.0 / cos(lat)) / pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def get_tile_bounds(x, y, zoom, cover_poles=False):
+    """
+    Get the (west, south, east, north) bounds of a web map tile. With
+    cover_poles, the tiles at the top and bottom of the grid are extended
+    to the poles.
+    """
+    n = 2.0 ** zoom
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = degrees(atan(sinh(pi * (1 - 2 * y / n))))
+    south = degrees(atan(sinh(pi * (1 - 2 * (y + 1) / n))))
+
+    if cover_poles:
+        if y == 0:
+            north = 90.0
+        if y == n - 1:
+            south = -90.0
+    return (west, south, east, north)
+
+def snap_bounds_to_tiles(bounds):
+    """
+    Round the (west, south, east, north) bounds out to the edges of the web
+    map tiles that they overlap, at the zoom level where tiles are about as
+    wide as the bounds. Bounds that differ only a little usually snap to the
+    same tiles.
+    """
+    west, south, east, north = bounds
+    south, north = min(south, north), max(south, north)
+    width = east - west
+    if width > 0:
+        zoom = int(ceil(log(360.0 / width, 2)))
+        zoom = min(max(zoom, 0), MAX_TILE_ZOOM)
+    else:
+        zoom = MAX_TILE_ZOOM
+
+    min_x, min_y = get_tile(west, north, zoom)
+    max_x, max_y = get_tile(east, south, zoom)
+    snapped_west, _, _, snapped_north = get_tile_bounds(min_x, min_y, zoom, cover_poles=True)
+    _, snapped_south, snapped_east, _ = get_tile_bounds(max_x, max_y, zoom, cover_poles=True)
+    return (snapped_west, snapped_south, snapped_east, snapped_north)
+
 def to_geom(string):
     """
     Given a string, convert it to a geometry.
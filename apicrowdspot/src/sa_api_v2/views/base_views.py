@@ -2,9 +2,11 @@ from django.conf import settings
 from django.contrib.auth import views as auth_views
 from django.contrib.gis.geos import GEOSGeometry, Point, Polygon
 from django.core import cache as django_cache
+from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
-from django.db.models import Count, Q
-from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
+from django.db.models import CharField, Q, TextField
+from django.http import (Http404, HttpResponse, HttpResponseBadRequest,
+    HttpResponseRedirect, QueryDict, StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
 from django.test.utils import override_settings
 from django.utils.decorators import method_decorator
@@ -30,16 +32,22 @@ from .. import parsers
 from .. import apikey
 from .. import cors
 from .. import utils
-from ..cache import cache_buffer
+from ..cache import (cache_buffer, get_generations, get_owner_namespace,
+    get_dataset_namespace, get_place_namespace, get_submission_set_namespace)
 from ..params import (INCLUDE_INVISIBLE_PARAM, INCLUDE_PRIVATE_PARAM,
     INCLUDE_SUBMISSIONS_PARAM, NEAR_PARAM, DISTANCE_PARAM, BBOX_PARAM,
-    FORMAT_PARAM, PAGE_PARAM, PAGE_SIZE_PARAM, CALLBACK_PARAM)
-from functools import wraps
-from itertools import groupby
-from collections import defaultdict
+    SNAP_PARAM, ZOOM_PARAM, BREAKDOWN_PARAM, PRECISION_PARAM, SIMPLIFY_PARAM,
+    FORMAT_PARAM, PAGE_PARAM, PAGE_SIZE_PARAM, CURSOR_PARAM, AFTER_PARAM,
+    BEFORE_PARAM, LIMIT_PARAM, COUNT_PARAM, CALLBACK_PARAM)
+from functools import partial, wraps
+from itertools import chain, groupby
 from urllib import urlencode
+import copy
+import hashlib
 import re
 import requests
+import time
+import uuid
 import ujson as json
 import logging
 
@@ -269,11 +277,10 @@ class IsAllowedByDataPermissions(permissions.BasePermission):
         else:
             data_type = 'places'
 
-        user = getattr(request, 'user', None)
-        client = getattr(request, 'client', None)
         dataset = getattr(request, 'get_dataset', lambda: None)()
+        permissions = models.get_data_permission_matrix(request, dataset)
 
-        return models.check_data_permission(user, client, do_action, dataset, data_type)
+        return permissions.allows(do_action, data_type)
 
 
 ###############################################################################
@@ -446,6 +453,9 @@ class FilteredResourceMixin (object):
     A view mixin that filters queryset of ModelWithDataBlob results based on
     the URL query parameters.
     """
+    # Comparisons that can be made against indexed values
+    index_lookups = ('gt', 'gte', 'lt', 'lte')
+
     def get_queryset(self):
         queryset = super(FilteredResourceMixin, self).get_queryset()
 
@@ -455,50 +465,70 @@ class FilteredResourceMixin (object):
             pk_list = pk_list.split(',')
             queryset = queryset.filter(pk__in=pk_list)
 
-        # These filters will have been applied when constructing the queryset
-        special_filters = set([FORMAT_PARAM, PAGE_PARAM, PAGE_SIZE_PARAM(),
-            INCLUDE_SUBMISSIONS_PARAM, INCLUDE_PRIVATE_PARAM,
-            INCLUDE_INVISIBLE_PARAM, NEAR_PARAM, DISTANCE_PARAM,
-            BBOX_PARAM, CALLBACK_PARAM(self)])
-
-        for key, values in self.request.GET.iterlists():
-            if key not in special_filters:
-                # Filter quickly for indexed values
-                if self.get_dataset().indexes.filter(attr_name=key).exists():
-                    queryset = queryset.filter_by_index(key, *values)
-
-                # Filter slowly for other values
-                else:
-                    excluded = []
-                    for obj in queryset:
-                        if hasattr(obj, key):
-                            if getattr(obj, key) not in values:
-                                queryset = queryset.exclude(pk=obj.pk)
-                        else:
-                            # Is it in the data blob?
-                            data = json.loads(obj.data)
-                            if key not in data or data[key] not in values:
-                                excluded.append(obj.pk)
-                    queryset = queryset.exclude(pk__in=excluded)
-
+        special_filters = self.get_special_filters()
+        filters = [(key, values) for key, values in self.request.GET.iterlists()
+                   if key not in special_filters]
+        if not filters:
+            return queryset
+
+        indexes = dict((index.attr_name, index) for index in self.get_dataset().indexes.all())
+        text_field_names = set(field.name for field in queryset.model._meta.fields
+                               if isinstance(field, (CharField, TextField)))
+        model_field_names = set(field.name for field in queryset.model._meta.fields)
+
+        for key, values in filters:
+            # Indexed values may be compared, as in "votes__gte=10".
+            attr_name, _, lookup = key.rpartition('__')
+            if lookup not in self.index_lookups or attr_name not in indexes:
+                attr_name, lookup = key, 'exact'
+
+            # Filter quickly for indexed values
+            if attr_name in indexes:
+                index = indexes[attr_name]
+                try:
+                    queryset = queryset.filter_by_index(attr_name, *values,
+                        lookup=lookup, attr_type=index.attr_type)
+                except ValueError as e:
+                    raise QueryError(detail='Invalid value for %s: %s' % (key, e))
+
+            # Filter on the model's own text fields directly. The query
+            # parameters are strings, so they never match any other fields.
+            elif key in text_field_names:
+                queryset = queryset.filter(**{key + '__in': values})
+            elif key in model_field_names:
+                queryset = queryset.none()
+
+            # Filter on other values in the data blob
+            else:
+                queryset = queryset.filter_by_data(key, *values)
 
         return queryset
 
+    def get_special_filters(self):
+        # These filters will have been applied when constructing the queryset
+        return set([FORMAT_PARAM, PAGE_PARAM, PAGE_SIZE_PARAM(),
+            CURSOR_PARAM, COUNT_PARAM, INCLUDE_SUBMISSIONS_PARAM, INCLUDE_PRIVATE_PARAM,
+            INCLUDE_INVISIBLE_PARAM, NEAR_PARAM, DISTANCE_PARAM,
+            BBOX_PARAM, SNAP_PARAM, PRECISION_PARAM, SIMPLIFY_PARAM, CALLBACK_PARAM(self)])
+
 
 class LocatedResourceMixin (object):
     """
     A view mixin that orders queryset results by distance from a geometry, if
-    requested.
+    requested. Both the ordering and any distance filter use the spatial
+    index, so they don't need the distance to every place in the dataset.
     """
     def get_queryset(self):
         queryset = super(LocatedResourceMixin, self).get_queryset()
 
         if NEAR_PARAM in self.request.GET:
+            if CURSOR_PARAM in self.request.GET:
+                raise QueryError(detail='You cannot use a "%s" parameter with "%s", since cursor pages are ordered by time' % (CURSOR_PARAM, NEAR_PARAM))
+
             try:
                 reference = utils.to_geom(self.request.GET[NEAR_PARAM])
             except ValueError:
                 raise QueryError(detail='Invalid parameter for "%s": %r' % (NEAR_PARAM, self.request.GET[NEAR_PARAM]))
-            queryset = queryset.distance(reference).order_by('distance')
 
         if DISTANCE_PARAM in self.request.GET:
             if NEAR_PARAM not in self.request.GET:
@@ -508,9 +538,17 @@ class LocatedResourceMixin (object):
                 max_dist = utils.to_distance(self.request.GET[DISTANCE_PARAM])
             except ValueError:
                 raise QueryError(detail='Invalid parameter for "%s": %r' % (DISTANCE_PARAM, self.request.GET[DISTANCE_PARAM]))
-            # Since the NEAR_PARAM is already in the query parameters, we can
-            # use the `reference` geometry here.
-            queryset = queryset.filter(geometry__distance_lt=(reference, max_dist))
+
+            # Within a distance, the spatial index narrows the places down,
+            # and the few that are left can be sorted by their exact
+            # distances.
+            queryset = queryset\
+                .filter_by_distance(reference, max_dist)\
+                .distance(reference).order_by('distance')
+
+        elif NEAR_PARAM in self.request.GET:
+            # Otherwise, let the spatial index find the nearest places first.
+            queryset = queryset.order_by_distance(reference)
 
         if BBOX_PARAM in self.request.GET:
             bounds = self.request.GET[BBOX_PARAM].split(',')
@@ -523,6 +561,447 @@ class LocatedResourceMixin (object):
         return queryset
 
 
+class SnappedLocationMixin (object):
+    """
+    A view mixin that, when the snap parameter is given, rounds the bounds
+    parameter out to the edges of the map tiles that it overlaps, and rounds
+    the near parameter's latitude and longitude to API_SNAP_NEAR_PRECISION
+    decimal places. Map clients send slightly different bounds on every pan;
+    snapped, they usually make the same request, and share cached responses,
+    at the cost of getting the places in a somewhat larger area.
+
+    The request is rewritten before anything else sees it, so this mixin
+    must come before the CachedResourceMixin.
+    """
+    near_precision = settings.API_SNAP_NEAR_PRECISION
+
+    @csrf_exempt
+    def dispatch(self, request, *args, **kwargs):
+        # Background refreshes replay a query that has already been snapped;
+        # snapping it again could change it.
+        if SNAP_PARAM in request.GET and not getattr(request, 'refresh_cache', False):
+            self.snap_request(request)
+        return super(SnappedLocationMixin, self).dispatch(request, *args, **kwargs)
+
+    def snap_request(self, request):
+        params = request.GET.copy()
+
+        if BBOX_PARAM in params:
+            try:
+                bounds = [float(value) for value in params[BBOX_PARAM].split(',')]
+            except ValueError:
+                bounds = None
+            # Leave invalid bounds for LocatedResourceMixin to reject.
+            if bounds is not None and len(bounds) == 4:
+                params[BBOX_PARAM] = ','.join('%.7f' % value for value in utils.snap_bounds_to_tiles(bounds))
+
+        if NEAR_PARAM in params:
+            try:
+                lat, lng = [float(coord) for coord in params[NEAR_PARAM].split(',')]
+            except ValueError:
+                # Only latitude/longitude pairs are rounded, not geometries.
+                pass
+            else:
+                params[NEAR_PARAM] = '%.*f,%.*f' % (self.near_precision, lat, self.near_precision, lng)
+
+        # Put the parameters in a consistent order too, so that they make a
+        # consistent cache key.
+        querystring = urlencode(sorted(params.lists()), doseq=True)
+        request.GET = QueryDict(querystring)
+        request.META['QUERY_STRING'] = querystring
+
+
+class InstanceParamsMapMixin (object):
+    """
+    A view mixin that resolves the instance parameters, which the serializers
+    use to build URLs, for a whole page of results at once instead of for one
+    object at a time.
+    """
+    def paginate_queryset(self, queryset, page_size=None):
+        page = super(InstanceParamsMapMixin, self).paginate_queryset(queryset, page_size)
+        objs = page.object_list if page is not None else queryset
+        self.instance_params_map = self.get_instance_params_map(objs)
+        return page
+
+    def get_serializer_context(self):
+        context = super(InstanceParamsMapMixin, self).get_serializer_context()
+        context['instance_params_map'] = getattr(self, 'instance_params_map', {})
+        return context
+
+    def get_instance_params_map(self, objs):
+        """
+        Return a dictionary mapping instance parameter keys to parameters for
+        the given objects and the related objects serialized along with them.
+        """
+        if self.model is models.Place:
+            return self.get_place_instance_params_map(objs)
+        elif self.model is models.Submission:
+            return self.get_submission_instance_params_map(objs)
+        else:
+            return {}
+
+    def get_place_instance_params_map(self, places):
+        params_map = {}
+        self.add_instance_params(params_map, models.DataSet.cache, [self.get_dataset().pk])
+        self.add_instance_params(params_map, models.Place.cache, [place.pk for place in places])
+
+        # Submission sets (and their submissions) are prefetched along with
+        # the places.
+        submission_sets = list(chain.from_iterable(place.submission_sets.all() for place in places))
+        self.add_instance_params(params_map, models.SubmissionSet.cache, [s.pk for s in submission_sets])
+
+        if INCLUDE_SUBMISSIONS_PARAM in self.request.GET:
+            submissions = chain.from_iterable(s.children.all() for s in submission_sets)
+            self.add_instance_params(params_map, models.Submission.cache, [s.pk for s in submissions])
+
+        return params_map
+
+    def get_submission_instance_params_map(self, submissions):
+        params_map = {}
+        submission_params = self.add_instance_params(params_map, models.Submission.cache, [s.pk for s in submissions])
+        self.add_instance_params(params_map, models.SubmissionSet.cache, [s.parent_id for s in submissions])
+        self.add_instance_params(params_map, models.DataSet.cache, [s.dataset_id for s in submissions])
+        self.add_instance_params(params_map, models.Place.cache, [p['place_id'] for p in submission_params.values()])
+        return params_map
+
+    def add_instance_params(self, params_map, cache, inst_keys):
+        instance_params = cache.get_cached_instance_params_many(inst_keys)
+        for inst_key, params in instance_params.iteritems():
+            params_map[cache.get_instance_params_key(inst_key)] = params
+        return instance_params
+
+
+# The CSV columns for a serialized submitter (see UserSerializer)
+SUBMITTER_CSV_COLUMNS = ('submitter.id', 'submitter.username', 'submitter.name',
+                         'submitter.avatar_url', 'submitter.groups')
+
+
+class StreamingListMixin (InstanceParamsMapMixin):
+    """
+    A list view mixin that streams large pages of JSON or CSV results, so
+    that a response's memory use doesn't grow with its page size. For JSON,
+    the pagination envelope is rendered as usual, and the results are then
+    fetched, serialized and rendered stream_chunk_size objects at a time.
+    CSV is streamed the same way, under a header built from the dataset's
+    attribute names instead of from the rows. Streamed responses are not
+    cached.
+    """
+    # Pages of at least this many results are streamed. None disables
+    # streaming.
+    stream_min_page_size = settings.API_STREAM_MIN_PAGE_SIZE
+    stream_chunk_size = 500
+
+    # The CSV columns for everything but the data attributes. Views that set
+    # this stream CSV, and must implement get_attribute_names.
+    csv_columns = None
+
+    def list(self, request, *args, **kwargs):
+        self.streaming = self.should_stream(request)
+        if not self.streaming:
+            return super(StreamingListMixin, self).list(request, *args, **kwargs)
+
+        # Streamed lists are always paginated (see should_stream).
+        self.object_list = self.get_stable_queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(self.object_list)
+        result_chunks = self.iter_serialized_chunks(page.object_list)
+
+        renderer = request.accepted_renderer
+        if isinstance(renderer, renderers.PaginatedCSVRenderer):
+            content = renderer.render_stream(self.get_csv_header(), result_chunks)
+        else:
+            # Render the pagination metadata for the page, with no results in
+            # it, and let the renderer stream the results into it.
+            empty_page = copy.copy(page)
+            empty_page.object_list = []
+            serializer = self.get_pagination_serializer(empty_page)
+            content = renderers.render_json_stream(
+                renderer, serializer.data, serializer.results_field, result_chunks,
+                self.get_renderer_context())
+
+        content_type = request.accepted_media_type
+        if renderer.charset:
+            content_type = '%s; charset=%s' % (content_type, renderer.charset)
+        return StreamingHttpResponse(content, content_type=content_type)
+
+    def should_stream(self, request):
+        """
+        Check whether the response to the request should be streamed. The
+        request may be either a Django request or a DRF request.
+        """
+        if self.stream_min_page_size is None or request.method.upper() != 'GET':
+            return False
+
+        try:
+            page_size = int(request.GET[self.paginate_by_param])
+        except (KeyError, TypeError, ValueError):
+            page_size = self.paginate_by
+        if page_size is None or page_size < self.stream_min_page_size:
+            return False
+
+        # Only JSON renderers (including GeoJSON and JSONP) and, if the view
+        # knows its CSV columns, the CSV renderer can stream.
+        renderer = getattr(request, 'accepted_renderer', None)
+        if renderer is None:
+            try:
+                renderer, media_type = self.get_content_negotiator().select_renderer(
+                    Request(request), self.get_renderers(),
+                    self.get_format_suffix(**self.kwargs))
+            except exceptions.NotAcceptable:
+                return False
+        if isinstance(renderer, renderers.PaginatedCSVRenderer):
+            return self.csv_columns is not None
+        return isinstance(renderer, JSONRenderer)
+
+    def get_csv_header(self):
+        columns = set(self.csv_columns)
+        include_private = INCLUDE_PRIVATE_PARAM in self.request.GET
+        for name in self.get_attribute_names():
+            if include_private or not name.startswith('private'):
+                columns.add(name)
+        return sorted(columns)
+
+    def get_stable_queryset(self, queryset):
+        """
+        Add the primary key to the ordering of the queryset, so that slices
+        of it neither overlap nor skip objects with equal sort values.
+        """
+        query = queryset.query
+        ordering = list(query.order_by or
+                        (query.default_ordering and queryset.model._meta.ordering) or [])
+        pk_names = ('pk', queryset.model._meta.pk.name)
+        if not any(field.lstrip('-') in pk_names for field in ordering):
+            queryset = queryset.order_by(*(ordering + ['pk']))
+        return queryset
+
+    def paginate_queryset(self, queryset, page_size=None):
+        if not getattr(self, 'streaming', False):
+            return super(StreamingListMixin, self).paginate_queryset(queryset, page_size)
+
+        # Streamed pages resolve their instance parameters a chunk at a time
+        # (see iter_serialized_chunks), not for the whole page at once.
+        return super(InstanceParamsMapMixin, self).paginate_queryset(queryset, page_size)
+
+    def iter_serialized_chunks(self, object_list):
+        start = 0
+        while True:
+            # The response is streamed after the middleware has flushed and
+            # unbound the request's cache buffer, so each chunk is serialized
+            # with a buffer of its own, which isn't left bound in between.
+            with cache_buffer.bound():
+                chunk = list(object_list[start:start + self.stream_chunk_size])
+                if not chunk:
+                    break
+
+                self.instance_params_map = self.get_instance_params_map(chunk)
+                data = self.get_serializer(chunk, many=True).data
+
+            yield data
+
+            if len(chunk) < self.stream_chunk_size:
+                break
+            start += len(chunk)
+
+
+class CursorPaginationMixin (object):
+    """
+    A list view mixin that pages through results by cursor instead of by page
+    number when the cursor parameter is given (empty for the first page).
+    Results are then ordered by cursor_field and id, most recent first, and
+    each page picks up after the last result of the one before it, so deep
+    pages cost no more than the first. Cursor pages are not counted; their
+    metadata only links to the next page.
+    """
+    cursor_field = 'updated_datetime'
+    cursor_pagination_serializer_class = serializers.CursorPaginatedResultsSerializer
+
+    def uses_cursor(self):
+        return CURSOR_PARAM in self.request.GET
+
+    def paginate_queryset(self, queryset, page_size=None):
+        if not self.uses_cursor():
+            return super(CursorPaginationMixin, self).paginate_queryset(queryset, page_size)
+
+        page_size = page_size or self.get_paginate_by()
+        if not page_size:
+            return None
+
+        queryset = queryset.order_by('-' + self.cursor_field, '-pk')
+
+        cursor = self.request.GET[CURSOR_PARAM]
+        if cursor:
+            try:
+                position, pk = utils.decode_cursor(cursor)
+                position = queryset.model._meta.get_field(self.cursor_field).to_python(position)
+                pk = int(pk)
+            except (ValueError, ValidationError):
+                raise QueryError(detail='Invalid cursor: %s' % (cursor,))
+
+            queryset = queryset\
+                .filter(**{self.cursor_field + '__lte': position})\
+                .exclude(**{self.cursor_field: position, 'pk__gte': pk})
+
+        # There is a next page if there is a result after this page's last
+        # one.
+        boundary = list(queryset.values_list(self.cursor_field, 'pk')[page_size - 1:page_size + 1])
+        next_cursor = utils.encode_cursor(boundary[0]) if len(boundary) > 1 else None
+
+        return utils.CursorPage(queryset[:page_size], next_cursor)
+
+    def get_pagination_serializer(self, page):
+        if not isinstance(page, utils.CursorPage):
+            return super(CursorPaginationMixin, self).get_pagination_serializer(page)
+
+        class SerializerClass (self.cursor_pagination_serializer_class):
+            class Meta:
+                object_serializer_class = self.get_serializer_class()
+
+        return SerializerClass(instance=page, context=self.get_serializer_context())
+
+
+class ResultCountMixin (object):
+    """
+    A list view mixin that avoids counting all of the results for every page
+    request. The count parameter chooses how the length in the pagination
+    metadata is found:
+
+    * exact (the default) -- read from counters maintained on the models when
+      the results are only filtered by dataset and visibility, and otherwise
+      counted once per set of filters and cached until the data changes.
+    * estimate -- read from the counters or the cache where possible, and
+      otherwise estimated by the database's query planner.
+    * none -- not counted at all.
+
+    Pages with estimated or no lengths find whether there is a next page by
+    looking for a result past the end of the page.
+    """
+    count_modes = ('exact', 'estimate', 'none')
+
+    # Query parameters that don't change which results are listed, only how
+    # they are ordered, paged, or rendered.
+    uncounted_params = set([FORMAT_PARAM, PAGE_PARAM, CURSOR_PARAM,
+        COUNT_PARAM, INCLUDE_SUBMISSIONS_PARAM, INCLUDE_PRIVATE_PARAM, NEAR_PARAM,
+        SNAP_PARAM, PRECISION_PARAM, SIMPLIFY_PARAM])
+
+    def get_count_mode(self):
+        mode = self.request.GET.get(COUNT_PARAM) or 'exact'
+        if mode not in self.count_modes:
+            raise QueryError(detail='Invalid parameter for "%s": %r. Use one of: %s' % (COUNT_PARAM, mode, ', '.join(self.count_modes)))
+        return mode
+
+    @property
+    def paginator_class(self):
+        mode = self.get_count_mode()
+        if mode == 'exact':
+            return partial(utils.CountingPaginator, get_count=self.get_exact_count)
+        elif mode == 'estimate':
+            return partial(utils.UncountedPaginator, get_count=self.get_estimated_count)
+        else:
+            return utils.UncountedPaginator
+
+    def get_counted_params(self):
+        ignored = self.uncounted_params | set([PAGE_SIZE_PARAM(), CALLBACK_PARAM(self), '_'])
+        return sorted((key, sorted(values)) for key, values in self.request.GET.iterlists()
+                      if key not in ignored)
+
+    def is_unfiltered(self):
+        """
+        Check whether the results are only filtered by dataset (and the
+        rest of the URL) and visibility.
+        """
+        return (self.kwargs.get('pk_list') is None and
+                all(key == INCLUDE_INVISIBLE_PARAM for key, _ in self.get_counted_params()))
+
+    def get_counter_value(self):
+        """
+        Return the number of results, as maintained on the models, if there
+        is a counter for them. Only called when the results are unfiltered.
+        """
+        return None
+
+    def get_count_cache_key(self):
+        generations = ','.join(map(str, get_generations(*self.get_cache_namespaces())))
+        signature = hashlib.md5(urlencode(self.get_counted_params(), doseq=True)).hexdigest()
+        return ':'.join([self.request.path, 'count', generations, signature])
+
+    def get_exact_count(self, queryset):
+        if self.is_unfiltered():
+            count = self.get_counter_value()
+            if count is not None:
+                return count
+
+        key = self.get_count_cache_key()
+        count = django_cache.cache.get(key)
+        if count is None:
+            count = queryset.count()
+            django_cache.cache.set(key, count, settings.API_CACHE_TIMEOUT)
+        return count
+
+    def get_estimated_count(self, queryset):
+        count = None
+        if self.is_unfiltered():
+            count = self.get_counter_value()
+        if count is None:
+            count = django_cache.cache.get(self.get_count_cache_key())
+        if count is None:
+            count = utils.estimate_count(queryset)
+        return count
+
+
+class GeoJSONGeometryMixin (object):
+    """
+    A view mixin that has PostGIS serialize geometries as GeoJSON when a GET
+    response will be rendered as GeoJSON, so that the renderer can embed them
+    directly instead of converting them from WKT. Other formats (e.g., CSV)
+    still get WKT.
+
+    The precision and simplify parameters have PostGIS write fewer decimal
+    places, and simplify the geometries before writing them, respectively.
+    """
+    # The number of decimal places that PostGIS writes coordinates with, by
+    # default and at most.
+    geojson_precision = 15
+
+    def get_geojson_precision(self):
+        if PRECISION_PARAM not in self.request.GET:
+            return self.geojson_precision
+
+        try:
+            precision = int(self.request.GET[PRECISION_PARAM])
+        except ValueError:
+            precision = None
+
+        if precision is None or not 0 <= precision <= self.geojson_precision:
+            raise QueryError(detail='Invalid parameter for "%s": %r' % (PRECISION_PARAM, self.request.GET[PRECISION_PARAM]))
+        return precision
+
+    def get_simplify_tolerance(self):
+        if not self.request.GET.get(SIMPLIFY_PARAM):
+            return None
+
+        try:
+            tolerance = float(self.request.GET[SIMPLIFY_PARAM])
+        except ValueError:
+            tolerance = None
+
+        if tolerance is None or not tolerance >= 0:
+            raise QueryError(detail='Invalid parameter for "%s": %r' % (SIMPLIFY_PARAM, self.request.GET[SIMPLIFY_PARAM]))
+        return tolerance
+
+    def renders_geojson(self):
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        return (self.request.method.upper() in ('GET', 'HEAD') and
+                isinstance(renderer, renderers.GeoJSONRenderer))
+
+    def select_geojson(self, queryset):
+        if self.renders_geojson():
+            tolerance = self.get_simplify_tolerance()
+            if tolerance:
+                queryset = queryset.simplified_geojson(tolerance, precision=self.get_geojson_precision())
+            else:
+                queryset = queryset.geojson(precision=self.get_geojson_precision())
+        return queryset
+
+
 class OwnedResourceMixin (ClientAuthenticationMixin, CorsEnabledMixin):
     """
     A view mixin that retrieves the username of the resource owner, as provided
@@ -614,6 +1093,27 @@ class OwnedResourceMixin (ClientAuthenticationMixin, CorsEnabledMixin):
 
 
 class CachedResourceMixin (object):
+    # When set, successful GET responses in one of the cache_rendered_formats
+    # are cached as their final rendered body instead of as response data,
+    # and cache hits are returned without going back through the renderers.
+    cache_rendered_content = False
+    cache_rendered_formats = ('json', 'jsonp', 'csv')
+
+    # On a cache miss, only one request at a time rebuilds a given entry. The
+    # lock is a lease that expires after cache_lock_lease seconds, in case the
+    # request holding it dies. Other requests serve the previous version of
+    # the entry if there is one, or poll for the new version for up to
+    # cache_lock_wait seconds before giving up and building it themselves.
+    cache_lock_lease = 30
+    cache_lock_wait = 5
+    cache_lock_poll_interval = 0.05
+
+    # When set, anonymous requests are served cached responses that are past
+    # this many seconds old, or that belong to an earlier generation, while
+    # the entry is rebuilt by a background task. Entries still hard-expire
+    # after API_CACHE_TIMEOUT.
+    cache_soft_timeout = None
+
     @property
     def cache_prefix(self):
         return self.request.path
@@ -621,31 +1121,65 @@ class CachedResourceMixin (object):
     def get_cache_prefix(self):
         return self.cache_prefix
 
-    def get_cache_metakey(self):
-        prefix = self.cache_prefix
-        return prefix + '_keys'
+    def get_cache_namespaces(self):
+        """
+        Return the generation namespaces that the response depends on. The
+        current generation of each is part of the cache key, so bumping any
+        of them invalidates the cached response.
+        """
+        owner, dataset, place, submission_set_name = map(self.kwargs.get,
+            ['owner_username', 'dataset_slug', 'place_id', 'submission_set_name'])
+
+        if place and submission_set_name:
+            return [get_submission_set_namespace(place, submission_set_name)]
+        elif place:
+            return [get_place_namespace(place)]
+        elif owner and dataset:
+            return [get_dataset_namespace(owner, dataset)]
+        elif owner:
+            return [get_owner_namespace(owner)]
+        else:
+            return []
 
     @csrf_exempt
     def dispatch(self, request, *args, **kwargs):
-        # Only do the cache for GET, OPTIONS, or HEAD method.
-        if request.method.upper() not in permissions.SAFE_METHODS:
+        if not self.is_cacheable_request(request):
             return super(CachedResourceMixin, self).dispatch(request, *args, **kwargs)
 
         self.request = request
 
         # Check whether the response data is in the cache.
         key = self.get_cache_key(request, *args, **kwargs)
-        response_data = django_cache.cache.get(key) or None
+        lock = None
 
-        # Also check whether the request cache key is managed in the cache.
-        # This is important, because if it's not managed, then we'll never
-        # know when to invalidate it. If it's not managed we should just
-        # assume that it's invalid.
-        metakey = self.get_cache_metakey()
-        keyset = django_cache.cache.get(metakey) or set()
-
-        if (response_data is not None) and (key in keyset):
-            cached_response = self.respond_from_cache(response_data)
+        # Background refreshes always rebuild the entry.
+        if getattr(request, 'refresh_cache', False):
+            response_data = None
+        else:
+            response_data = django_cache.cache.get(key) or None
+
+            if response_data is not None:
+                if self.is_stale_cached_data(response_data):
+                    if self.allows_stale_response(request):
+                        self.schedule_cache_refresh(request, key)
+                    else:
+                        # Only anonymous entries are refreshed in the
+                        # background, so rebuild any other stale entry now.
+                        response_data = None
+
+            elif self.allows_stale_response(request):
+                response_data = self.get_previous_cached_data(request, key)
+                if response_data is not None:
+                    self.schedule_cache_refresh(request, key)
+
+            if response_data is None:
+                response_data, lock = self.wait_for_cache_fill(request, key)
+
+        if response_data is not None:
+            if self.get_rendered_cache_renderer(request) is not None:
+                cached_response = self.respond_from_rendered_cache(request, response_data)
+            else:
+                cached_response = self.respond_from_cache(response_data)
             handler_name = request.method.lower()
 
             def cached_handler(*args, **kwargs):
@@ -655,11 +1189,19 @@ class CachedResourceMixin (object):
             with patch.object(self, handler_name, new=cached_handler):
                 response = super(CachedResourceMixin, self).dispatch(request, *args, **kwargs)
         else:
-            response = super(CachedResourceMixin, self).dispatch(request, *args, **kwargs)
+            try:
+                response = super(CachedResourceMixin, self).dispatch(request, *args, **kwargs)
 
-            # Only cache on OK resposne
-            if response.status_code == 200:
-                self.cache_response(key, response)
+                # Only cache on OK resposne
+                if response.status_code == 200:
+                    if self.get_rendered_cache_renderer(request) is not None:
+                        self.cache_rendered_response(key, response)
+                    else:
+                        self.cache_response(key, response)
+                    django_cache.cache.set(self.get_latest_cache_key(request), key, settings.API_CACHE_TIMEOUT)
+            finally:
+                if lock is not None:
+                    self.release_cache_lock(*lock)
 
         # Save all the buffered data to the cache
         cache_buffer.flush()
@@ -669,7 +1211,116 @@ class CachedResourceMixin (object):
         response['Cache-Control'] = 'no-cache'
         return response
 
+    def is_cacheable_request(self, request):
+        # Only do the cache for GET, OPTIONS, or HEAD method.
+        if request.method.upper() not in permissions.SAFE_METHODS:
+            return False
+
+        # Streamed responses can't be cached without holding on to their
+        # whole content.
+        if isinstance(self, StreamingListMixin) and self.should_stream(request):
+            return False
+
+        return True
+
+    def wait_for_cache_fill(self, request, key):
+        """
+        Called on a cache miss. Returns a pair of (response_data, lock). If
+        response_data is not None it can be served to the client; otherwise
+        the caller should build the response and release the lock (if any)
+        when it is done.
+        """
+        deadline = time.time() + self.cache_lock_wait
+
+        while True:
+            lock = self.acquire_cache_lock(key)
+            if lock is not None:
+                # The entry may have been filled between our miss and getting
+                # the lock.
+                response_data = self.get_fresh_cached_data(key)
+                if response_data is not None:
+                    self.release_cache_lock(*lock)
+                return response_data, lock
+
+            # Another request is rebuilding the entry. Serve the previous
+            # version of the entry if we have it.
+            response_data = self.get_previous_cached_data(request, key)
+            if response_data is not None:
+                return response_data, None
+
+            if time.time() >= deadline:
+                logger.warning('Timed out waiting for cache key "%s" to be filled' % (key,))
+                return None, None
+
+            time.sleep(self.cache_lock_poll_interval)
+            response_data = self.get_fresh_cached_data(key)
+            if response_data is not None:
+                return response_data, None
+
+    def get_fresh_cached_data(self, key):
+        cached_data = django_cache.cache.get(key) or None
+        if cached_data is None or self.is_stale_cached_data(cached_data):
+            return None
+        return cached_data
+
+    def allows_stale_response(self, request):
+        return (self.cache_soft_timeout is not None and
+                (not hasattr(request, 'user') or not request.user.is_authenticated()))
+
+    def is_stale_cached_data(self, cached_data):
+        fresh_until = cached_data[3] if len(cached_data) > 3 else None
+        return fresh_until is not None and time.time() > fresh_until
+
+    def get_fresh_until(self):
+        if self.cache_soft_timeout is None:
+            return None
+        return time.time() + self.cache_soft_timeout
+
+    def schedule_cache_refresh(self, request, key):
+        # Only queue one refresh for an entry at a time.
+        refresh_key = 'refresh:' + key
+        if django_cache.cache.add(refresh_key, True, self.cache_lock_lease):
+            from ..tasks import refresh_cached_response
+            refresh_cached_response.delay(
+                request.path_info,
+                request.META.get('QUERY_STRING', ''),
+                request.META.get('HTTP_ACCEPT', ''),
+                request.META.get('SCRIPT_NAME', ''))
+
+    def get_cache_lock_key(self, key):
+        return 'lock:' + key
+
+    def acquire_cache_lock(self, key):
+        lock_key = self.get_cache_lock_key(key)
+        token = uuid.uuid4().hex
+        if django_cache.cache.add(lock_key, token, self.cache_lock_lease):
+            return lock_key, token
+        return None
+
+    def release_cache_lock(self, lock_key, token):
+        # Only delete the lock if our lease on it has not expired and been
+        # taken over by another request.
+        if django_cache.cache.get(lock_key) == token:
+            django_cache.cache.delete(lock_key)
+
+    def get_previous_cached_data(self, request, key):
+        previous_key = django_cache.cache.get(self.get_latest_cache_key(request))
+        if previous_key is None or previous_key == key:
+            return None
+        return django_cache.cache.get(previous_key) or None
+
     def get_cache_key(self, request, *args, **kwargs):
+        generations = ','.join(map(str, get_generations(*self.get_cache_namespaces())))
+        return ':'.join([self.cache_prefix, generations, self.get_cache_variant(request)])
+
+    def get_latest_cache_key(self, request):
+        """
+        Return the key under which the most recently cached version of the
+        response is referenced, regardless of generation.
+        """
+        return ':'.join([self.cache_prefix, 'latest', self.get_cache_variant(request)])
+
+    def get_cache_variant(self, request):
         querystring = request.META.get('QUERY_STRING', '')
         contenttype = request.META.get('HTTP_ACCEPT', '')
 
@@ -697,27 +1348,97 @@ class CachedResourceMixin (object):
         cache_buster_pattern = re.compile(r'&?_=\d+')
         querystring = re.sub(cache_buster_pattern, '', querystring)
 
-        return ':'.join([self.cache_prefix, contenttype, querystring, groups])
+        # Rendered content is keyed on the negotiated format rather than the
+        # Accept header. JSONP requests share the JSON body, so the callback
+        # name is left out of the key as well.
+        renderer = self.get_rendered_cache_renderer(request)
+        if renderer is not None:
+            if isinstance(renderer, JSONPRenderer):
+                callback_pattern = re.compile(r'&?%s=[^&]*' % re.escape(renderer.callback_parameter))
+                querystring = re.sub(callback_pattern, '', querystring)
+                contenttype = 'rendered:json'
+            else:
+                contenttype = 'rendered:' + renderer.format
+
+        return ':'.join([contenttype, querystring, groups])
+
+    def get_rendered_cache_renderer(self, request):
+        """
+        Return the renderer that will be used for the request if its rendered
+        output can be cached, or None if the response data should be cached
+        instead.
+        """
+        if not self.cache_rendered_content or request.method.upper() != 'GET':
+            return None
+
+        if not hasattr(self, '_rendered_cache_renderer'):
+            try:
+                renderer, media_type = self.get_content_negotiator().select_renderer(
+                    Request(request), self.get_renderers(),
+                    self.get_format_suffix(**self.kwargs))
+            except exceptions.NotAcceptable:
+                renderer = None
+
+            if renderer is not None and renderer.format not in self.cache_rendered_formats:
+                renderer = None
+            self._rendered_cache_renderer = renderer
+
+        return self._rendered_cache_renderer
 
     def respond_from_cache(self, cached_data):
         # Given some cached data, construct a response.
-        content, status, headers = cached_data
+        content, status, headers = cached_data[:3]
         response = Response(content, status=status, headers=dict(headers))
         return response
 
+    def respond_from_rendered_cache(self, request, cached_data):
+        # Given a cached rendered body, construct a plain response that will
+        # not be passed through the renderers again.
+        content, status, content_type = cached_data[:3]
+
+        renderer = self.get_rendered_cache_renderer(request)
+        if isinstance(renderer, JSONPRenderer):
+            content, content_type = self.wrap_jsonp_content(request, renderer, content)
+
+        return HttpResponse(content, status=status, content_type=content_type)
+
+    def wrap_jsonp_content(self, request, renderer, content):
+        # Wrap a rendered JSON body in the callback requested for JSONP.
+        callback = request.GET.get(renderer.callback_parameter, renderer.default_callback)
+        content = callback.encode(renderer.charset) + b'(' + content + b');'
+        content_type = '%s; charset=%s' % (renderer.media_type, renderer.charset)
+        return content, content_type
+
     def cache_response(self, key, response):
         data = response.data
         status = response.status_code
         headers = response.items()
 
         # Cache enough info to recreate the response.
-        django_cache.cache.set(key, (data, status, headers), settings.API_CACHE_TIMEOUT)
+        django_cache.cache.set(key, (data, status, headers, self.get_fresh_until()), settings.API_CACHE_TIMEOUT)
+
+        return response
+
+    def cache_rendered_response(self, key, response):
+        renderer = getattr(response, 'accepted_renderer', None)
+        if renderer is None or renderer.format not in self.cache_rendered_formats:
+            return response
+
+        # For JSONP, cache the plain JSON body so that it can be wrapped in
+        # any callback when it is served from the cache.
+        if isinstance(renderer, JSONPRenderer):
+            content = super(JSONPRenderer, renderer).render(
+                response.data, 'application/json', response.renderer_context)
+            content_type = 'application/json; charset=%s' % (renderer.charset,)
+            response.content, response['Content-Type'] = \
+                self.wrap_jsonp_content(self.request, renderer, content)
+        else:
+            response.render()
+            content = response.content
+            content_type = response['Content-Type']
 
-        # Also, add the key to the set of pages cached from this view.
-        meta_key = self.get_cache_metakey()
-        keys = django_cache.cache.get(meta_key) or set()
-        keys.add(key)
-        django_cache.cache.set(meta_key, keys, settings.API_CACHE_TIMEOUT)
+        # Cache the final body; nothing needs to be rendered on a cache hit.
+        django_cache.cache.set(key, (content, response.status_code, content_type, self.get_fresh_until()), settings.API_CACHE_TIMEOUT)
 
         return response
 
@@ -742,7 +1463,7 @@ class QueryError(exceptions.APIException):
 # --------------
 #
 
-class PlaceInstanceView (CachedResourceMixin, LocatedResourceMixin, OwnedResourceMixin, FilteredResourceMixin, generics.RetrieveUpdateDestroyAPIView):
+class PlaceInstanceView (CachedResourceMixin, LocatedResourceMixin, OwnedResourceMixin, FilteredResourceMixin, GeoJSONGeometryMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     GET
     ---
@@ -770,6 +1491,17 @@ class PlaceInstanceView (CachedResourceMixin, LocatedResourceMixin, OwnedResourc
         `include_submissions` flag is set. Only the dataset owner is allowed to
         request private attributes.
 
+      * `precision=<digits>`
+
+        Write the coordinates of GeoJSON geometries with at most this many
+        decimal places (up to 15, the default). 5 places is about a meter.
+
+      * `simplify=<tolerance>`
+
+        Simplify GeoJSON line and polygon geometries, dropping vertices that
+        are within the tolerance (in degrees) of the simplified shape. Points
+        are not changed.
+
     PUT
     ---
     Update a place
@@ -791,15 +1523,24 @@ class PlaceInstanceView (CachedResourceMixin, LocatedResourceMixin, OwnedResourc
     parser_classes = (parsers.GeoJSONParser,) + OwnedResourceMixin.parser_classes[1:]
 
     def get_object_or_404(self, pk):
+        queryset = self.model.objects\
+            .filter(pk=pk)\
+            .select_related('dataset', 'dataset__owner', 'submitter')\
+            .prefetch_related('submitter__social_auth',
+                              'submission_sets',
+                              'attachments')
+
+        # Submission set summaries use the sets' counts, so only load the
+        # submissions themselves when they're requested.
+        if INCLUDE_SUBMISSIONS_PARAM in self.request.GET:
+            queryset = queryset.prefetch_related(
+                'submission_sets__children',
+                'submission_sets__children__attachments')
+
+        queryset = self.select_geojson(queryset)
+
         try:
-            return self.model.objects\
-                .filter(pk=pk)\
-                .select_related('dataset', 'dataset__owner', 'submitter')\
-                .prefetch_related('submitter__social_auth',
-                                  'submission_sets__children',
-                                  'submission_sets__children__attachments',
-                                  'attachments')\
-                .get()
+            return queryset.get()
         except self.model.DoesNotExist:
             raise Http404
 
@@ -825,7 +1566,7 @@ class PlaceListMixin (object):
     pass
 
 
-class PlaceListView (CachedResourceMixin, LocatedResourceMixin, OwnedResourceMixin, FilteredResourceMixin, bulk_generics.ListCreateBulkUpdateAPIView):
+class PlaceListView (SnappedLocationMixin, CachedResourceMixin, LocatedResourceMixin, OwnedResourceMixin, FilteredResourceMixin, StreamingListMixin, CursorPaginationMixin, ResultCountMixin, GeoJSONGeometryMixin, bulk_generics.ListCreateBulkUpdateAPIView):
     """
 
     GET
@@ -861,6 +1602,9 @@ class PlaceListView (CachedResourceMixin, LocatedResourceMixin, OwnedResourceMix
         [GeoJSON](http://www.geojson.org/geojson-spec.html) or
         [WKT](http://en.wikipedia.org/wiki/Well-known_text), or as a
         comma-separated latitude and longitude, if it is a point.
+        Without `distance_lt`, the order comes from the spatial index, and is
+        approximate for places far from the equator; with it, places are
+        sorted by their exact distances.
 
       * `distance_lt=<distance>`
 
@@ -877,6 +1621,37 @@ class PlaceListView (CachedResourceMixin, LocatedResourceMixin, OwnedResourceMix
         comma-separated list of 4 numeric values: western longitude, northern
         latitude, eastern longitude, southern latitude.
 
+      * `snap`
+
+        Round the `bounds` out to the edges of the map tiles that they overlap,
+        and round the latitude and longitude of a `near` point, so that nearby
+        requests share cached responses. The response may include places
+        somewhat outside of the given bounds.
+
+      * `precision=<digits>`
+
+        Write the coordinates of GeoJSON geometries with at most this many
+        decimal places (up to 15, the default). 5 places is about a meter.
+
+      * `simplify=<tolerance>`
+
+        Simplify GeoJSON line and polygon geometries, dropping vertices that
+        are within the tolerance (in degrees) of the simplified shape. Points
+        are not changed.
+
+      * `cursor=<cursor>`
+
+        Page through the results by cursor instead of by page number. Pass an
+        empty cursor for the first page, and follow the `next` link in the
+        metadata for the ones after it. Cursor pages are ordered by update
+        time, most recent first, and are not counted.
+
+      * `count=exact|estimate|none`
+
+        How to find the `length` of the list in the page metadata: counted
+        exactly (the default; counts are cached until the data changes),
+        estimated, or not at all, which is fastest.
+
       * `<attr>=<value>`
 
         Filter the place list to only return the places where the attribute is
@@ -895,19 +1670,42 @@ class PlaceListView (CachedResourceMixin, LocatedResourceMixin, OwnedResourceMix
     model = models.Place
     serializer_class = serializers.PlaceSerializer
     pagination_serializer_class = serializers.FeatureCollectionSerializer
+    cursor_pagination_serializer_class = serializers.CursorFeatureCollectionSerializer
     renderer_classes = (renderers.GeoJSONRenderer, renderers.GeoJSONPRenderer) + OwnedResourceMixin.renderer_classes[2:]
     parser_classes = (parsers.GeoJSONParser,) + OwnedResourceMixin.parser_classes[1:]
-
-    def get_cache_metakey(self):
-        metakey_kwargs = self.kwargs.copy()
-        metakey_kwargs.pop('pk_list', None)
-        prefix = reverse('place-list', kwargs=metakey_kwargs)
-        return prefix + '_keys'
+    cache_rendered_content = True
+    cache_soft_timeout = settings.API_CACHE_SOFT_TIMEOUT
+    csv_columns = ('id', 'url', 'geometry', 'dataset', 'visible', 'attachments',
+                   'created_datetime', 'updated_datetime') + SUBMITTER_CSV_COLUMNS
 
     def pre_save(self, obj):
         super(PlaceListView, self).pre_save(obj)
         obj.dataset = self.get_dataset()
 
+    def get_attribute_names(self):
+        return self.get_dataset().get_attribute_names('places')
+
+    def get_counter_value(self):
+        include_invisible = INCLUDE_INVISIBLE_PARAM in self.request.GET
+        return models.DataSetCounter.objects.get_count(self.get_dataset(), 'places', include_invisible)
+
+    def get_csv_header(self):
+        header = super(PlaceListView, self).get_csv_header()
+
+        if NEAR_PARAM in self.request.GET:
+            header.append('distance')
+
+        # Detailed submission sets are written as JSON, and summaries as
+        # one column for each of their fields.
+        for set_name in self.get_dataset().get_submission_set_names():
+            if INCLUDE_SUBMISSIONS_PARAM in self.request.GET:
+                header.append('submission_sets.' + set_name)
+            else:
+                header.extend(['submission_sets.%s.length' % set_name,
+                               'submission_sets.%s.url' % set_name])
+
+        return sorted(header)
+
     def post_save(self, obj, created):
         super(PlaceListView, self).post_save(obj)
 
@@ -944,9 +1742,10 @@ class PlaceListView (CachedResourceMixin, LocatedResourceMixin, OwnedResourceMix
                 'submitter___groups__dataset',
                 'submitter___groups__dataset__owner',
                 'submission_sets',
-                'submission_sets__children',
                 'attachments')
 
+        # Submission set summaries use the sets' counts, so only load the
+        # submissions themselves when they're requested.
         if INCLUDE_SUBMISSIONS_PARAM in self.request.GET:
             queryset = queryset.prefetch_related(
                 'submission_sets__children',
@@ -955,7 +1754,7 @@ class PlaceListView (CachedResourceMixin, LocatedResourceMixin, OwnedResourceMix
                 'submission_sets__children__submitter___groups',
                 'submission_sets__children__attachments')
 
-        return queryset
+        return self.select_geojson(queryset)
 
     def get_serializer(self, instance=None, data=None,
                        files=None, many=False, partial=False):
@@ -1000,6 +1799,162 @@ class PlaceListView (CachedResourceMixin, LocatedResourceMixin, OwnedResourceMix
                 logger.error(e)
 
 
+class PlaceTileView (PlaceListView):
+    """
+
+    GET
+    ---
+    Get all the places in a web map (XYZ) tile, unpaginated. A map can load
+    just the tiles in view, instead of the whole place list. Places that
+    cross the edge of a tile are in each tile that they touch.
+
+    Tiles are cached until the dataset changes, and take the same request
+    parameters as the place list.
+
+    A tile lists at most 1000 places. A tile with more, such as one at a low
+    zoom level, is returned as a feature collection with the first 1000
+    places in it and the following metadata:
+
+        {
+          "truncated": true,
+          "limit": 1000
+        }
+
+    A map can show clusters for such a tile instead, or zoom in further.
+
+    **Authentication**: Basic, session, or key auth *(optional)*
+
+    ------------------------------------------------------------
+    """
+
+    http_method_names = ['get', 'head', 'options']
+    paginate_by = None
+    paginate_by_param = None
+
+    # Tiles are only rendered as GeoJSON, since a truncated tile carries its
+    # metadata along with the features.
+    renderer_classes = (renderers.GeoJSONRenderer, renderers.GeoJSONPRenderer, BrowsableAPIRenderer)
+
+    # The most places that a tile lists.
+    max_places_per_tile = 1000
+
+    def get_tile_polygon(self):
+        zoom, x, y = [int(self.kwargs[name]) for name in ('zoom', 'x', 'y')]
+        if zoom > utils.MAX_TILE_ZOOM or x >= 2 ** zoom or y >= 2 ** zoom:
+            raise Http404
+
+        tile = Polygon.from_bbox(utils.get_tile_bounds(x, y, zoom, cover_poles=True))
+        tile.srid = 4326
+        return tile
+
+    def get_queryset(self):
+        queryset = super(PlaceTileView, self).get_queryset()
+        return queryset.filter(geometry__intersects=self.get_tile_polygon())
+
+    def list(self, request, *args, **kwargs):
+        # Fetch one place more than the limit, to tell whether there are more
+        # places in the tile than are listed.
+        queryset = self.filter_queryset(self.get_queryset())
+        places = list(queryset[:self.max_places_per_tile + 1])
+        is_truncated = len(places) > self.max_places_per_tile
+
+        self.object_list = places[:self.max_places_per_tile]
+        self.instance_params_map = self.get_instance_params_map(self.object_list)
+        data = self.get_serializer(self.object_list, many=True).data
+
+        if is_truncated:
+            data = {
+                'type': 'FeatureCollection',
+                'features': data,
+                'metadata': {
+                    'truncated': True,
+                    'limit': self.max_places_per_tile,
+                },
+            }
+        return Response(data)
+
+
+class PlaceClusterListView (SnappedLocationMixin, CachedResourceMixin, LocatedResourceMixin, OwnedResourceMixin, FilteredResourceMixin, generics.GenericAPIView):
+    """
+
+    GET
+    ---
+    Get the places in the dataset grouped into clusters for a map at the
+    given zoom level. Places are grouped by the cell of a grid, a quarter of
+    a map tile wide, that they fall in. Each cluster is a GeoJSON point
+    feature at the center of its places, with the `count` and `bbox` of its
+    places in its properties.
+
+    **Authentication**: Basic, session, or key auth *(optional)*
+
+    **Request Parameters**:
+
+      * `zoom=<zoom>` *(required)*
+
+        The web map zoom level to cluster the places for.
+
+      * `breakdown=<attr>`
+
+        Also count the places in each cluster by their values of the given
+        attribute, in the cluster's `categories`. *The attribute must be
+        indexed.*
+
+      * `bounds`, `snap`, `include_invisible` and `<attr>=<value>` filters
+
+        As for the place list.
+
+    ------------------------------------------------------------
+    """
+
+    model = models.Place
+    renderer_classes = (renderers.GeoJSONRenderer, renderers.GeoJSONPRenderer, BrowsableAPIRenderer)
+    http_method_names = ['get', 'head', 'options']
+    cache_soft_timeout = settings.API_CACHE_SOFT_TIMEOUT
+
+    # The number of grid cells across each map tile
+    cells_per_tile = 4
+
+    def get_queryset(self):
+        queryset = super(PlaceClusterListView, self).get_queryset()\
+            .filter(dataset=self.get_dataset())
+
+        if INCLUDE_INVISIBLE_PARAM not in self.request.GET:
+            queryset = queryset.filter(visible=True)
+
+        return queryset
+
+    def get_special_filters(self):
+        return super(PlaceClusterListView, self).get_special_filters() | set([ZOOM_PARAM, BREAKDOWN_PARAM])
+
+    def get_zoom(self):
+        try:
+            zoom = int(self.request.GET[ZOOM_PARAM])
+        except KeyError:
+            raise QueryError(detail='You must specify a "%s" parameter' % (ZOOM_PARAM,))
+        except ValueError:
+            zoom = None
+
+        if zoom is None or not 0 <= zoom <= utils.MAX_TILE_ZOOM:
+            raise QueryError(detail='Invalid parameter for "%s": %r' % (ZOOM_PARAM, self.request.GET[ZOOM_PARAM]))
+        return zoom
+
+    def get_breakdown_index(self):
+        if not self.request.GET.get(BREAKDOWN_PARAM):
+            return None
+
+        attr_name = self.request.GET[BREAKDOWN_PARAM]
+        index = self.get_dataset().indexes.filter(attr_name=attr_name).first()
+        if index is None:
+            raise QueryError(detail='Invalid parameter for "%s": %r is not an indexed attribute' % (BREAKDOWN_PARAM, attr_name))
+        return index
+
+    def get(self, request, *args, **kwargs):
+        cell_size = 360.0 / (2 ** self.get_zoom() * self.cells_per_tile)
+        index = self.get_breakdown_index()
+        clusters = self.filter_queryset(self.get_queryset()).cluster(cell_size, index)
+        return Response(clusters)
+
+
 class SubmissionInstanceView (CachedResourceMixin, OwnedResourceMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     GET
@@ -1064,7 +2019,7 @@ class SubmissionInstanceView (CachedResourceMixin, OwnedResourceMixin, generics.
         return obj
 
 
-class SubmissionListView (CachedResourceMixin, OwnedResourceMixin, FilteredResourceMixin, bulk_generics.ListCreateBulkUpdateAPIView):
+class SubmissionListView (CachedResourceMixin, OwnedResourceMixin, FilteredResourceMixin, InstanceParamsMapMixin, CursorPaginationMixin, ResultCountMixin, bulk_generics.ListCreateBulkUpdateAPIView):
     """
 
     GET
@@ -1088,6 +2043,19 @@ class SubmissionListView (CachedResourceMixin, OwnedResourceMixin, FilteredResou
         `include_submissions` flag is set. Only the dataset owner is allowed to
         request private attributes.
 
+      * `cursor=<cursor>`
+
+        Page through the results by cursor instead of by page number. Pass an
+        empty cursor for the first page, and follow the `next` link in the
+        metadata for the ones after it. Cursor pages are ordered by update
+        time, most recent first, and are not counted.
+
+      * `count=exact|estimate|none`
+
+        How to find the `length` of the list in the page metadata: counted
+        exactly (the default; counts are cached until the data changes),
+        estimated, or not at all, which is fastest.
+
       * `<attr>=<value>`
 
         Filter the place list to only return the places where the attribute is
@@ -1110,12 +2078,6 @@ class SubmissionListView (CachedResourceMixin, OwnedResourceMixin, FilteredResou
     place_id_kwarg = 'place_id'
     submission_set_name_kwarg = 'submission_set_name'
 
-    def get_cache_metakey(self):
-        metakey_kwargs = self.kwargs.copy()
-        metakey_kwargs.pop('pk_list', None)
-        prefix = reverse('submission-list', kwargs=metakey_kwargs)
-        return prefix + '_keys'
-
     def get_place(self, dataset):
         place_id = self.kwargs[self.place_id_kwarg]
         place = get_object_or_404(models.Place, dataset=dataset, id=place_id)
@@ -1131,6 +2093,13 @@ class SubmissionListView (CachedResourceMixin, OwnedResourceMixin, FilteredResou
 
         return submission_set
 
+    def get_counter_value(self):
+        dataset = self.get_dataset()
+        submission_set = self.get_submission_set(dataset, self.get_place(dataset))
+        if INCLUDE_INVISIBLE_PARAM in self.request.GET:
+            return submission_set.total_length
+        return submission_set.visible_length
+
     def pre_save(self, obj):
         super(SubmissionListView, self).pre_save(obj)
         dataset = self.get_dataset()
@@ -1187,7 +2156,7 @@ class SubmissionListView (CachedResourceMixin, OwnedResourceMixin, FilteredResou
                                 **kwargs)
 
 
-class DataSetSubmissionListView (CachedResourceMixin, OwnedResourceMixin, FilteredResourceMixin, generics.ListAPIView):
+class DataSetSubmissionListView (CachedResourceMixin, OwnedResourceMixin, FilteredResourceMixin, StreamingListMixin, CursorPaginationMixin, ResultCountMixin, generics.ListAPIView):
     """
 
     GET
@@ -1211,6 +2180,19 @@ class DataSetSubmissionListView (CachedResourceMixin, OwnedResourceMixin, Filter
         `include_submissions` flag is set. Only the dataset owner is allowed to
         request private attributes.
 
+      * `cursor=<cursor>`
+
+        Page through the results by cursor instead of by page number. Pass an
+        empty cursor for the first page, and follow the `next` link in the
+        metadata for the ones after it. Cursor pages are ordered by update
+        time, most recent first, and are not counted.
+
+      * `count=exact|estimate|none`
+
+        How to find the `length` of the list in the page metadata: counted
+        exactly (the default; counts are cached until the data changes),
+        estimated, or not at all, which is fastest.
+
       * `<attr>=<value>`
 
         Filter the place list to only return the places where the attribute is
@@ -1222,20 +2204,26 @@ class DataSetSubmissionListView (CachedResourceMixin, OwnedResourceMixin, Filter
     model = models.Submission
     serializer_class = serializers.SubmissionSerializer
     pagination_serializer_class = serializers.PaginatedResultsSerializer
+    cache_rendered_content = True
+    csv_columns = ('id', 'url', 'dataset', 'set', 'place', 'visible', 'attachments',
+                   'created_datetime', 'updated_datetime') + SUBMITTER_CSV_COLUMNS
 
     submission_set_name_kwarg = 'submission_set_name'
 
-    def get_cache_metakey(self):
-        metakey_kwargs = self.kwargs.copy()
-        metakey_kwargs.pop('pk_list', None)
-        prefix = reverse('dataset-submission-list', kwargs=metakey_kwargs)
-        return prefix + '_keys'
-
     def get_submission_sets(self, dataset):
         submission_set_name = self.kwargs[self.submission_set_name_kwarg]
         submission_sets = models.SubmissionSet.objects.filter(name=submission_set_name, place__dataset=dataset)
         return submission_sets
 
+    def get_attribute_names(self):
+        submission_set_name = self.kwargs[self.submission_set_name_kwarg]
+        return self.get_dataset().get_attribute_names(submission_set_name)
+
+    def get_counter_value(self):
+        include_invisible = INCLUDE_INVISIBLE_PARAM in self.request.GET
+        submission_set_name = self.kwargs[self.submission_set_name_kwarg]
+        return models.DataSetCounter.objects.get_count(self.get_dataset(), submission_set_name, include_invisible)
+
     def get_queryset(self):
         dataset = self.get_dataset()
         submission_sets = self.get_submission_sets(dataset)
@@ -1303,35 +2291,29 @@ class DataSetInstanceView (CachedResourceMixin, OwnedResourceMixin, generics.Ret
             raise Http404
 
     @utils.memo
+    def get_counts(self):
+        """
+        Get the dataset's counts of places and submissions, by submission set
+        name, from its counters.
+        """
+        include_invisible = INCLUDE_INVISIBLE_PARAM in self.request.GET
+        counts = models.DataSetCounter.objects.get_counts([self.object], include_invisible)
+        return counts.get(self.object.pk, {})
+
     def get_place_count(self):
         """
         Get the number of places for this dataset.
         """
-        include_invisible = INCLUDE_INVISIBLE_PARAM in self.request.GET
-        places = self.object.places
-        if not include_invisible:
-            places = places.filter(visible=True)
-        return places.count()
+        return self.get_counts().get('places', 0)
 
-    @utils.memo
     def get_submission_sets(self):
         """
         Get a list of submission set summary data for this dataset.
         """
-        include_invisible = INCLUDE_INVISIBLE_PARAM in self.request.GET
-        submissions = self.object.submissions.select_related('parent')
-        if not include_invisible:
-            submissions = submissions.filter(visible=True)
-
-        # Unset any default ordering
-        submissions = submissions.order_by()
-
-        submissions = submissions.values('dataset', 'parent__name').annotate(length=Count('dataset'))
-        return submissions
+        return get_submission_set_summaries(self.object.pk, self.get_counts())
 
     def get_serializer_context(self):
         context = super(DataSetInstanceView, self).get_serializer_context()
-        include_invisible = INCLUDE_INVISIBLE_PARAM in self.request.GET
 
         # The place_count_map_getter returns a dictionary where the keys are
         # dataset ids and the values are corresponding place counts.
@@ -1362,6 +2344,56 @@ class DataSetInstanceView (CachedResourceMixin, OwnedResourceMixin, generics.Ret
         return response
 
 
+class DataSetSchemaView (CachedResourceMixin, OwnedResourceMixin, views.APIView):
+    """
+    GET
+    ---
+    Get the data attributes used by the places and by each submission set in
+    a dataset, with the number of things that have each attribute, broken
+    down by the JSON type of its value.
+
+    **Authentication**: Basic, session, or key auth *(optional)*
+
+    **Request Parameters**:
+
+      * `include_private` *(only direct auth)*
+
+        Include the private data attributes in the schema. Only the dataset
+        owner is allowed to request private attributes.
+
+    ------------------------------------------------------------
+    """
+    # The schema's visibility is checked per submission set, below.
+    model = models.DataSet
+    renderer_classes = (JSONRenderer, JSONPRenderer, BrowsableAPIRenderer)
+
+    def get(self, request, owner_username, dataset_slug):
+        dataset = self.get_dataset()
+        schema = models.DataAttribute.objects.get_schema(dataset)
+        permissions = models.get_data_permission_matrix(request, dataset)
+        include_private = INCLUDE_PRIVATE_PARAM in request.GET
+
+        for set_name in schema.keys():
+            if not permissions.allows('retrieve', set_name):
+                del schema[set_name]
+            elif not include_private:
+                schema[set_name] = dict(
+                    (attr_name, attr_schema)
+                    for attr_name, attr_schema in schema[set_name].iteritems()
+                    if not attr_name.startswith('private'))
+
+        return Response(schema)
+
+
+def get_submission_set_summaries(dataset_id, counts):
+    """
+    Build the submission set summaries that the dataset serializers expect
+    from a dataset's counts by submission set name.
+    """
+    return [{'dataset': dataset_id, 'parent__name': name, 'length': length}
+            for name, length in sorted(counts.items()) if name != 'places']
+
+
 class DataSetListMixin (object):
     """
     Common aspects for dataset list views.
@@ -1374,21 +2406,24 @@ class DataSetListMixin (object):
     client_authentication_classes = ()
 
     @utils.memo
-    def get_place_counts(self):
+    def get_all_counts(self):
         """
         Return a dictionary whose keys are dataset ids and values are the
-        corresponding count of places in that dataset.
+        dataset's counts of places and submissions, by submission set name,
+        from its counters.
         """
         include_invisible = INCLUDE_INVISIBLE_PARAM in self.request.GET
-        places = models.Place.objects.filter(dataset__in=self.get_queryset())
-        if not include_invisible:
-            places = places.filter(visible=True)
-
-        # Unset any default ordering
-        places = places.order_by()
+        return models.DataSetCounter.objects.get_counts(self.get_queryset(), include_invisible)
 
-        places = places.values('dataset').annotate(length=Count('dataset'))
-        return dict([(place['dataset'], place['length']) for place in places])
+    @utils.memo
+    def get_place_counts(self):
+        """
+        Return a dictionary whose keys are dataset ids and values are the
+        corresponding count of places in that dataset.
+        """
+        return dict([(dataset_id, counts['places'])
+                     for dataset_id, counts in self.get_all_counts().iteritems()
+                     if 'places' in counts])
 
     @utils.memo
     def get_all_submission_sets(self):
@@ -1397,25 +2432,11 @@ class DataSetListMixin (object):
         corresponding list of submission set summary information for the
         submisisons on that dataset's places.
         """
-        include_invisible = INCLUDE_INVISIBLE_PARAM in self.request.GET
-        summaries = models.Submission.objects.filter(dataset__in=self.get_queryset()).select_related('parent')
-        if not include_invisible:
-            summaries = summaries.filter(visible=True)
-
-        # Unset any default ordering
-        summaries = summaries.order_by()
-
-        summaries = summaries.values('dataset', 'parent__name').annotate(length=Count('dataset'))
-
-        sets = defaultdict(list)
-        for summary in summaries:
-            sets[summary['dataset']].append(summary)
-
-        return dict(sets.items())
+        return dict([(dataset_id, get_submission_set_summaries(dataset_id, counts))
+                     for dataset_id, counts in self.get_all_counts().iteritems()])
 
     def get_serializer_context(self):
         context = super(DataSetListMixin, self).get_serializer_context()
-        include_invisible = INCLUDE_INVISIBLE_PARAM in self.request.GET
 
         # The place_count_map_getter returns a dictionary where the keys are
         # dataset ids and the values are corresponding place counts.
@@ -1542,7 +2563,7 @@ class AttachmentListView (OwnedResourceMixin, FilteredResourceMixin, generics.Li
         obj.thing = thing
 
 
-class ActionListView (CachedResourceMixin, OwnedResourceMixin, generics.ListAPIView):
+class ActionListView (CachedResourceMixin, OwnedResourceMixin, CursorPaginationMixin, ResultCountMixin, generics.ListAPIView):
     """
 
     GET
@@ -1552,11 +2573,36 @@ class ActionListView (CachedResourceMixin, OwnedResourceMixin, generics.ListAPIV
 
     **Authentication**: Basic, session, or key auth *(optional)*
 
+    **Request Parameters**:
+
+      * `cursor=<cursor>`
+
+        Page through the results by cursor instead of by page number. Pass an
+        empty cursor for the first page, and follow the `next` link in the
+        metadata for the ones after it. Cursor pages are ordered by creation
+        time, most recent first, and are not counted.
+
+      * `count=exact|estimate|none`
+
+        How to find the `length` of the list in the page metadata: counted
+        exactly (the default; counts are cached until the data changes),
+        estimated, or not at all, which is fastest.
+
+      * `after=<id>`, `before=<id>`, `limit=<count>`
+
+        Instead of a page, get a plain list of up to `limit` actions (or the
+        page size), most recent first, with ids greater than `after` and not
+        greater than `before`. The `limit` can be no more than the page size.
+        To poll for new activity, pass the id of the latest action already
+        seen as `after`.
+
     ------------------------------------------------------------
     """
     model = models.Action
     serializer_class = serializers.ActionSerializer
     pagination_serializer_class = serializers.PaginatedResultsSerializer
+    cursor_field = 'created_datetime'
+    cache_soft_timeout = settings.API_CACHE_SOFT_TIMEOUT
 
     def get_queryset(self):
         dataset = self.get_dataset()
@@ -1581,16 +2627,68 @@ class ActionListView (CachedResourceMixin, OwnedResourceMixin, generics.ListAPIV
                 'thing__place__attachments',
                 'thing__submission__attachments',
 
-                'thing__place__submission_sets',
-                'thing__place__submission_sets__children')
+                'thing__place__submission_sets')
+
+        # The submission set summaries use the sets' stored lengths, so the
+        # submissions are only needed when they are included.
+        if INCLUDE_SUBMISSIONS_PARAM in self.request.GET:
+            queryset = queryset.prefetch_related(
+                'thing__place__submission_sets__children',
+                'thing__place__submission_sets__children__attachments')
 
         if INCLUDE_INVISIBLE_PARAM not in self.request.GET:
             queryset = queryset.filter(thing__visible=True)\
                 .filter(Q(thing__place__isnull=False) |
                         Q(thing__submission__parent__place__visible=True))
 
+        if self.uses_id_range():
+            queryset = self.filter_id_range(queryset)
+
         return queryset
 
+    def uses_id_range(self):
+        return any(param in self.request.GET for param in (AFTER_PARAM, BEFORE_PARAM, LIMIT_PARAM))
+
+    def filter_id_range(self, queryset):
+        """
+        Limit the actions to the requested range of ids, newest first. The
+        range is scanned along the primary key index.
+        """
+        if CURSOR_PARAM in self.request.GET:
+            raise QueryError(detail='You cannot use a "%s" parameter with "%s", "%s" or "%s"' % (CURSOR_PARAM, AFTER_PARAM, BEFORE_PARAM, LIMIT_PARAM))
+
+        try:
+            after, before, limit = [
+                int(self.request.GET[param]) if self.request.GET.get(param) else None
+                for param in (AFTER_PARAM, BEFORE_PARAM, LIMIT_PARAM)]
+        except ValueError:
+            raise QueryError(detail='The "%s", "%s" and "%s" parameters must be integers' % (AFTER_PARAM, BEFORE_PARAM, LIMIT_PARAM))
+
+        if limit is None:
+            limit = self.get_paginate_by()
+        elif limit < 0:
+            raise QueryError(detail='Invalid parameter for "%s": %r' % (LIMIT_PARAM, self.request.GET[LIMIT_PARAM]))
+
+        # A range is no longer than a page could be.
+        max_limit = self.max_paginate_by or self.get_paginate_by()
+        if max_limit is not None and (limit is None or limit > max_limit):
+            limit = max_limit
+
+        queryset = queryset.order_by('-id')
+        if after is not None:
+            queryset = queryset.filter(id__gt=after)
+        if before is not None:
+            queryset = queryset.filter(id__lte=before)
+        if limit is not None:
+            queryset = queryset[:limit]
+        return queryset
+
+    def paginate_queryset(self, queryset, page_size=None):
+        # Ranges of actions are listed without a pagination envelope.
+        if self.uses_id_range():
+            return None
+        return super(ActionListView, self).paginate_queryset(queryset, page_size)
+
 
 ###############################################################################
 #